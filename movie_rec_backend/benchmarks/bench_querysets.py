@@ -0,0 +1,70 @@
+"""
+Queryset micro-benchmarks: the database work behind the hot endpoints.
+Each result records the number of queries one call makes.
+"""
+import pytest
+from django.db.models import Count, F
+
+from movies.embeddings import similar_movie_ids
+from movies.feed import trending_scores
+from movies.models import Comment, Like, Movie
+from movies.recommender import recommended_movie_scores
+from movies.serializers import CommentListSerializer, LikeListSerializer
+
+PAGE_SIZE = 20
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user_id():
+    # The most active user has the most expensive recommendations.
+    return Like.objects.values('user_id').annotate(
+        total=Count('pk')
+    ).order_by('-total').values_list('user_id', flat=True).first()
+
+
+@pytest.fixture
+def movie():
+    return Movie.objects.order_by('-comments_count').first()
+
+
+def bench_movie_list_page(measure):
+    measure(lambda: list(Movie.objects.order_by(
+        F('release_date').desc(nulls_last=True), '-id'
+    )[:PAGE_SIZE]))
+
+
+def bench_movie_comments_page(measure, movie):
+    measure(lambda: list(CommentListSerializer.get_queryset(
+        Comment.objects.filter(movie=movie, parent__isnull=True).order_by(
+            '-created_at', '-id'
+        )
+    )[:PAGE_SIZE]))
+
+
+def bench_comment_thread(measure):
+    root = Comment.objects.filter(parent__isnull=True).annotate(
+        total=Count('replies')
+    ).order_by('-total').first()
+    measure(lambda: list(CommentListSerializer.get_queryset(
+        Comment.objects.filter(path__startswith=root.path).order_by('path')
+    )))
+
+
+def bench_user_like_page(measure, user_id):
+    measure(lambda: list(LikeListSerializer.get_queryset(
+        Like.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+    )[:PAGE_SIZE]))
+
+
+def bench_recommended_movie_scores(measure, user_id):
+    measure(recommended_movie_scores, user_id, 20)
+
+
+def bench_trending_scores(measure):
+    measure(trending_scores, 20)
+
+
+def bench_similar_movie_ids(measure, movie):
+    measure(similar_movie_ids, movie)
@@ -0,0 +1,51 @@
+"""
+Serializer micro-benchmarks: the cost of turning one page of rows into
+response data, with the rows already loaded.
+"""
+import pytest
+
+from movies.models import Comment, Like, Movie
+from movies.serializers import (
+    CommentListSerializer,
+    CommentSerializer,
+    LikeListSerializer,
+    LikeSerializer,
+    MovieSerializer
+)
+
+PAGE_SIZE = 100
+
+pytestmark = pytest.mark.django_db
+
+
+def bench_movie_serializer(benchmark):
+    movies = list(Movie.objects.order_by('pk')[:PAGE_SIZE])
+    benchmark(lambda: MovieSerializer(movies, many=True).data)
+
+
+def bench_comment_model_serializer(benchmark):
+    comments = list(
+        Comment.objects.select_related('user').order_by('pk')[:PAGE_SIZE]
+    )
+    benchmark(lambda: CommentSerializer(comments, many=True).data)
+
+
+def bench_comment_values_serializer(benchmark):
+    rows = list(CommentListSerializer.get_queryset(
+        Comment.objects.order_by('pk')
+    )[:PAGE_SIZE])
+    benchmark(CommentListSerializer.to_representation, rows)
+
+
+def bench_like_model_serializer(benchmark):
+    likes = list(
+        Like.objects.select_related('user').order_by('pk')[:PAGE_SIZE]
+    )
+    benchmark(lambda: LikeSerializer(likes, many=True).data)
+
+
+def bench_like_values_serializer(benchmark):
+    rows = list(LikeListSerializer.get_queryset(
+        Like.objects.order_by('pk')
+    )[:PAGE_SIZE])
+    benchmark(LikeListSerializer.to_representation, rows)
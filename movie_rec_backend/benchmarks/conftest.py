@@ -0,0 +1,44 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from movies.embeddings import build_index
+from movies.management.commands.seed_benchmark_data import (
+    seed_benchmark_data
+)
+from movies.recommender import load_interaction_matrix, rebuild_similarities
+from movies.signals import recount_counters
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker, tmp_path_factory):
+    """
+    Seeds the test database once for the whole session.
+    """
+    index_dir = tmp_path_factory.mktemp('benchmark') / 'embeddings'
+    with override_settings(EMBEDDING_INDEX_DIR=str(index_dir)):
+        with django_db_blocker.unblock():
+            _, movie_ids = seed_benchmark_data(
+                users=200, movies=5000, likes=20_000, favorites=5000,
+                comments=20_000
+            )
+            recount_counters(movie_ids)
+            matrix, _, similar_ids = load_interaction_matrix()
+            rebuild_similarities(matrix, similar_ids)
+            build_index()
+        yield
+
+
+@pytest.fixture
+def measure(benchmark):
+    """
+    Benchmarks `fn(*args)` and records in the report how many queries
+    one call makes.
+    """
+    def run(fn, *args):
+        with CaptureQueriesContext(connection) as captured:
+            fn(*args)
+        benchmark.extra_info['queries'] = len(captured)
+        return benchmark(fn, *args)
+    return run
@@ -0,0 +1,123 @@
+"""
+Load-test scenario for the API.
+
+Each simulated user logs in as one of the users seeded by
+`manage.py seed_benchmark_data`, browses movies, comments and
+recommendations, lists its own likes and favorites and refreshes its
+access token before it expires. Movie and comment ids are read from
+BENCHMARK_MOVIES and BENCHMARK_COMMENTS (comma-separated ranges such as
+`1-10000`), defaulting to the ids of a freshly seeded database.
+
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \\
+        --users 50 --spawn-rate 10 --run-time 2m --headless --csv report
+"""
+import itertools
+import os
+import random
+import time
+
+from locust import HttpUser, between, task
+
+USERS = int(os.environ.get('BENCHMARK_USERS', 1000))
+PASSWORD = 'benchmark'
+# Access tokens live 5 minutes; refresh well before they expire.
+REFRESH_AFTER = 4 * 60
+
+
+def parse_ids(value):
+    ids = []
+    for part in value.split(','):
+        first, _, last = part.partition('-')
+        ids.extend(range(int(first), int(last or first) + 1))
+    return ids
+
+
+MOVIE_IDS = parse_ids(os.environ.get('BENCHMARK_MOVIES', '1-10000'))
+COMMENT_IDS = parse_ids(os.environ.get('BENCHMARK_COMMENTS', '1-50000'))
+user_numbers = itertools.count()
+
+
+class APIUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        username = f'bench{next(user_numbers) % USERS}'
+        response = self.client.post(
+            '/api/token/',
+            json={'username': username, 'password': PASSWORD},
+            name='/api/token/'
+        )
+        self.set_tokens(response.json())
+        self.next_page = None
+
+    def set_tokens(self, tokens):
+        self.refresh = tokens.get('refresh', getattr(self, 'refresh', None))
+        self.client.headers['Authorization'] = f"Bearer {tokens['access']}"
+        self.refreshed_at = time.monotonic()
+
+    def get(self, path, name=None, **params):
+        if time.monotonic() - self.refreshed_at > REFRESH_AFTER:
+            self.refresh_token()
+        return self.client.get(path, params=params, name=name or path)
+
+    @task
+    def refresh_token(self):
+        response = self.client.post(
+            '/api/token/refresh/',
+            json={'refresh': self.refresh},
+            name='/api/token/refresh/'
+        )
+        if response.ok:
+            self.set_tokens(response.json())
+
+    @task(10)
+    def movie_list(self):
+        if self.next_page and random.random() < 0.5:
+            response = self.get(
+                self.next_page, name='/api/movies/?cursor=[cursor]'
+            )
+        else:
+            response = self.get('/api/movies/')
+        if response.ok:
+            self.next_page = response.json()['next']
+
+    @task(10)
+    def movie_detail(self):
+        self.get(
+            f'/api/movies/{random.choice(MOVIE_IDS)}/',
+            name='/api/movies/[id]/'
+        )
+
+    @task(5)
+    def movie_recommendations(self):
+        self.get(
+            f'/api/movies/{random.choice(MOVIE_IDS)}/recommended/',
+            name='/api/movies/[id]/recommended/'
+        )
+
+    @task(5)
+    def user_recommendations(self):
+        self.get('/api/recommendations/')
+
+    @task(8)
+    def movie_comments(self):
+        self.get(
+            '/api/comments/',
+            name='/api/comments/?movie=[id]',
+            movie=random.choice(MOVIE_IDS)
+        )
+
+    @task(3)
+    def comment_thread(self):
+        self.get(
+            f'/api/comments/{random.choice(COMMENT_IDS)}/thread/',
+            name='/api/comments/[id]/thread/'
+        )
+
+    @task(3)
+    def like_list(self):
+        self.get('/api/likes/')
+
+    @task(3)
+    def favorite_list(self):
+        self.get('/api/favorites/')
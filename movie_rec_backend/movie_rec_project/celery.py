@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 # Set the default Django settings module for the celery program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_rec_project.settings')
@@ -11,6 +12,35 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task module from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Periodic tasks run by `celery beat`.
+app.conf.beat_schedule = {
+    'flush-like-buffer': {
+        'task': 'movies.tasks.flush_like_buffer',
+        'schedule': 10.0,  # seconds
+    },
+    'apply-cooccurrence-events': {
+        'task': 'movies.tasks.apply_cooccurrence_events',
+        'schedule': 60.0,  # seconds
+    },
+    'refresh-trending-feed': {
+        'task': 'movies.tasks.refresh_trending_feed',
+        'schedule': 15 * 60.0,  # seconds
+    },
+    # Runs once the previous UTC day is complete, see movies/crawler.py.
+    'sync-tmdb-changes': {
+        'task': 'movies.tasks.sync_tmdb_changes',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'build-movie-similarities': {
+        'task': 'movies.tasks.build_movie_similarities',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'build-embedding-index': {
+        'task': 'movies.tasks.build_embedding_index',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,59 @@
+"""
+Django settings for benchmarking the API without external services.
+
+Runs on SQLite (default) or on the PostgreSQL database configured by the
+DB_* variables when BENCHMARK_DATABASE=postgresql, with an in-process fake
+Redis and Celery tasks executed eagerly. Requires the packages of
+requirements-benchmark.txt.
+
+    DJANGO_SETTINGS_MODULE=movie_rec_project.settings_benchmark
+"""
+import os
+
+# Benchmarks need no secrets: placeholders let the base settings load.
+os.environ.setdefault('DJANGO_SECRETS_KEY', 'benchmark-only-secret-key-' * 2)
+os.environ.setdefault('TMDB_API_KEY', 'benchmark')
+for name in ('DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT'):
+    os.environ.setdefault(name, '')
+
+from decouple import config  # noqa: E402
+from fakeredis import (  # noqa: E402
+    FakeAsyncRedisConnection,
+    FakeRedisConnection
+)
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import BASE_DIR  # noqa: E402
+
+BENCHMARK_DIR = BASE_DIR / 'var' / 'benchmark'
+BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver']
+
+if config('BENCHMARK_DATABASE', default='sqlite') != 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BENCHMARK_DIR / 'db.sqlite3',
+        }
+    }
+
+# Every connection of the process shares one in-memory fake server.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "movies.metrics.InstrumentedRedisClient",
+            "CONNECTION_POOL_KWARGS": {
+                "connection_class": FakeRedisConnection,
+            },
+        }
+    }
+}
+ASYNC_REDIS_POOL_KWARGS = {'connection_class': FakeAsyncRedisConnection}
+
+CELERY_TASK_ALWAYS_EAGER = True
+
+EMBEDDING_INDEX_DIR = str(BENCHMARK_DIR / 'embeddings')
@@ -14,7 +14,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
-from movies.views import user_registration_view
+from movies.views import metrics_view, user_registration_view
 
 # Schema view configuration for Swagger
 schema_view = get_schema_view(
@@ -67,4 +67,7 @@ urlpatterns = [
         user_registration_view,
         name='user_registration'
     ),
+
+    # Prometheus metrics, for local scrapers only
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -6,4 +6,5 @@ class MoviesConfig(AppConfig):
     name = 'movies'
 
     def ready(self):
+        import movies.signals
         import movies.tasks
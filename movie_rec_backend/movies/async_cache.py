@@ -0,0 +1,180 @@
+"""
+Async counterparts of the cache helpers of cache.py, for the async views
+(see async_views.py).
+
+They talk to the cache's Redis database through `redis.asyncio` instead
+of django-redis, but read and write the same keys in the same encoding,
+so sync and async views share every version token and cached page.
+"""
+import asyncio
+import math
+import random
+import time
+import weakref
+
+import redis.asyncio as redis
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import (
+    LOCK_KEY,
+    LOCK_TIMEOUT,
+    VERSION_KEY,
+    WAIT_INTERVAL,
+    WAIT_TIMEOUT,
+    new_version
+)
+from .metrics import current_sample
+
+# Connections belong to the event loop that opened them: one client per
+# loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+# django-redis options of the default cache passed on to the async
+# client, and the client argument each one becomes.
+CONNECTION_OPTIONS = {
+    'PASSWORD': 'password',
+    'SOCKET_TIMEOUT': 'socket_timeout',
+    'SOCKET_CONNECT_TIMEOUT': 'socket_connect_timeout',
+}
+
+
+def connection_kwargs():
+    """
+    Returns the location and the client arguments of the default cache,
+    read from the same options django-redis reads: TLS (a rediss:// URL
+    plus its ssl_* pool arguments), password and timeouts all apply to
+    the async client too. ASYNC_REDIS_POOL_KWARGS is applied last.
+    """
+    config = settings.CACHES['default']
+    location = config['LOCATION']
+    if not isinstance(location, str):
+        location = location[0]
+    # django-redis writes to the first of comma-separated locations.
+    location = location.split(',')[0]
+
+    options = config.get('OPTIONS', {})
+    kwargs = dict(options.get('CONNECTION_POOL_KWARGS', {}))
+    for option, name in CONNECTION_OPTIONS.items():
+        if options.get(option):
+            kwargs[name] = options[option]
+    kwargs.update(settings.ASYNC_REDIS_POOL_KWARGS)
+    return location, kwargs
+
+
+def get_redis():
+    """
+    Returns the async client of the cache's Redis database for the
+    running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        location, kwargs = connection_kwargs()
+        client = _clients[loop] = redis.from_url(location, **kwargs)
+    return client
+
+
+def _key(key):
+    return cache.client.make_key(key)
+
+
+async def get_many(keys):
+    """
+    Returns the values cached under `keys`, in order, None for misses.
+    Reads of sampled requests are recorded like those of the sync cache.
+    """
+    sample = current_sample()
+    start = time.perf_counter()
+    values = await get_redis().mget([_key(key) for key in keys])
+    if sample is not None:
+        sample.cache_time += time.perf_counter() - start
+        misses = values.count(None)
+        sample.cache_hits += len(values) - misses
+        sample.cache_misses += misses
+    return [
+        None if value is None else cache.client.decode(value)
+        for value in values
+    ]
+
+
+async def get(key):
+    """
+    Returns the value cached under `key`, or None.
+    """
+    return (await get_many([key]))[0]
+
+
+async def add(key, value, timeout):
+    """
+    Caches `value` under `key` unless the key exists, for `timeout`
+    seconds or forever when None. Returns True if it was added.
+    """
+    return bool(await get_redis().set(
+        _key(key), cache.client.encode(value), nx=True, ex=timeout
+    ))
+
+
+async def get_versions(*namespaces, exists=None):
+    """
+    Async counterpart of `cache.get_versions`, awaiting `exists()`.
+    """
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = await get_many(keys)
+    if None in versions and exists is not None and not await exists():
+        return None
+    for i, key in enumerate(keys):
+        if versions[i] is None:
+            await add(key, new_version(), None)
+            versions[i] = await get(key)
+    return versions
+
+
+async def make_key(namespace, *parts, exists=None):
+    """
+    Async counterpart of `cache.make_key`.
+    """
+    versions = await get_versions(namespace, exists=exists)
+    if versions is None:
+        return None
+    return ':'.join(
+        ['movies', namespace, versions[0]] + [str(part) for part in parts]
+    )
+
+
+async def get_or_compute(key, compute, timeout, beta=1.0):
+    """
+    Async counterpart of `cache.get_or_compute`, awaiting `compute()`.
+    """
+    lock_key = LOCK_KEY.format(key)
+    entry = await get(key)
+
+    if entry is not None:
+        value, delta, expiry = entry
+        jitter = -delta * beta * math.log(1.0 - random.random())
+        if time.time() + jitter < expiry:
+            return value
+        if not await add(lock_key, 1, LOCK_TIMEOUT):
+            return value
+    elif not await add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(WAIT_INTERVAL)
+            entry = await get(key)
+            if entry is not None:
+                return entry[0]
+        return await compute()
+
+    try:
+        start = time.monotonic()
+        value = await compute()
+        delta = time.monotonic() - start
+        await get_redis().set(
+            _key(key),
+            cache.client.encode((value, delta, time.time() + timeout)),
+            ex=timeout
+        )
+    finally:
+        await get_redis().delete(_key(lock_key))
+    return value
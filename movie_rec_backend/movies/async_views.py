@@ -0,0 +1,289 @@
+"""
+Async views for the hottest read endpoints.
+
+With ASYNC_READ_VIEWS, which an ASGI deployment opts into, these serve
+GET requests of the movie list and detail, the recommendations and a
+movie's comment threads in place of the DRF views of the same URLs.
+Version tokens, cached pages and feeds are read with the async Redis
+client, so a cache hit never leaves the event loop; misses are rendered
+with the async ORM into the same cache entries, and the same bytes, as
+the DRF views.
+
+A handler returns None for requests it does not serve (search, later
+pages of comments, ...); those, and every other method, go to the DRF
+view of the URL in a worker thread.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from . import async_cache, membership
+from .authentication import CachedJWTAuthentication
+from .cache import make_key, version_timestamp
+from .embeddings import similar_movie_ids
+from .feed import aread_feed, aread_trending_feed, afeed_movies
+from .metrics import timed
+from .models import Comment, Movie
+from .pagination import CreatedAtKeysetPagination, MovieKeysetPagination
+from .serializers import CommentListSerializer, MovieSerializer
+from .tasks import request_feed_refresh
+
+authentication = CachedJWTAuthentication()
+
+
+def async_view(handler, fallback):
+    """
+    Returns an async view serving GET requests with `handler` and
+    everything else, including requests the handler returns None for,
+    with the sync view `fallback`.
+    """
+    fallback_async = sync_to_async(fallback)
+
+    @csrf_exempt
+    @wraps(handler)
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            try:
+                response = await handler(request, *args, **kwargs)
+            except APIException as exc:
+                response = error_response(exc)
+            if response is not None:
+                return response
+        return await fallback_async(request, *args, **kwargs)
+
+    # Lets the schema generator document the DRF view behind the URL.
+    for attr in ('cls', 'initkwargs', 'actions'):
+        if hasattr(fallback, attr):
+            setattr(view, attr, getattr(fallback, attr))
+    return view
+
+
+def json_response(content, status=200):
+    return HttpResponse(
+        content,
+        content_type='application/json',
+        status=status
+    )
+
+
+def error_response(exc):
+    """
+    Renders an API exception the way DRF's exception handler does.
+    """
+    data = exc.detail
+    if not isinstance(data, (list, dict)):
+        data = {'detail': data}
+    response = json_response(JSONRenderer().render(data), exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = authentication.authenticate_header(
+            None
+        )
+    return response
+
+
+async def authenticate(request, required=False):
+    """
+    Returns the user of the request's access token, or None without
+    one. Invalid tokens are rejected as CachedJWTAuthentication rejects
+    them, and anonymous requests too when `required`.
+    """
+    header = authentication.get_header(request)
+    raw_token = None
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        if required:
+            raise NotAuthenticated()
+        return None
+    token = authentication.get_validated_token(raw_token)
+    return await authentication.aget_user(token)
+
+
+async def movie_list(request):
+    """
+    Async counterpart of `MovieViewSet.list`, without search.
+    """
+    if request.GET.get('q', '').strip():
+        return None
+    user = await authenticate(request)
+
+    request = Request(request)
+    paginator = MovieKeysetPagination()
+    cache_key = paginator.get_cache_key(
+        request,
+        await async_cache.make_key('list')
+    )
+
+    async def render_page():
+        page = await paginator.apaginate_queryset(
+            Movie.objects.all(),
+            request
+        )
+        with timed('serialize'):
+            serializer = MovieSerializer(page, many=True)
+            return JSONRenderer().render(
+                paginator.get_paginated_data(serializer.data)
+            )
+
+    content = await async_cache.get_or_compute(
+        cache_key,
+        render_page,
+        settings.MOVIE_LIST_CACHE_TTL
+    )
+    if not membership.requested(request.query_params):
+        return json_response(content)
+    if user is not None:
+        data = json.loads(content)
+        await membership.aannotate(user.pk, data['results'])
+        content = JSONRenderer().render(data)
+    response = json_response(content)
+    membership.patch_headers(response, user is not None)
+    return response
+
+
+async def movie_detail(request, pk):
+    """
+    Async counterpart of `MovieViewSet.retrieve`.
+    """
+    await authenticate(request)
+    versions = await async_cache.get_versions(
+        'detail',
+        f'detail:{pk}',
+        exists=Movie.objects.filter(pk=pk).aexists
+    )
+    if versions is None:
+        raise NotFound('No Movie matches the given query.')
+    global_version, movie_version = versions
+    etag = f'"{pk}-{global_version}-{movie_version}"'
+    last_modified = max(
+        version_timestamp(global_version),
+        version_timestamp(movie_version)
+    )
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified
+    )
+    if response is None:
+        async def render_movie():
+            try:
+                movie = await Movie.objects.aget(pk=pk)
+            except Movie.DoesNotExist:
+                raise NotFound('No Movie matches the given query.')
+            with timed('serialize'):
+                return JSONRenderer().render(MovieSerializer(movie).data)
+
+        content = await async_cache.get_or_compute(
+            make_key(f'detail:{pk}', global_version, version=movie_version),
+            render_movie,
+            3600
+        )
+        response = json_response(content)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def movie_recommendations(request, movie_id):
+    """
+    Async counterpart of `MovieRecommendationsView.list` for a movie.
+    """
+    await authenticate(request)
+
+    async def render_recommendations():
+        movies = [
+            movie async for movie in Movie.objects.filter(
+                recommended_by__source_id=movie_id
+            ).order_by('recommended_by__rank')
+        ]
+        if not movies:
+            movie = await Movie.objects.filter(pk=movie_id).afirst()
+            if movie is not None:
+                # The embedding index is searched in a worker thread.
+                movies = await afeed_movies(
+                    await sync_to_async(similar_movie_ids)(movie)
+                )
+        with timed('serialize'):
+            serializer = MovieSerializer(movies, many=True)
+            return JSONRenderer().render(serializer.data)
+
+    cache_key = await async_cache.make_key(
+        f'recommendations:{movie_id}',
+        exists=Movie.objects.filter(pk=movie_id).aexists
+    )
+    if cache_key is None:
+        return json_response(await render_recommendations())
+    return json_response(await async_cache.get_or_compute(
+        cache_key,
+        render_recommendations,
+        3600
+    ))
+
+
+async def user_recommendations(request):
+    """
+    Async counterpart of `MovieRecommendationsView.list` without a movie.
+    """
+    user = await authenticate(request)
+    movie_ids = None
+    if user is not None:
+        movie_ids, fresh = await aread_feed(user.pk)
+        if not fresh:
+            await sync_to_async(request_feed_refresh)(user.pk)
+    if not movie_ids:
+        movie_ids = await aread_trending_feed()
+    movies = await afeed_movies(movie_ids)
+    with timed('serialize'):
+        serializer = MovieSerializer(movies, many=True)
+        return json_response(JSONRenderer().render(serializer.data))
+
+
+async def movie_comments(request):
+    """
+    Async counterpart of `CommentViewSet.list` for the cached first page
+    of a movie's threads.
+    """
+    paginator = CreatedAtKeysetPagination()
+    if request.GET.get(paginator.cursor_query_param):
+        return None
+    try:
+        movie_id = int(request.GET['movie'])
+    except (KeyError, ValueError):
+        return None
+    await authenticate(request, required=True)
+
+    namespace_key = await async_cache.make_key(
+        f'comments:{movie_id}',
+        exists=Movie.objects.filter(pk=movie_id).aexists
+    )
+    if namespace_key is None:
+        return None
+    request = Request(request)
+    cache_key = paginator.get_cache_key(request, namespace_key)
+
+    async def render_page():
+        page = await paginator.apaginate_queryset(
+            CommentListSerializer.get_queryset(
+                Comment.objects.filter(movie_id=movie_id, parent__isnull=True)
+            ),
+            request
+        )
+        with timed('serialize'):
+            data = CommentListSerializer.to_representation(page)
+        return JSONRenderer().render(paginator.get_paginated_data(data))
+
+    return json_response(
+        await async_cache.get_or_compute(cache_key, render_page, 3600)
+    )
@@ -0,0 +1,187 @@
+"""
+JWT authentication without database reads on the hot path.
+
+The user of an access token is read from a per-process cache, then from
+Redis, and only on a miss from the database. Saving or deleting a user
+drops its Redis entry (see signals.py); other processes may serve their
+local copy for up to AUTH_USER_LOCAL_TTL seconds more.
+
+Rotated refresh tokens are blacklisted in Redis rather than in the
+token_blacklist tables, under one key per token that expires with the
+token. Redis keys (through the default cache):
+
+    auth:user:<user_id>     the user's field values, except the password,
+                            for AUTH_USER_CACHE_TTL
+    auth:blacklist:<jti>    set once the refresh token has been rotated
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import async_cache
+
+USER_KEY = 'auth:user:{}'
+BLACKLIST_KEY = 'auth:blacklist:{}'
+
+# Entries kept per process before the local cache is emptied.
+LOCAL_CACHE_SIZE = 10_000
+
+# str(user id) -> (expiry on the monotonic clock, field values); tokens
+# carry the id as a string.
+_local = {}
+
+
+def user_fields():
+    """
+    Returns the fields of a cached user, in order.
+    """
+    return [
+        field.attname
+        for field in get_user_model()._meta.concrete_fields
+        if field.attname != 'password'
+    ]
+
+
+def _remember(user_id, values):
+    if len(_local) >= LOCAL_CACHE_SIZE:
+        _local.clear()
+    _local[str(user_id)] = (
+        time.monotonic() + settings.AUTH_USER_LOCAL_TTL,
+        values
+    )
+
+
+def _recall(user_id):
+    entry = _local.get(str(user_id))
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _load_values(user_id):
+    values = get_user_model().objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id}
+    ).values_list(*user_fields()).first()
+    if values is not None:
+        cache.set(
+            USER_KEY.format(user_id),
+            values,
+            settings.AUTH_USER_CACHE_TTL
+        )
+    return values
+
+
+def _build_user(user_id, values):
+    if values is None:
+        return None
+    _remember(user_id, values)
+    # The password is deferred: reading it costs a query.
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, user_fields(), values)
+
+
+def get_cached_user(user_id):
+    """
+    Returns the user whose USER_ID_FIELD is `user_id`, or None.
+    """
+    values = _recall(user_id)
+    if values is None:
+        values = cache.get(USER_KEY.format(user_id))
+    if values is None:
+        values = _load_values(user_id)
+    return _build_user(user_id, values)
+
+
+async def aget_cached_user(user_id):
+    """
+    Async counterpart of `get_cached_user`.
+    """
+    values = _recall(user_id)
+    if values is None:
+        values = await async_cache.get(USER_KEY.format(user_id))
+    if values is None:
+        values = await sync_to_async(_load_values)(user_id)
+    return _build_user(user_id, values)
+
+
+def invalidate_user(user_id):
+    """
+    Drops the cached copies of a user in Redis and in this process.
+    """
+    _local.pop(str(user_id), None)
+    cache.delete(USER_KEY.format(user_id))
+
+
+def blacklist_token(token):
+    """
+    Blacklists a refresh token until it expires.
+
+    Returns False if it was already blacklisted, so that of two requests
+    rotating the same token only one succeeds.
+    """
+    ttl = max(int(token['exp'] - time.time()), 1)
+    return cache.add(
+        BLACKLIST_KEY.format(token[api_settings.JTI_CLAIM]), 1, ttl
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication resolving users through `get_cached_user`.
+    """
+
+    def get_user(self, validated_token):
+        return self.check_user(
+            validated_token,
+            get_cached_user(self.get_user_id(validated_token))
+        )
+
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of `get_user`.
+        """
+        return self.check_user(
+            validated_token,
+            await aget_cached_user(self.get_user_id(validated_token))
+        )
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            )
+
+    def check_user(self, validated_token, user):
+        """
+        Applies the checks of `JWTAuthentication.get_user` to a resolved
+        user.
+        """
+        if user is None:
+            raise AuthenticationFailed(
+                _('User not found'), code='user_not_found'
+            )
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive'
+            )
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."),
+                code='password_changed'
+            )
+        return user
@@ -0,0 +1,183 @@
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+VERSION_KEY = 'movies:version:{}'
+LOCK_KEY = '{}:lock'
+
+# Namespaces kept per movie, named '<namespace>:<movie id>'.
+MOVIE_NAMESPACES = ('detail', 'recommendations', 'comments')
+
+# How long a recompute may hold its lock, and how long other requests
+# wait for it before computing the value themselves (seconds).
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 2
+WAIT_INTERVAL = 0.05
+
+
+def new_version():
+    """
+    Returns a fresh version token: the creation time in seconds plus a
+    random suffix, so a token also tells when its namespace last changed.
+    """
+    return f'{int(time.time())}.{uuid.uuid4().hex[:8]}'
+
+
+def version_timestamp(version):
+    """
+    Returns the creation time (in seconds) encoded in a version token.
+    """
+    return int(version.split('.', 1)[0])
+
+
+def get_versions(*namespaces, exists=None):
+    """
+    Returns the current version tokens of the given namespaces, in order,
+    in a single cache round trip when they all exist.
+
+    Missing tokens are created, without expiry: tokens expiring together
+    would invalidate every namespace at once. Namespaces named after an
+    id taken from a request pass `exists`, which is called first: when it
+    returns False no token is created and None is returned, so that
+    requests for ids that do not exist leave no keys behind, and
+    `forget_movies` drops the tokens of deleted movies.
+    """
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing and exists is not None and not exists():
+        return None
+    for key in missing:
+        # add() keeps the token of whichever process got there first.
+        cache.add(key, new_version(), None)
+        versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version(namespace, exists=None):
+    """
+    Returns the current version token of a cache namespace, or None, see
+    `get_versions`.
+    """
+    versions = get_versions(namespace, exists=exists)
+    return versions and versions[0]
+
+
+def make_key(namespace, *parts, version=None, exists=None):
+    """
+    Returns a cache key inside the current version of `namespace`, or
+    inside `version` when the caller already looked it up. Returns None
+    when `exists` returns False, see `get_versions`.
+    """
+    version = version or get_version(namespace, exists=exists)
+    if version is None:
+        return None
+    return ':'.join(
+        ['movies', namespace, version] + [str(part) for part in parts]
+    )
+
+
+def bump(*namespaces):
+    """
+    Invalidates every key of the given namespaces by giving each a new
+    version token. Stale entries are never read again and expire on
+    their own.
+    """
+    cache.set_many(
+        {
+            VERSION_KEY.format(namespace): new_version()
+            for namespace in namespaces
+        },
+        None
+    )
+
+
+def invalidate_movies(movie_ids=()):
+    """
+    Invalidates the movie listing and the detail of the given movies.
+    """
+    bump('list', *(f'detail:{movie_id}' for movie_id in movie_ids))
+
+
+def forget_movies(movie_ids):
+    """
+    Invalidates the movie listing and drops the namespaces of the given
+    movies, which were deleted, along with their version tokens.
+    """
+    bump('list')
+    cache.delete_many([
+        VERSION_KEY.format(f'{namespace}:{movie_id}')
+        for namespace in MOVIE_NAMESPACES
+        for movie_id in movie_ids
+    ])
+
+
+def invalidate_movie_details(movie_ids=None):
+    """
+    Invalidates the detail of the given movies, or of every movie when
+    `movie_ids` is None.
+    """
+    if movie_ids is None:
+        bump('detail')
+    else:
+        bump(*(f'detail:{movie_id}' for movie_id in movie_ids))
+
+
+def invalidate_recommendations(movie_id):
+    """
+    Invalidates the cached recommendations of a movie.
+    """
+    bump(f'recommendations:{movie_id}')
+
+
+def invalidate_comments(*movie_ids):
+    """
+    Invalidates the cached first page of the movies' comment threads.
+    """
+    bump(*(f'comments:{movie_id}' for movie_id in movie_ids))
+
+
+def get_or_compute(key, compute, timeout, beta=1.0):
+    """
+    Returns the value cached under `key`, calling `compute()` to fill it.
+
+    Protects hot keys against stampedes in two ways:
+
+    - single flight: on a miss only the request holding the key's lock
+      recomputes; the others wait briefly for its result;
+    - early probabilistic refresh: a hit may trigger a recompute shortly
+      before expiry, with a probability that grows as expiry approaches
+      and with the time the last compute took (the "XFetch" algorithm),
+      so a hot key is usually refreshed before it expires at all.
+    """
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+
+    if entry is not None:
+        value, delta, expiry = entry
+        jitter = -delta * beta * math.log(1.0 - random.random())
+        if time.time() + jitter < expiry:
+            return value
+        # Someone else is already refreshing: keep serving this value.
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+
+    try:
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        cache.set(key, (value, delta, time.time() + timeout), timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
@@ -0,0 +1,341 @@
+"""
+Incrementally maintained item co-occurrence store.
+
+Every like or favorite created or deleted pushes an event naming the
+user and the movie onto a Redis queue (see movies/signals.py). The
+`apply_cooccurrence_events` task drains the queue in batches, reads the
+current weight of each named interaction from the database, updates the
+weighted co-occurrence counts of the affected movie pairs by the change
+from the weight already counted, and recomputes the MovieSimilarity
+neighbors of those movies only, so the cost of a run is proportional to
+the number of new events, not to the size of the history.
+
+Since events carry no weight, applying one twice, or one the batch
+build already read from the database, changes nothing.
+
+Redis keys:
+
+    cooc:queue      LIST of "<user_id>:<movie_id>" events
+    cooc:user:<id>  HASH movie id -> weight of the user's interactions
+                    already counted in the store
+    cooc:<movie>    ZSET other movie id -> weighted co-occurrence count,
+                    never trimmed, so counts stay exact; neighbors are
+                    scored among the COOCCURRENCE_CANDIDATES largest
+    cooc:norms      HASH movie id -> sum of squared interaction weights
+
+Similarities are the same cosine the nightly batch build computes; the
+batch build also reseeds this store (see `seed_cooccurrence`).
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from scipy import sparse
+
+from .models import FavoriteMovie, Like, Movie, MovieSimilarity
+from .recommender import FAVORITE_WEIGHT, LIKE_WEIGHT
+
+QUEUE_KEY = 'cooc:queue'
+USER_KEY = 'cooc:user:{}'
+ROW_KEY = 'cooc:{}'
+NORMS_KEY = 'cooc:norms'
+
+# Weight of each kind of interaction, the models that push events.
+EVENT_WEIGHTS = {
+    Like: LIKE_WEIGHT,
+    FavoriteMovie: FAVORITE_WEIGHT,
+}
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def push_events(events):
+    """
+    Queues `(user_id, movie_id)` events.
+    """
+    if events:
+        _redis().rpush(
+            QUEUE_KEY, *(f'{user}:{movie}' for user, movie in events)
+        )
+
+
+def pop_events(r, count):
+    """
+    Atomically removes and returns up to `count` queued events.
+    """
+    pipe = r.pipeline(transaction=True)
+    pipe.lrange(QUEUE_KEY, 0, count - 1)
+    pipe.ltrim(QUEUE_KEY, count, -1)
+    raw, _ = pipe.execute()
+    events = []
+    for event in raw:
+        # Events queued by earlier versions also carry a weight delta.
+        user_id, movie_id = event.decode().split(':')[:2]
+        events.append((int(user_id), int(movie_id)))
+    return events
+
+
+def current_weights(events):
+    """
+    Returns `{user_id: {movie_id: weight}}`, the weight each of the
+    `(user_id, movie_id)` events has in the database now, 0 when the user
+    no longer likes or favorites the movie.
+    """
+    weights = defaultdict(dict)
+    for user_id, movie_id in events:
+        weights[user_id][movie_id] = 0.0
+    for model, weight in EVENT_WEIGHTS.items():
+        rows = model.objects.filter(
+            user_id__in=list(weights),
+            movie_id__in={movie_id for _, movie_id in events}
+        ).values_list('user_id', 'movie_id')
+        for user_id, movie_id in rows:
+            if movie_id in weights[user_id]:
+                weights[user_id][movie_id] += weight
+    return dict(weights)
+
+
+def counted_weights(r, user_ids):
+    """
+    Returns `{user_id: {movie_id: weight}}` as currently counted in the
+    store for the given users.
+    """
+    pipe = r.pipeline()
+    for user_id in user_ids:
+        pipe.hgetall(USER_KEY.format(user_id))
+    return {
+        user_id: {
+            int(movie_id): float(weight) for movie_id, weight in row.items()
+        }
+        for user_id, row in zip(user_ids, pipe.execute())
+    }
+
+
+def cooccurrence_deltas(targets, weights):
+    """
+    Turns the new weights of a batch of interactions into co-occurrence
+    and norm deltas.
+
+    `targets` holds each user's new weights of the movies of the batch
+    (see `current_weights`), `weights` each user's counted weights before
+    the batch (see `counted_weights`). Returns `(pair_deltas,
+    norm_deltas, updated)` where `pair_deltas[i][j]` is the change of the
+    (symmetric) co-occurrence count of movies i and j, and
+    `updated[user][movie]` the user's new weight of every movie whose
+    weight changed.
+    """
+    pair_deltas = defaultdict(lambda: defaultdict(float))
+    norm_deltas = defaultdict(float)
+    updated = {}
+
+    for user_id, target in targets.items():
+        old = weights.get(user_id, {})
+        changed = {
+            movie_id: weight
+            for movie_id, weight in target.items()
+            if weight != old.get(movie_id, 0.0)
+        }
+        if not changed:
+            continue
+        new = {**old, **changed}
+        updated[user_id] = changed
+
+        for movie_id in changed:
+            new_m, old_m = new[movie_id], old.get(movie_id, 0.0)
+            norm_deltas[movie_id] += new_m * new_m - old_m * old_m
+            for other in new:
+                # Pairs of two changed movies are handled once.
+                if other == movie_id:
+                    continue
+                if other in changed and other < movie_id:
+                    continue
+                delta = new_m * new[other] - old_m * old.get(other, 0.0)
+                if delta:
+                    pair_deltas[movie_id][other] += delta
+                    pair_deltas[other][movie_id] += delta
+
+    return pair_deltas, norm_deltas, updated
+
+
+def apply_events(batch_size=None):
+    """
+    Drains up to `batch_size` queued events, updates the co-occurrence
+    store and recomputes the neighbors of every movie they touched.
+    Callers serialize writers of the store.
+
+    Returns the number of events applied.
+    """
+    r = _redis()
+    events = pop_events(r, batch_size or settings.COOCCURRENCE_BATCH_SIZE)
+    if not events:
+        return 0
+
+    weights = counted_weights(r, sorted({event[0] for event in events}))
+    pair_deltas, norm_deltas, updated = cooccurrence_deltas(
+        current_weights(events), weights
+    )
+    candidates = settings.COOCCURRENCE_CANDIDATES
+
+    pipe = r.pipeline()
+    for user_id, row in updated.items():
+        key = USER_KEY.format(user_id)
+        for movie_id, weight in row.items():
+            if weight > 0:
+                pipe.hset(key, movie_id, weight)
+            else:
+                pipe.hdel(key, movie_id)
+    for movie_id, delta in norm_deltas.items():
+        pipe.hincrbyfloat(NORMS_KEY, movie_id, delta)
+    for movie_id, row in pair_deltas.items():
+        key = ROW_KEY.format(movie_id)
+        for other, delta in row.items():
+            pipe.zincrby(key, delta, other)
+        # Pairs that no longer co-occur.
+        pipe.zremrangebyscore(key, '-inf', 0)
+    pipe.execute()
+
+    # A changed norm also moves the scores other movies give this one.
+    pipe = r.pipeline()
+    for movie_id in norm_deltas:
+        pipe.zrevrange(ROW_KEY.format(movie_id), 0, candidates - 1)
+    touched = set(pair_deltas) | set(norm_deltas)
+    for row in pipe.execute():
+        touched.update(int(other) for other in row)
+
+    if touched:
+        refresh_neighbors(r, touched)
+    return len(events)
+
+
+def refresh_neighbors(r, movie_ids):
+    """
+    Recomputes the top-K MovieSimilarity rows of `movie_ids` from the
+    co-occurrence store, among the COOCCURRENCE_CANDIDATES movies each
+    co-occurs with most.
+    """
+    movie_ids = sorted(movie_ids)
+    candidates = settings.COOCCURRENCE_CANDIDATES
+    pipe = r.pipeline()
+    for movie_id in movie_ids:
+        pipe.zrevrange(
+            ROW_KEY.format(movie_id), 0, candidates - 1, withscores=True
+        )
+    rows = {
+        movie_id: [(int(other), count) for other, count in row]
+        for movie_id, row in zip(movie_ids, pipe.execute())
+    }
+
+    needed = set(movie_ids) | {
+        other for row in rows.values() for other, _ in row
+    }
+    needed = sorted(needed)
+    norms = {
+        movie_id: float(norm or 0)
+        for movie_id, norm in zip(needed, r.hmget(NORMS_KEY, needed))
+    }
+    # Rows may still mention movies deleted since they were counted.
+    existing = set(
+        Movie.objects.filter(pk__in=needed).values_list('pk', flat=True)
+    )
+
+    k = settings.RECOMMENDER_NEIGHBORS
+    similarities = []
+    for movie_id, row in rows.items():
+        if movie_id not in existing or norms[movie_id] <= 0:
+            continue
+        scored = [
+            (count / math.sqrt(norms[movie_id] * norms[other]), other)
+            for other, count in row
+            if other in existing and norms[other] > 0
+        ]
+        scored.sort(reverse=True)
+        similarities.extend(
+            MovieSimilarity(movie_id=movie_id, similar_id=other, score=score)
+            for score, other in scored[:k]
+        )
+
+    with transaction.atomic():
+        MovieSimilarity.objects.filter(movie_id__in=movie_ids).delete()
+        MovieSimilarity.objects.bulk_create(similarities)
+
+
+def seed_cooccurrence(matrix, user_ids, movie_ids, block_size=2048):
+    """
+    Rebuilds the co-occurrence store from a full user x movie `matrix`
+    (as built by `recommender.build_interaction_matrix`). Callers
+    serialize writers of the store.
+    """
+    r = _redis()
+    matrix = sparse.csr_matrix(matrix)
+
+    # Drop everything but the queue.
+    stale = (
+        key for key in r.scan_iter(match='cooc:*')
+        if key.decode() != QUEUE_KEY
+    )
+    for keys in _batched(stale, 1000):
+        r.delete(*keys)
+
+    pipe = r.pipeline()
+    for row, user_id in enumerate(user_ids):
+        begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+        pipe.hset(USER_KEY.format(int(user_id)), mapping={
+            int(movie_ids[movie]): float(weight)
+            for movie, weight in zip(
+                matrix.indices[begin:end], matrix.data[begin:end]
+            )
+        })
+        if row % 1000 == 999:
+            pipe.execute()
+    pipe.execute()
+
+    by_movie = matrix.T.tocsr()
+    for start in range(0, matrix.shape[1], block_size):
+        block = (by_movie[start:start + block_size] @ matrix).tocsr()
+        for row in range(block.shape[0]):
+            movie_id = int(movie_ids[start + row])
+            begin, end = block.indptr[row], block.indptr[row + 1]
+            others = block.indices[begin:end]
+            counts = block.data[begin:end]
+
+            self_index = others == start + row
+            if self_index.any():
+                pipe.hset(NORMS_KEY, movie_id, float(counts[self_index][0]))
+            others, counts = others[~self_index], counts[~self_index]
+            if len(others):
+                pipe.zadd(ROW_KEY.format(movie_id), {
+                    int(movie_ids[other]): float(count)
+                    for other, count in zip(others, counts)
+                })
+        pipe.execute()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def queued_events():
+    """
+    Returns the number of events waiting in the queue.
+    """
+    return _redis().llen(QUEUE_KEY)
+
+
+def discard_events(count):
+    """
+    Drops the `count` oldest queued events, used once a full rebuild has
+    already accounted for them.
+    """
+    if count:
+        _redis().ltrim(QUEUE_KEY, count, -1)
@@ -0,0 +1,242 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Movie, SyncWatermark
+from .service import save_movies
+from .tmdb import tmdb_get
+
+# Crawlable TMDb listings and the endpoint each one reads from.
+SOURCES = {
+    'trending': '/trending/movie/week',
+    'popular': '/movie/popular',
+    'discover': '/discover/movie',
+}
+
+# TMDb refuses to page past this point on list endpoints.
+MAX_PAGE = 500
+
+# Longest span, in days, TMDb's change feed accepts per request.
+CHANGES_MAX_DAYS = 14
+# Name of the watermark of `sync_changes`.
+CHANGES_WATERMARK = 'tmdb_changes'
+# Runs a changed movie may fail to sync in before it is skipped.
+CHANGES_MAX_ATTEMPTS = 3
+
+
+def build_requests(sources, pages, stdout=None):
+    """
+    Expands the requested sources into `(path, params)` pairs, one per
+    page. The `discover` source is crawled once per TMDb genre, and
+    skipped when the genre list cannot be fetched.
+    """
+    pages = min(pages, MAX_PAGE)
+    jobs = []
+    for source in sources:
+        path = SOURCES[source]
+        if source == 'discover':
+            try:
+                genres = tmdb_get('/genre/movie/list').get('genres', [])
+            except requests.exceptions.RequestException as e:
+                genres = []
+                if stdout is not None:
+                    stdout.write(f"Failed to fetch the genre list: {e}")
+            variants = [{'with_genres': genre['id']} for genre in genres]
+        else:
+            variants = [{}]
+        for params in variants:
+            for page in range(1, pages + 1):
+                jobs.append((path, {**params, 'page': page}))
+    return jobs
+
+
+def crawl(sources=('trending',), pages=1, workers=4, stdout=None):
+    """
+    Fetches `pages` pages of each source concurrently and upserts every
+    page as soon as it arrives.
+
+    HTTP requests run on a thread pool sharing one keep-alive session and
+    one rate limiter; database writes stay on the calling thread.
+
+    Returns a dict with the number of pages fetched, pages failed and
+    movies saved.
+    """
+    stats = {'pages': 0, 'failed': 0, 'movies': 0}
+    jobs = build_requests(sources, pages, stdout)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(tmdb_get, path, params): (path, params)
+            for path, params in jobs
+        }
+        for future in as_completed(futures):
+            path, params = futures[future]
+            try:
+                data = future.result()
+            except requests.exceptions.RequestException as e:
+                stats['failed'] += 1
+                if stdout is not None:
+                    stdout.write(f"Failed to fetch {path} {params}: {e}")
+                continue
+            stats['pages'] += 1
+            stats['movies'] += len(save_movies(data.get('results', [])))
+
+    return stats
+
+
+def changed_movie_ids(executor, start, end):
+    """
+    Returns the TMDb ids of the movies changed from the date `start` to
+    the date `end`, inclusive. Pages after the first are fetched on
+    `executor`.
+    """
+    params = {'start_date': start.isoformat(), 'end_date': end.isoformat()}
+
+    def fetch(page):
+        return tmdb_get('/movie/changes', {**params, 'page': page})
+
+    first = fetch(1)
+    pages = [first, *executor.map(
+        fetch,
+        range(2, first.get('total_pages', 1) + 1)
+    )]
+    return list(dict.fromkeys(
+        result['id']
+        for data in pages
+        for result in data.get('results', [])
+        if result.get('id') is not None
+    ))
+
+
+def fetch_movie_details(tmdb_id):
+    """
+    Returns a TMDb movie in the shape of a listing result, or None if
+    TMDb no longer has it.
+    """
+    try:
+        data = tmdb_get(f'/movie/{tmdb_id}')
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+    # Details list genres as objects, listings as ids.
+    data['genre_ids'] = [genre['id'] for genre in data.get('genres', [])]
+    return data
+
+
+def sync_movies(executor, tmdb_ids, stats, stdout=None):
+    """
+    Re-fetches and upserts the movies of the catalog among `tmdb_ids`,
+    TMDB_SYNC_BATCH_SIZE at a time: each batch costs one lookup of the
+    catalog, the detail requests of the movies found and one upsert.
+
+    Returns the ids that could not be fetched.
+    """
+    failed = []
+    batch_size = settings.TMDB_SYNC_BATCH_SIZE
+    for i in range(0, len(tmdb_ids), batch_size):
+        known = Movie.objects.filter(
+            third_party_id__in=tmdb_ids[i:i + batch_size]
+        ).values_list('third_party_id', flat=True)
+        futures = {
+            executor.submit(fetch_movie_details, tmdb_id): tmdb_id
+            for tmdb_id in known
+        }
+        results = []
+        for future in as_completed(futures):
+            try:
+                data = future.result()
+            except requests.exceptions.RequestException as e:
+                failed.append(futures[future])
+                if stdout is not None:
+                    stdout.write(
+                        f"Failed to fetch movie {futures[future]}: {e}"
+                    )
+                continue
+            if data is not None:
+                results.append(data)
+        stats['movies'] += len(save_movies(results))
+
+    stats['failed'] += len(failed)
+    return failed
+
+
+def sync_window(executor, start, end, stats, stdout=None):
+    """
+    Re-fetches and upserts the movies of the catalog that TMDb changed
+    from `start` to `end`, see `sync_movies`.
+
+    Returns the ids that could not be fetched, or None if the changes
+    themselves could not be.
+    """
+    try:
+        changed = changed_movie_ids(executor, start, end)
+    except requests.exceptions.RequestException as e:
+        stats['failed'] += 1
+        if stdout is not None:
+            stdout.write(f"Failed to fetch changes {start} - {end}: {e}")
+        return None
+    stats['changed'] += len(changed)
+    return sync_movies(executor, changed, stats, stdout)
+
+
+def sync_changes(workers=4, stdout=None):
+    """
+    Re-fetches and upserts the movies of the catalog that TMDb changed
+    since the last sync, up to yesterday (UTC), so the cost follows the
+    volume of changes rather than the size of the catalog. Movies TMDb
+    changed but the catalog does not hold are left out.
+
+    Days are synced in windows of up to CHANGES_MAX_DAYS; the watermark
+    advances past a window once its changes were read, so an interrupted
+    sync resumes with that window. Movies that failed to sync are kept on
+    the watermark and retried first by the next runs, up to
+    CHANGES_MAX_ATTEMPTS runs in all, so one broken movie never holds the
+    watermark back. The first sync covers yesterday.
+
+    Returns a dict with the number of days synced, changed ids read,
+    movies saved and requests failed.
+    """
+    stats = {'days': 0, 'changed': 0, 'movies': 0, 'failed': 0}
+    end = timezone.now().date() - timedelta(days=1)
+    watermark, _ = SyncWatermark.objects.get_or_create(
+        name=CHANGES_WATERMARK,
+        defaults={'synced_until': end - timedelta(days=1)}
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if watermark.retries:
+            attempts = {
+                int(tmdb_id): count
+                for tmdb_id, count in watermark.retries.items()
+            }
+            failed = sync_movies(executor, list(attempts), stats, stdout)
+            watermark.retries = {}
+            for tmdb_id in failed:
+                if attempts[tmdb_id] + 1 < CHANGES_MAX_ATTEMPTS:
+                    watermark.retries[str(tmdb_id)] = attempts[tmdb_id] + 1
+                elif stdout is not None:
+                    stdout.write(
+                        f"Skipping movie {tmdb_id}: failed to sync "
+                        f"{CHANGES_MAX_ATTEMPTS} times"
+                    )
+            watermark.save(update_fields=['retries', 'updated_at'])
+
+        while watermark.synced_until < end:
+            start = watermark.synced_until + timedelta(days=1)
+            stop = min(start + timedelta(days=CHANGES_MAX_DAYS - 1), end)
+            failed = sync_window(executor, start, stop, stats, stdout)
+            if failed is None:
+                break
+            for tmdb_id in failed:
+                watermark.retries.setdefault(str(tmdb_id), 1)
+            watermark.synced_until = stop
+            watermark.save(
+                update_fields=['synced_until', 'retries', 'updated_at']
+            )
+            stats['days'] += (stop - start).days + 1
+
+    return stats
@@ -0,0 +1,284 @@
+"""
+Content-based movie embeddings and an approximate nearest-neighbor index.
+
+Every movie is embedded from its metadata (title tokens, genres, release
+year) by feature hashing into a fixed-size, L2-normalized float32 vector,
+so similar metadata gives a high cosine similarity.
+
+The vectors are indexed with an inverted file (IVF): a spherical k-means
+splits them into `n_lists` clusters, and the vectors of each cluster are
+stored contiguously. A query scores the cluster centroids, then only the
+vectors of the `nprobe` closest clusters. Index files, in
+EMBEDDING_INDEX_DIR:
+
+    vectors.npy     float32 (n, dim), grouped by cluster, memory-mapped
+    ids.npy         int64 (n,) movie id of each vector, memory-mapped
+    centroids.npy   float32 (n_lists, dim)
+    offsets.npy     int64 (n_lists + 1,) first row of each cluster
+"""
+import os
+import re
+import shutil
+from functools import lru_cache
+from hashlib import blake2b
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Movie
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of each kind of feature in an embedding.
+TITLE_WEIGHT = 1.0
+GENRE_WEIGHT = 1.5
+YEAR_WEIGHT = 1.0
+
+CHUNK_SIZE = 65536
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash_feature(feature, dim):
+    digest = int.from_bytes(
+        blake2b(feature.encode(), digest_size=8).digest(), 'little'
+    )
+    # The low bit picks the sign, so collisions tend to cancel out.
+    return (digest >> 1) % dim, 1.0 if digest & 1 else -1.0
+
+
+def features(title, genre_ids, release_date):
+    """
+    Returns the `(feature, weight)` pairs describing a movie.
+    """
+    tokens = set(TOKEN_RE.findall(title.lower()))
+    pairs = [(f't:{token}', TITLE_WEIGHT) for token in tokens]
+    pairs.extend((f'g:{genre}', GENRE_WEIGHT) for genre in genre_ids or ())
+    if release_date is not None:
+        year = release_date.year
+        pairs.append((f'y:{year}', YEAR_WEIGHT / 2))
+        pairs.append((f'd:{year // 10}', YEAR_WEIGHT))
+    return pairs
+
+
+def embed(title, genre_ids, release_date, dim=None):
+    """
+    Returns the normalized embedding of a movie's metadata.
+    """
+    dim = dim or settings.EMBEDDING_DIM
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in features(title, genre_ids, release_date):
+        index, sign = _hash_feature(feature, dim)
+        vector[index] += sign * weight
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def embed_movie(movie):
+    return embed(movie.title, movie.genre_ids, movie.release_date)
+
+
+def train_centroids(vectors, n_lists, iterations=10, seed=0):
+    """
+    Runs spherical k-means on `vectors` and returns the normalized
+    centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters restart from a random vector.
+        empty = norms == 0
+        sums[empty] = vectors[rng.choice(len(vectors), empty.sum())]
+        norms[empty] = 1
+        centroids = sums / norms[:, None]
+    return centroids.astype(np.float32)
+
+
+def assign(vectors, centroids):
+    """
+    Returns the index of the closest centroid of every vector.
+    """
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), CHUNK_SIZE):
+        chunk = vectors[start:start + CHUNK_SIZE]
+        assignment[start:start + CHUNK_SIZE] = np.argmax(
+            chunk @ centroids.T, axis=1
+        )
+    return assignment
+
+
+def write_index(directory, rows, count, n_lists=None, sample_size=100_000):
+    """
+    Embeds up to `count` `(movie_id, title, genre_ids, release_date)` rows
+    and writes an index to `directory`, replacing any previous one only
+    once the new one is complete.
+
+    Returns the number of movies indexed.
+    """
+    directory = Path(directory)
+    building = directory.with_name(directory.name + '.building')
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+
+    dim = settings.EMBEDDING_DIM
+    raw_path = building / 'raw.npy'
+    raw = np.lib.format.open_memmap(
+        raw_path, mode='w+', dtype=np.float32, shape=(max(count, 1), dim)
+    )
+    ids = np.empty(count, dtype=np.int64)
+    written = 0
+    for movie_id, title, genre_ids, release_date in rows:
+        if written == count:
+            break
+        raw[written] = embed(title, genre_ids, release_date, dim)
+        ids[written] = movie_id
+        written += 1
+    if not written:
+        shutil.rmtree(building)
+        return 0
+    raw, ids = raw[:written], ids[:written]
+
+    n_lists = min(n_lists or int(np.sqrt(written)) or 1, written)
+    rng = np.random.default_rng(0)
+    sample = raw[np.sort(rng.choice(
+        written, min(written, max(sample_size, n_lists)), replace=False
+    ))]
+    centroids = train_centroids(sample, n_lists)
+
+    assignment = assign(raw, centroids)
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.searchsorted(
+        assignment[order], np.arange(n_lists + 1)
+    ).astype(np.int64)
+
+    vectors = np.lib.format.open_memmap(
+        building / 'vectors.npy', mode='w+', dtype=np.float32,
+        shape=(written, dim)
+    )
+    for start in range(0, written, CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        vectors[start:end] = raw[order[start:end]]
+    vectors.flush()
+    del vectors, raw
+    raw_path.unlink()
+
+    np.save(building / 'ids.npy', ids[order])
+    np.save(building / 'centroids.npy', centroids)
+    np.save(building / 'offsets.npy', offsets)
+
+    # Processes still reading the old files keep them open until they
+    # reload, so the old directory can go right away.
+    old = directory.with_name(directory.name + '.old')
+    shutil.rmtree(old, ignore_errors=True)
+    if directory.exists():
+        os.replace(directory, old)
+    os.replace(building, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return written
+
+
+def build_index(directory=None, n_lists=None):
+    """
+    Rebuilds the embedding index from every movie in the database.
+
+    Returns the number of movies indexed.
+    """
+    rows = Movie.objects.order_by('pk').values_list(
+        'pk', 'title', 'genre_ids', 'release_date'
+    )
+    return write_index(
+        directory or settings.EMBEDDING_INDEX_DIR,
+        rows.iterator(chunk_size=10000),
+        rows.count(),
+        n_lists=n_lists
+    )
+
+
+class EmbeddingIndex:
+    """
+    A read-only IVF index over memory-mapped movie embeddings.
+    """
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.vectors = np.load(directory / 'vectors.npy', mmap_mode='r')
+        self.ids = np.load(directory / 'ids.npy', mmap_mode='r')
+        self.centroids = np.load(directory / 'centroids.npy')
+        self.offsets = np.load(directory / 'offsets.npy')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, vector, k, nprobe=None, exclude=()):
+        """
+        Returns up to `k` `(movie_id, score)` pairs closest to `vector` by
+        cosine similarity, best first.
+        """
+        nprobe = min(
+            nprobe or settings.EMBEDDING_NPROBE,
+            len(self.centroids)
+        )
+        centroid_scores = self.centroids @ vector
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        scores, ids = [], []
+        for cluster in lists:
+            begin, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if begin < end:
+                scores.append(self.vectors[begin:end] @ vector)
+                ids.append(self.ids[begin:end])
+        if not scores:
+            return []
+        scores, ids = np.concatenate(scores), np.concatenate(ids)
+        if exclude:
+            keep = ~np.isin(ids, list(exclude))
+            scores, ids = scores[keep], ids[keep]
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            scores, ids = scores[top], ids[top]
+        order = np.argsort(-scores, kind='stable')
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+_index = None
+_index_key = None
+
+
+def get_index():
+    """
+    Returns the index in EMBEDDING_INDEX_DIR, reloaded whenever it was
+    rebuilt, or None when none was built yet.
+    """
+    global _index, _index_key
+    directory = Path(settings.EMBEDDING_INDEX_DIR)
+    try:
+        key = (directory, os.stat(directory / 'ids.npy').st_mtime_ns)
+    except FileNotFoundError:
+        # Missing for a moment while a rebuild swaps directories.
+        return _index
+    if key != _index_key:
+        _index, _index_key = EmbeddingIndex(directory), key
+    return _index
+
+
+def similar_movie_ids(movie, k=20):
+    """
+    Returns the ids of up to `k` movies whose metadata is the most
+    similar to `movie`'s, best first.
+    """
+    index = get_index()
+    if index is None:
+        return []
+    return [
+        movie_id
+        for movie_id, _ in index.search(
+            embed_movie(movie), k, exclude={movie.pk}
+        )
+    ]
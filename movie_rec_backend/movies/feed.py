@@ -0,0 +1,187 @@
+"""
+Precomputed recommendation feeds stored in Redis.
+
+Each user's top `FEED_SIZE` recommendations are computed by a Celery task
+and kept in a sorted set, so serving a feed costs one Redis read plus one
+bulk fetch of the movies. Users without recommendations (and anonymous
+users) get a global trending feed, refreshed by Celery beat. Redis keys:
+
+    feed:user:<user_id>         ZSET movie id -> score, kept for FEED_TTL
+    feed:user:<user_id>:fresh   set while the feed needs no refresh;
+                                dropped when the user's likes or
+                                favorites change
+    feed:trending               ZSET movie id -> position, best highest
+"""
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, F
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .async_cache import get_redis as get_async_redis
+from .models import FavoriteMovie, Like, Movie
+from .recommender import (
+    FAVORITE_WEIGHT,
+    LIKE_WEIGHT,
+    recommended_movie_scores
+)
+
+FEED_KEY = 'feed:user:{}'
+FRESH_KEY = 'feed:user:{}:fresh'
+TRENDING_KEY = 'feed:trending'
+
+# Keeps the feed of a user without recommendations from looking missing.
+SENTINEL = 0
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def read_feed(user_id):
+    """
+    Returns `(movie_ids, fresh)` for a user in one round trip, best
+    recommendation first. `movie_ids` is None when no feed is stored.
+    """
+    pipe = _redis().pipeline()
+    pipe.zrevrange(FEED_KEY.format(user_id), 0, -1)
+    pipe.exists(FRESH_KEY.format(user_id))
+    return _parse_feed(*pipe.execute())
+
+
+async def aread_feed(user_id):
+    """
+    Async counterpart of `read_feed`.
+    """
+    pipe = get_async_redis().pipeline()
+    pipe.zrevrange(FEED_KEY.format(user_id), 0, -1)
+    pipe.exists(FRESH_KEY.format(user_id))
+    return _parse_feed(*await pipe.execute())
+
+
+def _parse_feed(members, fresh):
+    if not members:
+        return None, bool(fresh)
+    movie_ids = [int(member) for member in members]
+    return [m for m in movie_ids if m != SENTINEL], bool(fresh)
+
+
+def build_user_feed(user_id):
+    """
+    Recomputes and stores a user's feed.
+
+    Returns the number of movies in the feed.
+    """
+    r = _redis()
+    # Marked fresh before reading the database, so a like recorded while
+    # this runs marks the feed stale again instead of being lost.
+    r.set(FRESH_KEY.format(user_id), 1, ex=settings.FEED_FRESHNESS)
+    scores = recommended_movie_scores(user_id, settings.FEED_SIZE)
+
+    key = FEED_KEY.format(user_id)
+    pipe = r.pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, {SENTINEL: float('-inf'), **dict(scores)})
+    pipe.expire(key, settings.FEED_TTL)
+    pipe.execute()
+    return len(scores)
+
+
+def mark_feeds_stale(user_ids):
+    """
+    Flags the feeds of the given users for a refresh on their next read.
+    """
+    if user_ids:
+        _redis().delete(*(FRESH_KEY.format(user) for user in user_ids))
+
+
+def trending_scores(limit):
+    """
+    Returns up to `limit` `(movie_id, score)` pairs ranked by the likes and
+    favorites of the last TRENDING_WINDOW, padded with the newest releases.
+    """
+    since = timezone.now() - timedelta(seconds=settings.TRENDING_WINDOW)
+    scores = Counter()
+    weights = ((Like, LIKE_WEIGHT), (FavoriteMovie, FAVORITE_WEIGHT))
+    for model, weight in weights:
+        for movie_id, total in model.objects.filter(
+            created_at__gte=since
+        ).values('movie_id').annotate(
+            total=Count('pk')
+        ).values_list('movie_id', 'total'):
+            scores[movie_id] += total * weight
+
+    ranked = [
+        (movie_id, float(score))
+        for movie_id, score in scores.most_common(limit)
+    ]
+    if len(ranked) < limit:
+        newest = Movie.objects.exclude(
+            pk__in=scores
+        ).order_by(
+            F('release_date').desc(nulls_last=True), '-pk'
+        ).values_list(
+            'pk', flat=True
+        )[:limit - len(ranked)]
+        ranked.extend((movie_id, 0.0) for movie_id in newest)
+    return ranked
+
+
+def build_trending_feed():
+    """
+    Recomputes and stores the trending feed.
+
+    Returns its movie ids, best first.
+    """
+    movie_ids = [
+        movie_id for movie_id, _ in trending_scores(settings.FEED_SIZE)
+    ]
+    pipe = _redis().pipeline()
+    pipe.delete(TRENDING_KEY)
+    if movie_ids:
+        # Stored by position: padded releases all score 0.
+        pipe.zadd(TRENDING_KEY, {
+            movie_id: len(movie_ids) - position
+            for position, movie_id in enumerate(movie_ids)
+        })
+    pipe.execute()
+    return movie_ids
+
+
+def read_trending_feed():
+    """
+    Returns the trending feed, building it if it was never computed.
+    """
+    members = _redis().zrevrange(TRENDING_KEY, 0, -1)
+    if not members:
+        return build_trending_feed()
+    return [int(member) for member in members]
+
+
+async def aread_trending_feed():
+    """
+    Async counterpart of `read_trending_feed`.
+    """
+    members = await get_async_redis().zrevrange(TRENDING_KEY, 0, -1)
+    if not members:
+        return await sync_to_async(build_trending_feed)()
+    return [int(member) for member in members]
+
+
+def feed_movies(movie_ids):
+    """
+    Fetches the movies of a feed in one query, in feed order.
+    """
+    movies = Movie.objects.in_bulk(movie_ids)
+    return [movies[pk] for pk in movie_ids if pk in movies]
+
+
+async def afeed_movies(movie_ids):
+    """
+    Async counterpart of `feed_movies`.
+    """
+    movies = await Movie.objects.ain_bulk(movie_ids)
+    return [movies[pk] for pk in movie_ids if pk in movies]
@@ -0,0 +1,152 @@
+"""
+Redis write buffer for likes.
+
+When `LIKE_BUFFER_ENABLED` is set, likes are recorded in Redis instead of
+being inserted one by one, and a periodic Celery task flushes them to the
+`Like` table in batches. Duplicates are detected on the user's liked set
+of movies/membership.py, which buffered likes are added to right away.
+Redis keys:
+
+    likes:pending:<user_id>   SET of movie ids liked but not yet flushed
+    likes:pending             SET of user ids with pending likes
+"""
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from . import membership
+from .models import Like, Movie
+from .signals import bulk_create_pairs
+
+PENDING_KEY = 'likes:pending:{}'
+PENDING_USERS_KEY = 'likes:pending'
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def liked_movie_ids(user_id):
+    """
+    Returns the ids of every movie the user has liked, flushed or not.
+    """
+    r = _redis()
+    key = membership.ensure(r, Like, user_id)
+    return {int(member) for member in r.smembers(key)} - {
+        membership.SENTINEL
+    }
+
+
+def buffer_like(user_id, movie_id):
+    """
+    Records a like in Redis.
+
+    Returns False if the user has already liked the movie.
+    """
+    return buffer_likes(user_id, [movie_id])[0]
+
+
+def buffer_likes(user_id, movie_ids):
+    """
+    Records likes of one user in Redis, in two round trips.
+
+    Returns, for each movie in order, False if the user had already liked
+    it (including earlier in `movie_ids`).
+    """
+    r = _redis()
+    key = membership.ensure(r, Like, user_id)
+
+    pipe = r.pipeline()
+    for movie_id in movie_ids:
+        pipe.sadd(key, movie_id)
+    pipe.expire(key, settings.MEMBERSHIP_TTL)
+    added = [bool(n) for n in pipe.execute()[:-1]]
+    new_ids = [m for m, is_new in zip(movie_ids, added) if is_new]
+    if not new_ids:
+        return added
+
+    pipe = r.pipeline()
+    pipe.sadd(PENDING_KEY.format(user_id), *new_ids)
+    pipe.sadd(PENDING_USERS_KEY, user_id)
+    # Added again, with the generation, in case a seed that missed the
+    # pending likes replaced the set in between.
+    pipe.sadd(key, *new_ids)
+    membership.bump_generation(pipe, key)
+    pipe.execute()
+    return added
+
+
+def flush_user_likes(user_id):
+    """
+    Writes the user's pending likes to the database, so the user reads
+    their own likes back.
+
+    Returns the number of likes submitted.
+    """
+    return _flush(_redis(), [user_id])
+
+
+def flush_likes(batch_size=None):
+    """
+    Writes pending likes of up to `batch_size` users to the database.
+
+    Returns the number of likes submitted.
+    """
+    r = _redis()
+    user_ids = r.srandmember(
+        PENDING_USERS_KEY,
+        batch_size or settings.LIKE_BUFFER_BATCH_SIZE
+    )
+    return _flush(r, [int(user_id) for user_id in user_ids])
+
+
+def _flush(r, user_ids):
+    """
+    Inserts the pending likes of `user_ids` and then removes exactly the
+    flushed members from Redis.
+
+    Safe to run concurrently or to repeat after a crash: likes that
+    already exist are neither inserted nor counted again (see
+    `bulk_create_pairs`).
+    """
+    pipe = r.pipeline()
+    for user_id in user_ids:
+        pipe.smembers(PENDING_KEY.format(user_id))
+    pending = {
+        user_id: [int(movie_id) for movie_id in movie_ids]
+        for user_id, movie_ids in zip(user_ids, pipe.execute())
+        if movie_ids
+    }
+
+    # Movies deleted since they were liked would violate the foreign key.
+    existing = set(Movie.objects.filter(
+        pk__in={m for movie_ids in pending.values() for m in movie_ids}
+    ).values_list('pk', flat=True))
+    likes = [
+        Like(user_id=user_id, movie_id=movie_id)
+        for user_id, movie_ids in pending.items()
+        for movie_id in movie_ids
+        if movie_id in existing
+    ]
+    if likes:
+        with transaction.atomic():
+            bulk_create_pairs(Like, likes)
+
+    pipe = r.pipeline()
+    for user_id, movie_ids in pending.items():
+        pipe.srem(PENDING_KEY.format(user_id), *movie_ids)
+    for user_id in user_ids:
+        pipe.srem(PENDING_USERS_KEY, user_id)
+        pipe.scard(PENDING_KEY.format(user_id))
+    remaining = pipe.execute()[len(pending) + 1::2]
+
+    # A like buffered while we were flushing keeps its user pending.
+    requeue = [
+        user_id
+        for user_id, count in zip(user_ids, remaining)
+        if count
+    ]
+    if requeue:
+        r.sadd(PENDING_USERS_KEY, *requeue)
+
+    return len(likes)
@@ -0,0 +1,211 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from movies.management.commands.seed_benchmark_data import PASSWORD, USERNAME
+from movies.models import Comment, Movie
+
+
+def percentile(timings, q):
+    """
+    Returns the `q` percentile (0-100) of sorted `timings`.
+    """
+    return timings[min(len(timings) - 1, int(len(timings) * q / 100))]
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure the latency and query count of API endpoints
+    """
+    help = (
+        'Requests every benchmarked endpoint in-process, through the full '
+        'middleware and JWT authentication stack, and reports p50/p99 '
+        'latency and queries per request. Run it on data seeded by '
+        'seed_benchmark_data, with the settings_benchmark settings. The '
+        'JSON report of --output can be diffed with --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Number of timed requests per endpoint.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=20,
+            help='Number of untimed requests per endpoint, run first.'
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            help='Only run the named endpoint (repeatable).'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write a JSON report here.')
+        parser.add_argument(
+            '--compare',
+            help='JSON report of a previous run to compare against.'
+        )
+
+    def handle(self, *args, **options):
+        movie_ids = list(Movie.objects.filter(
+            third_party_id__lt=0
+        ).values_list('pk', flat=True))
+        thread_ids = list(Comment.objects.filter(
+            movie_id__in=movie_ids, parent__isnull=True
+        ).values_list('pk', flat=True)[:1000])
+        if not movie_ids or not thread_ids:
+            raise CommandError(
+                'No benchmark data: run seed_benchmark_data first.'
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.client = Client()
+        self.login()
+        endpoints = {
+            'movie_list': lambda: ('get', '/api/movies/', {}),
+            'movie_list_next_page': lambda: (
+                'get', self.movies_next_page, {}
+            ),
+            'movie_detail': lambda: (
+                'get', f'/api/movies/{self.rng.choice(movie_ids)}/', {}
+            ),
+            'movie_recommendations': lambda: (
+                'get',
+                f'/api/movies/{self.rng.choice(movie_ids)}/recommended/',
+                {}
+            ),
+            'user_recommendations': lambda: (
+                'get', '/api/recommendations/', {}
+            ),
+            'movie_comments': lambda: (
+                'get', '/api/comments/',
+                {'movie': self.rng.choice(movie_ids)}
+            ),
+            'comment_thread': lambda: (
+                'get',
+                f'/api/comments/{self.rng.choice(thread_ids)}/thread/',
+                {}
+            ),
+            'comment_list': lambda: ('get', '/api/comments/', {}),
+            'like_list': lambda: ('get', '/api/likes/', {}),
+            'favorite_list': lambda: ('get', '/api/favorites/', {}),
+            'token_refresh': lambda: (
+                'post', '/api/token/refresh/', {'refresh': self.refresh}
+            ),
+        }
+        selected = options['endpoint'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(
+                f"Unknown endpoints: {', '.join(sorted(unknown))}. "
+                f"Choose from: {', '.join(endpoints)}."
+            )
+        self.movies_next_page = self.client.get(
+            '/api/movies/', headers=self.headers
+        ).json()['next']
+
+        report = {
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'endpoints': {},
+        }
+        for name in selected:
+            report['endpoints'][name] = self.run(
+                endpoints[name], options['requests'], options['warmup']
+            )
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['endpoints']
+        self.write_table(report['endpoints'], baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def login(self):
+        response = self.client.post('/api/token/', {
+            'username': USERNAME.format(0),
+            'password': PASSWORD,
+        })
+        if response.status_code != 200:
+            raise CommandError(
+                f'Could not log in as {USERNAME.format(0)}: '
+                f'{response.status_code} {response.content[:200]!r}'
+            )
+        tokens = response.json()
+        self.refresh = tokens['refresh']
+        self.headers = {'Authorization': f"Bearer {tokens['access']}"}
+
+    def run(self, endpoint, count, warmup):
+        """
+        Requests an endpoint `warmup + count` times and returns the
+        statistics of the timed requests.
+        """
+        # Access tokens are short-lived; start every endpoint fresh.
+        self.login()
+        timings, queries, statuses = [], [], set()
+        for i in range(warmup + count):
+            method, path, data = endpoint()
+            request = getattr(self.client, method)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request(path, data, headers=self.headers)
+                elapsed = (time.perf_counter() - start) * 1000
+            if method == 'post' and response.status_code == 200:
+                # Rotated refresh tokens are single-use.
+                self.refresh = response.json().get('refresh', self.refresh)
+            if i < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': statistics.median(queries),
+            'max_queries': max(queries),
+            'statuses': sorted(statuses),
+        }
+
+    def write_table(self, results, baseline):
+        self.stdout.write(
+            f"{'endpoint':<24}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'queries':>9}{'max':>5}  status"
+        )
+        for name, stats in results.items():
+            line = (
+                f"{name:<24}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                f"{stats['queries']:>9g}{stats['max_queries']:>5}  "
+                f"{','.join(map(str, stats['statuses']))}"
+            )
+            before = baseline.get(name)
+            if before:
+                line += '  vs baseline: ' + ', '.join(
+                    self.change(key, before[key], stats[key])
+                    for key in ('p50_ms', 'p99_ms', 'queries')
+                )
+            self.stdout.write(line)
+
+    def change(self, key, before, after):
+        if key == 'queries':
+            return f'queries {after - before:+g}'
+        if not before:
+            return f'{key} n/a'
+        return f'{key} {(after - before) / before:+.0%}'
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import random
+import time
+from urllib import parse, request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.management.commands.benchmark_api import percentile
+from movies.management.commands.seed_benchmark_data import PASSWORD, USERNAME
+from movies.models import Comment, Movie
+
+# name -> weight, as in benchmarks/locustfile.py
+MIX = {
+    'movie_list': 10,
+    'movie_detail': 10,
+    'movie_recommendations': 5,
+    'user_recommendations': 5,
+    'movie_comments': 8,
+}
+
+
+async def read_response(reader):
+    """
+    Reads one HTTP/1.1 response. Returns its status and whether the
+    server keeps the connection open.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by the server')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'chunked' in headers.get('transfer-encoding', ''):
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return int(status), False
+
+    keep_alive = version == b'HTTP/1.1'
+    if 'connection' in headers:
+        keep_alive = headers['connection'] == 'keep-alive'
+    return int(status), keep_alive
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure how many concurrent clients one server
+    process sustains within a p99 latency budget
+    """
+    help = (
+        'Runs closed-loop load at increasing concurrency against a running '
+        'server, with the read mix of the Locust scenario, and reports '
+        'throughput and p50/p99 latency per level and the highest '
+        'concurrency whose p99 stays within --p99. Run the server with a '
+        'single process on data seeded by seed_benchmark_data, and this '
+        'command with the same settings. The JSON report of --output can '
+        'be compared with --compare, e.g. an ASGI run with a WSGI one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the server.'
+        )
+        parser.add_argument(
+            '--levels',
+            default='1,2,4,8,16,32,64,128',
+            help='Comma-separated numbers of concurrent clients.'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds of timed load per level.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=2,
+            help='Seconds of untimed load before each level.'
+        )
+        parser.add_argument(
+            '--p99',
+            type=float,
+            default=100,
+            help='p99 latency budget in milliseconds.'
+        )
+        parser.add_argument('--label', default='', help='Name of the run.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write a JSON report here.')
+        parser.add_argument(
+            '--compare',
+            help='JSON report of a previous run to compare against.'
+        )
+
+    def handle(self, *args, **options):
+        self.movie_ids = list(Movie.objects.filter(
+            third_party_id__lt=0
+        ).values_list('pk', flat=True))
+        self.comment_movie_ids = list(Comment.objects.filter(
+            movie_id__in=self.movie_ids, parent__isnull=True
+        ).values_list('movie_id', flat=True).distinct()[:1000])
+        if not self.movie_ids or not self.comment_movie_ids:
+            raise CommandError(
+                'No benchmark data: run seed_benchmark_data first.'
+            )
+        try:
+            levels = [int(level) for level in options['levels'].split(',')]
+        except ValueError:
+            raise CommandError('--levels must be comma-separated integers.')
+
+        url = parse.urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.base_url = options['url'].rstrip('/')
+        self.rng = random.Random(options['seed'])
+
+        report = {
+            'label': options['label'],
+            'p99_budget_ms': options['p99'],
+            'levels': {},
+        }
+        for level in levels:
+            # Access tokens are short-lived; start every level fresh.
+            self.login()
+            try:
+                stats = asyncio.run(
+                    self.run(level, options['duration'], options['warmup'])
+                )
+            except OSError as e:
+                raise CommandError(f'Could not reach {self.base_url}: {e}')
+            report['levels'][str(level)] = stats
+            self.stdout.write(
+                f"{level:>5} clients  {stats['throughput']:>8.1f} req/s  "
+                f"p50 {stats['p50_ms']:>8.2f} ms  "
+                f"p99 {stats['p99_ms']:>8.2f} ms  "
+                f"errors {stats['errors']}"
+            )
+        report['max_concurrency'] = self.max_concurrency(
+            report['levels'], options['p99']
+        )
+        self.write_summary(report, options['compare'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def login(self):
+        data = json.dumps({
+            'username': USERNAME.format(0),
+            'password': PASSWORD,
+        }).encode()
+        try:
+            with request.urlopen(request.Request(
+                f'{self.base_url}/api/token/',
+                data=data,
+                headers={'Content-Type': 'application/json'}
+            )) as response:
+                access = json.load(response)['access']
+        except OSError as e:
+            raise CommandError(
+                f'Could not log in as {USERNAME.format(0)} at '
+                f'{self.base_url}: {e}'
+            )
+        self.request_headers = (
+            f'Host: {self.host}:{self.port}\r\n'
+            f'Authorization: Bearer {access}\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        )
+
+    def next_path(self):
+        endpoint, = self.rng.choices(list(MIX), weights=MIX.values())
+        if endpoint == 'movie_comments':
+            movie_id = self.rng.choice(self.comment_movie_ids)
+            return f'/api/comments/?movie={movie_id}'
+        movie_id = self.rng.choice(self.movie_ids)
+        return {
+            'movie_list': '/api/movies/',
+            'movie_detail': f'/api/movies/{movie_id}/',
+            'movie_recommendations': (
+                f'/api/movies/{movie_id}/recommended/'
+            ),
+            'user_recommendations': '/api/recommendations/',
+        }[endpoint]
+
+    async def run(self, clients, duration, warmup):
+        """
+        Runs `clients` concurrent clients, each sending its next request
+        as soon as the previous one completed, and returns the statistics
+        of the requests started in the timed window.
+        """
+        timings, errors = [], []
+        start = time.monotonic() + warmup
+        end = start + duration
+
+        async def client():
+            reader = writer = None
+            while time.monotonic() < end:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        self.host, self.port
+                    )
+                sent = time.monotonic()
+                writer.write(
+                    f'GET {self.next_path()} HTTP/1.1\r\n'
+                    f'{self.request_headers}'.encode()
+                )
+                try:
+                    status, keep_alive = await read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status, keep_alive = None, False
+                elapsed = (time.monotonic() - sent) * 1000
+                if sent >= start:
+                    timings.append(elapsed)
+                    if status != 200:
+                        errors.append(status)
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            if writer is not None:
+                writer.close()
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+        if not timings:
+            raise CommandError('No request was timed: raise --duration.')
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'throughput': round(len(timings) / duration, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'errors': len(errors),
+        }
+
+    def max_concurrency(self, levels, budget):
+        """
+        Returns the highest level served within the p99 budget without
+        errors, with its throughput.
+        """
+        within = [
+            (int(level), stats['throughput'])
+            for level, stats in levels.items()
+            if stats['p99_ms'] <= budget and not stats['errors']
+        ]
+        if not within:
+            return None
+        level, throughput = max(within)
+        return {'clients': level, 'throughput': throughput}
+
+    def write_summary(self, report, compare):
+        runs = [report]
+        if compare:
+            with open(compare) as f:
+                runs.insert(0, json.load(f))
+        for run in runs:
+            best = run['max_concurrency']
+            name = run['label'] or 'this run'
+            if best is None:
+                self.stdout.write(
+                    f"{name}: no level within p99 {run['p99_budget_ms']:g} ms"
+                )
+            else:
+                self.stdout.write(
+                    f"{name}: {best['clients']} clients at "
+                    f"{best['throughput']:.1f} req/s within p99 "
+                    f"{run['p99_budget_ms']:g} ms"
+                )
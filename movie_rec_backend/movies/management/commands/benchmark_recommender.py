@@ -0,0 +1,67 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from movies.recommender import top_k_similar
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark the item-item similarity build
+    """
+    help = (
+        'Times the top-K similarity computation on a synthetic user x '
+        'movie matrix. Nothing is read from or written to the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--movies', type=int, default=100_000)
+        parser.add_argument(
+            '--interactions',
+            type=int,
+            default=20,
+            help='Average likes/favorites per user.'
+        )
+        parser.add_argument('--k', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        users, movies = options['users'], options['movies']
+        rng = np.random.default_rng(options['seed'])
+
+        # Movie popularity follows a power law, as real catalogs do.
+        popularity = 1 / (np.arange(movies) + 10) ** 0.8
+        popularity /= popularity.sum()
+        count = users * options['interactions']
+        matrix = sparse.csr_matrix(
+            (
+                np.ones(count, dtype=np.float32),
+                (
+                    rng.integers(0, users, count),
+                    rng.choice(movies, count, p=popularity),
+                )
+            ),
+            shape=(users, movies)
+        )
+        matrix.sum_duplicates()
+        self.stdout.write(
+            f'{users} users x {movies} movies, '
+            f'{matrix.nnz} interactions'
+        )
+
+        start = time.perf_counter()
+        neighbors = sum(
+            len(indexes)
+            for _, indexes, _ in top_k_similar(matrix, options['k'])
+        )
+        elapsed = time.perf_counter() - start
+
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed {neighbors} neighbors in {elapsed:.1f}s '
+            f'(peak RSS {peak_mb:.0f} MB)'
+        ))
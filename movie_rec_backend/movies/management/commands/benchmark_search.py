@@ -0,0 +1,137 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+
+from movies.models import Movie
+from movies.search import search_movies
+
+SYLLABLES = [
+    'ka', 'ro', 'mi', 'ta', 'len', 'dor', 'vi', 'sa', 'nu', 'bel', 'ar',
+    'go', 'the', 'ran', 'shi', 'mo', 'ul', 'fer', 'na', 'zo', 'qui', 'pe',
+]
+
+
+def make_vocabulary(size, seed=0):
+    """
+    Returns `size` distinct pronounceable pseudo-words, so synthetic
+    titles have a realistic spread of distinct terms.
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(
+            rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))
+        ))
+    return sorted(words)
+
+
+WORDS = make_vocabulary(5000)
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark title search on PostgreSQL
+    """
+    help = (
+        'Seeds synthetic movies inside a transaction, times title search '
+        'queries and rolls everything back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--movies',
+            type=int,
+            default=1_000_000,
+            help='Number of synthetic movies to seed.'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of queries to time per search mode.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Search benchmarks require PostgreSQL.')
+
+        try:
+            with transaction.atomic():
+                self.seed(options['movies'])
+                for mode in ('fulltext', 'prefix'):
+                    self.run(mode, options['queries'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Synthetic movies rolled back.')
+
+    def seed(self, count):
+        self.stdout.write(f'Seeding {count} movies...')
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            # Negative TMDb ids cannot collide with real movies.
+            cursor.execute(
+                """
+                INSERT INTO movies_movie (
+                    title, third_party_id, release_date, genre_ids,
+                    likes_count, comments_count, favorites_count
+                )
+                SELECT
+                    initcap(
+                        w[1 + floor(random() * n)::int] || ' '
+                        || w[1 + floor(random() * n)::int] || ' '
+                        || w[1 + floor(random() * n)::int]
+                    ),
+                    -g,
+                    date '1950-01-01' + floor(random() * 27000)::int,
+                    '[]'::jsonb, 0, 0, 0
+                FROM generate_series(1, %s) AS g,
+                    (SELECT %s::text[] AS w, %s AS n) AS words
+                """,
+                [count, WORDS, len(WORDS)]
+            )
+            cursor.execute('ANALYZE movies_movie')
+        self.stdout.write(
+            f'Seeded in {time.perf_counter() - start:.1f}s'
+        )
+
+    def run(self, mode, count):
+        terms = [self.make_term(mode) for _ in range(count)]
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            list(self.first_page(term, mode))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{mode}: p50={statistics.median(timings):.2f}ms '
+            f'p99={p99:.2f}ms over {count} queries'
+        )
+
+        queryset = self.first_page(terms[0], mode)
+        self.stdout.write(f'EXPLAIN ({mode}, q={terms[0]!r}):')
+        self.stdout.write(queryset.explain(analyze=True))
+
+    def make_term(self, mode):
+        if mode == 'prefix':
+            word = random.choice(WORDS)
+            return word[:random.randint(3, len(word))]
+        return ' '.join(random.sample(WORDS, random.randint(1, 2)))
+
+    def first_page(self, term, mode):
+        """
+        Returns the query the search endpoint runs for a first page.
+        """
+        return search_movies(Movie.objects.all(), term, mode).order_by(
+            F('rank').desc(nulls_last=True),
+            '-id'
+        )[:20]
+
+
+class _Rollback(Exception):
+    pass
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from movies.embeddings import build_index
+
+
+class Command(BaseCommand):
+    """
+    Django command to rebuild the content-based embedding index
+    """
+    help = 'Embeds every movie and rebuilds the nearest-neighbor index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lists',
+            type=int,
+            default=None,
+            help='Number of IVF clusters (default: sqrt of the movies).'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Building the embedding index...")
+        indexed = build_index(n_lists=options['lists'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} movies.')
+        )
@@ -1,6 +1,6 @@
-from django.core.management.base import BaseCommand
-from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
 
+from movies.crawler import SOURCES, crawl, sync_changes
 from movies.service import fetch_and_save_trending_movies
 
 
@@ -10,19 +10,73 @@ class Command(BaseCommand):
     """
     help = 'Fetches trending movies and saves them to the database.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--crawl',
+            action='store_true',
+            help='Crawl several pages of each source concurrently.'
+        )
+        parser.add_argument(
+            '--changes',
+            action='store_true',
+            help=(
+                'Re-fetch the movies TMDb changed since the last sync, as '
+                'the sync_tmdb_changes task does.'
+            )
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=1,
+            help='Number of pages to crawl per source (crawl mode only).'
+        )
+        parser.add_argument(
+            '--sources',
+            nargs='+',
+            choices=sorted(SOURCES),
+            default=['trending'],
+            help='TMDb listings to crawl (crawl mode only).'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent HTTP workers (crawl and changes modes).'
+        )
+
     def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be a positive integer.')
         self.stdout.write("Starting to fetch movies...")
         try:
-            fetch_and_save_trending_movies()
-            # Clear cache to reflect the new data
-            cache.clear()
+            if options['changes']:
+                stats = sync_changes(
+                    workers=options['workers'],
+                    stdout=self.stderr
+                )
+                self.stdout.write(
+                    f"Synced {stats['days']} days of changes: saved "
+                    f"{stats['movies']} of {stats['changed']} changed "
+                    f"movies ({stats['failed']} requests failed)."
+                )
+            elif options['crawl']:
+                stats = crawl(
+                    sources=options['sources'],
+                    pages=options['pages'],
+                    workers=options['workers'],
+                    stdout=self.stderr
+                )
+                self.stdout.write(
+                    f"Fetched {stats['pages']} pages "
+                    f"({stats['failed']} failed), "
+                    f"saved {stats['movies']} movies."
+                )
+            else:
+                fetch_and_save_trending_movies()
             self.stdout.write(
                 self.style.SUCCESS(
                     'Successfully fetched and saved movies.'
                 )
             )
-            self.stdout.write(
-                self.style.SUCCESS('Cache cleared.')
-            )
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'An error occurred: {e}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from movies.signals import recount_counters
+
+
+class Command(BaseCommand):
+    """
+    Django command to recompute the denormalized counters on Movie
+    """
+    help = 'Recomputes like, comment and favorite counters from scratch.'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling movie counters...")
+        updated = recount_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled counters on {updated} movies.')
+        )
@@ -0,0 +1,285 @@
+import datetime
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+from django.utils import timezone
+
+from movies.embeddings import build_index
+from movies.management.commands.benchmark_embeddings import GENRES
+from movies.management.commands.benchmark_search import WORDS
+from movies.models import (
+    Comment,
+    FavoriteMovie,
+    Like,
+    Movie,
+    MovieRecommendation
+)
+from movies.recommender import load_interaction_matrix, rebuild_similarities
+from movies.signals import recount_counters
+
+# Seeded users are named bench<n> and all share this password.
+USERNAME = 'bench{}'
+PASSWORD = 'benchmark'
+
+BATCH_SIZE = 5000
+
+
+def create_backdated(model, objs, timestamps):
+    """
+    Bulk creates `objs` with the given `created_at` timestamps, which
+    auto_now_add would otherwise overwrite with the current time.
+    """
+    objs = model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    for obj, created_at in zip(objs, timestamps):
+        obj.created_at = created_at
+    model.objects.bulk_update(objs, ['created_at'], batch_size=BATCH_SIZE)
+
+
+def clear_benchmark_data():
+    """
+    Deletes the seeded users and movies, and everything hanging off them.
+    """
+    get_user_model().objects.filter(
+        username__regex=r'^bench[0-9]+$'
+    ).delete()
+    # Negative TMDb ids cannot collide with real movies.
+    Movie.objects.filter(third_party_id__lt=0).delete()
+
+
+def seed_benchmark_data(users, movies, likes, favorites, comments,
+                        reply_ratio=0.3, recommended=0.5, seed=0):
+    """
+    Seeds a reproducible synthetic dataset: the same arguments always
+    produce the same rows. Movie popularity follows a power law and
+    interactions are spread over the last 30 days.
+
+    Returns the seeded `(user_ids, movie_ids)`.
+    """
+    rng = np.random.default_rng(seed)
+    now = timezone.now()
+
+    def timestamps(count):
+        return [
+            now - datetime.timedelta(seconds=int(s))
+            for s in rng.integers(0, 30 * 24 * 3600, count)
+        ]
+
+    password = make_password(PASSWORD)
+    User = get_user_model()
+    user_ids = [
+        user.pk for user in User.objects.bulk_create(
+            (
+                User(
+                    username=USERNAME.format(i),
+                    email=f'{USERNAME.format(i)}@example.com',
+                    password=password
+                )
+                for i in range(users)
+            ),
+            batch_size=BATCH_SIZE
+        )
+    ]
+
+    words = rng.choice(WORDS, (movies, 3))
+    years = rng.integers(0, 27000, movies)
+    movie_ids = [
+        movie.pk for movie in Movie.objects.bulk_create(
+            (
+                Movie(
+                    title=' '.join(words[i]).title(),
+                    third_party_id=-(i + 1),
+                    release_date=(
+                        datetime.date(1950, 1, 1)
+                        + datetime.timedelta(days=int(years[i]))
+                    ),
+                    genre_ids=sorted(
+                        rng.choice(GENRES, rng.integers(1, 4), replace=False)
+                        .tolist()
+                    ),
+                )
+                for i in range(movies)
+            ),
+            batch_size=BATCH_SIZE
+        )
+    ]
+
+    popularity = 1 / (np.arange(movies) + 10) ** 0.8
+    popularity /= popularity.sum()
+
+    def pairs(count):
+        # Likes and favorites are unique per (user, movie).
+        drawn = set(zip(
+            rng.choice(user_ids, count).tolist(),
+            rng.choice(movie_ids, count, p=popularity).tolist()
+        ))
+        return sorted(drawn)
+
+    for model, count in ((Like, likes), (FavoriteMovie, favorites)):
+        drawn = pairs(count)
+        create_backdated(
+            model,
+            [model(user_id=user, movie_id=movie) for user, movie in drawn],
+            timestamps(len(drawn))
+        )
+
+    seed_comments(
+        rng, user_ids, movie_ids, popularity, comments, reply_ratio,
+        timestamps
+    )
+    seed_recommendations(rng, movie_ids, recommended, now)
+    return user_ids, movie_ids
+
+
+def seed_comments(rng, user_ids, movie_ids, popularity, count, reply_ratio,
+                  timestamps):
+    """
+    Seeds top-level comments, then replies to them, and fills in the
+    materialized paths that bulk_create leaves empty.
+    """
+    replies = int(count * reply_ratio)
+    top_level = count - replies
+    create_backdated(
+        Comment,
+        [
+            Comment(user_id=user, movie_id=movie, text=f'Comment {i}')
+            for i, (user, movie) in enumerate(zip(
+                rng.choice(user_ids, top_level).tolist(),
+                rng.choice(movie_ids, top_level, p=popularity).tolist()
+            ))
+        ],
+        timestamps(top_level)
+    )
+    segment = LPad(Cast('id', output_field=CharField()), 10, Value('0'))
+    Comment.objects.filter(
+        movie_id__in=movie_ids, path=''
+    ).update(path=Concat(segment, Value('/')))
+    if not replies:
+        return
+
+    parents = list(Comment.objects.filter(
+        movie_id__in=movie_ids
+    ).values_list('pk', 'movie_id', 'created_at'))
+    chosen = rng.integers(0, len(parents), replies).tolist()
+    now = timezone.now()
+    create_backdated(
+        Comment,
+        [
+            Comment(user_id=user, movie_id=parents[p][1],
+                    parent_id=parents[p][0], text=f'Reply {i}')
+            for i, (user, p) in enumerate(zip(
+                rng.choice(user_ids, replies).tolist(), chosen
+            ))
+        ],
+        # Each reply comes some time after its parent.
+        [
+            parents[p][2] + (now - parents[p][2]) * share
+            for p, share in zip(chosen, rng.random(replies).tolist())
+        ]
+    )
+    parent_path = Comment.objects.filter(
+        pk=OuterRef('parent_id')
+    ).values('path')
+    Comment.objects.filter(
+        movie_id__in=movie_ids, path=''
+    ).update(path=Concat(
+        Subquery(parent_path, output_field=CharField()),
+        segment,
+        Value('/')
+    ))
+
+
+def seed_recommendations(rng, movie_ids, ratio, now, per_movie=10):
+    """
+    Gives a share of the movies a TMDb-like list of recommendations.
+    """
+    sources = rng.choice(
+        movie_ids, int(len(movie_ids) * ratio), replace=False
+    ).tolist()
+    edges = []
+    for source in sources:
+        recommended = rng.choice(movie_ids, per_movie + 1, replace=False)
+        recommended = [m for m in recommended.tolist() if m != source]
+        edges.extend(
+            MovieRecommendation(
+                source_id=source, recommended_id=movie, rank=rank,
+                score=1.0 / rank, fetched_at=now
+            )
+            for rank, movie in enumerate(recommended[:per_movie], start=1)
+        )
+    MovieRecommendation.objects.bulk_create(edges, batch_size=BATCH_SIZE)
+
+
+class Command(BaseCommand):
+    """
+    Django command to seed a synthetic dataset for benchmarks
+    """
+    help = (
+        'Seeds reproducible synthetic users, movies, likes, favorites, '
+        'comments and recommendations, then builds the derived data '
+        '(counters, similarities, embedding index). Seeded users are '
+        f'bench0, bench1, ... with the password "{PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--movies', type=int, default=10_000)
+        parser.add_argument('--likes', type=int, default=50_000)
+        parser.add_argument('--favorites', type=int, default=10_000)
+        parser.add_argument('--comments', type=int, default=50_000)
+        parser.add_argument(
+            '--reply-ratio',
+            type=float,
+            default=0.3,
+            help='Share of the comments that are replies.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously seeded data first.'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                clear_benchmark_data()
+            user_ids, movie_ids = seed_benchmark_data(
+                options['users'],
+                options['movies'],
+                options['likes'],
+                options['favorites'],
+                options['comments'],
+                reply_ratio=options['reply_ratio'],
+                seed=options['seed']
+            )
+            # bulk_create skips the counter signals.
+            recount_counters(movie_ids)
+        self.stdout.write(
+            f'Seeded {len(user_ids)} users and {len(movie_ids)} movies '
+            f'in {time.perf_counter() - start:.1f}s'
+        )
+
+        matrix, _, similar_ids = load_interaction_matrix()
+        written = rebuild_similarities(matrix, similar_ids)
+        indexed = build_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {written} movie similarities and indexed {indexed} '
+            f'movie embeddings in {time.perf_counter() - start:.1f}s'
+        ))
+
+        comments = Comment.objects.filter(
+            movie_id__in=movie_ids
+        ).aggregate(first=Min('pk'), last=Max('pk'))
+        self.stdout.write(
+            'Environment for benchmarks/locustfile.py:\n'
+            f'BENCHMARK_USERS={len(user_ids)} '
+            f'BENCHMARK_MOVIES={min(movie_ids)}-{max(movie_ids)} '
+            f"BENCHMARK_COMMENTS={comments['first']}-{comments['last']}"
+        )
@@ -0,0 +1,229 @@
+"""
+Per-user sets of the movies a user has liked and favorited, so pages of
+movies can be flagged for the user without database queries.
+
+A set is seeded from the database the first time it is read and is then
+kept up to date by the signals of movies/signals.py. Seeded sets hold
+SENTINEL: a set that a write recreated after it expired lacks it, and is
+seeded again rather than trusted.
+
+Every write also increments the generation of the set. A seed is built
+in a temporary key and renamed over the set only if the generation has
+not changed since it read the database, so that a write committed during
+the read is never undone by a stale seed. Redis keys:
+
+    likes:user:<user_id>       SET of liked movie ids, including likes
+                               still in the like buffer (see like_buffer.py)
+    favorites:user:<user_id>   SET of favorited movie ids
+    <set key>:generation       number of writes to the set
+
+All expire MEMBERSHIP_TTL seconds after they were last seeded or
+written.
+"""
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+from . import async_cache
+from .models import FavoriteMovie, Like
+
+KEYS = {
+    Like: 'likes:user:{}',
+    FavoriteMovie: 'favorites:user:{}',
+}
+
+# flag -> model of the set it is read from
+FLAGS = {
+    'liked': Like,
+    'favorited': FavoriteMovie,
+}
+
+# Marks a seeded set, and keeps it alive when the user has none yet.
+SENTINEL = 0
+
+GENERATION_KEY = '{}:generation'
+SEED_KEY = '{}:seed:{}'
+# Seeds attempted before a set written to all along is left unseeded.
+SEED_ATTEMPTS = 3
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def requested(query_params):
+    """
+    Returns whether a request asks for the flags with `?flags=true`.
+    """
+    return query_params.get('flags', '').lower() in ('1', 'true')
+
+
+def patch_headers(response, flagged):
+    """
+    Sets the caching headers of a response to a request for the flags:
+    it varies with the user, and is private when it holds the flags of
+    the user, so that shared caches never serve it to anyone else.
+    """
+    patch_vary_headers(response, ['Authorization'])
+    if flagged:
+        patch_cache_control(response, private=True)
+
+
+def seed(r, model, user_id):
+    """
+    Fills the user's set of `model` from the database (plus the likes
+    still buffered) and returns its key.
+
+    Writes to the set during a seed make it start over, up to
+    SEED_ATTEMPTS times; the set then stays unseeded and is seeded again
+    on its next read.
+    """
+    key = KEYS[model].format(user_id)
+    generation_key = GENERATION_KEY.format(key)
+    for _ in range(SEED_ATTEMPTS):
+        generation = r.get(generation_key)
+        movie_ids = list(
+            model.objects.filter(
+                user_id=user_id
+            ).values_list('movie_id', flat=True)
+        )
+        seed_key = SEED_KEY.format(key, uuid.uuid4().hex)
+        pipe = r.pipeline()
+        pipe.sadd(seed_key, SENTINEL, *movie_ids)
+        if model is Like:
+            from .like_buffer import PENDING_KEY
+            pipe.sunionstore(seed_key, seed_key, PENDING_KEY.format(user_id))
+        pipe.expire(seed_key, settings.MEMBERSHIP_TTL)
+        pipe.execute()
+        if _install(r, seed_key, key, generation_key, generation):
+            break
+        r.delete(seed_key)
+    return key
+
+
+def _install(r, seed_key, key, generation_key, generation):
+    """
+    Renames `seed_key` over `key` if the set is still at `generation`.
+
+    Returns whether it did.
+    """
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(generation_key)
+            if pipe.get(generation_key) != generation:
+                return False
+            pipe.multi()
+            pipe.rename(seed_key, key)
+            pipe.execute()
+        except WatchError:
+            return False
+    return True
+
+
+def ensure(r, model, user_id):
+    """
+    Seeds the user's set of `model` unless it is seeded, and returns its
+    key.
+    """
+    key = KEYS[model].format(user_id)
+    if r.sismember(key, SENTINEL):
+        return key
+    return seed(r, model, user_id)
+
+
+def add(model, pairs):
+    """
+    Adds `(user_id, movie_id)` pairs to the sets of `model`.
+    """
+    _write(model, pairs, 'sadd')
+
+
+def remove(model, pairs):
+    """
+    Removes `(user_id, movie_id)` pairs from the sets of `model`.
+    """
+    _write(model, pairs, 'srem')
+
+
+def _write(model, pairs, command):
+    if not pairs:
+        return
+    # One transaction: a seed sees either none or all of the writes.
+    pipe = _redis().pipeline()
+    for user_id, movie_id in pairs:
+        key = KEYS[model].format(user_id)
+        getattr(pipe, command)(key, movie_id)
+        pipe.expire(key, settings.MEMBERSHIP_TTL)
+        bump_generation(pipe, key)
+    pipe.execute()
+
+
+def bump_generation(pipe, key):
+    """
+    Queues, on a pipeline, the increment of the generation of the set at
+    `key`, which every write to the set goes with.
+    """
+    generation_key = GENERATION_KEY.format(key)
+    pipe.incr(generation_key)
+    pipe.expire(generation_key, settings.MEMBERSHIP_TTL)
+
+
+def _read(pipe, user_id, movie_ids):
+    """
+    Queues the reads of the flags of `movie_ids` on a pipeline. Each
+    reply starts with whether the set is seeded.
+    """
+    for model in FLAGS.values():
+        pipe.smismember(KEYS[model].format(user_id), [SENTINEL, *movie_ids])
+
+
+def _apply(movies, replies):
+    for flag, members in zip(FLAGS, replies):
+        for movie, member in zip(movies, members[1:]):
+            movie[flag] = bool(member)
+
+
+def _reseed(user_id, movie_ids, replies):
+    """
+    Seeds the sets whose reply shows they are not, and returns the
+    replies with those sets read again.
+    """
+    r = _redis()
+    replies = list(replies)
+    for i, model in enumerate(FLAGS.values()):
+        if not replies[i][0]:
+            key = seed(r, model, user_id)
+            replies[i] = r.smismember(key, [SENTINEL, *movie_ids])
+    return replies
+
+
+def annotate(user_id, movies):
+    """
+    Sets the `liked` and `favorited` flags of the user on serialized
+    `movies`, in one Redis round trip once the user's sets are seeded.
+    """
+    movie_ids = [movie['id'] for movie in movies]
+    pipe = _redis().pipeline(transaction=False)
+    _read(pipe, user_id, movie_ids)
+    replies = pipe.execute()
+    if not all(members[0] for members in replies):
+        replies = _reseed(user_id, movie_ids, replies)
+    _apply(movies, replies)
+
+
+async def aannotate(user_id, movies):
+    """
+    Async counterpart of `annotate`. Unseeded sets are seeded in a worker
+    thread.
+    """
+    movie_ids = [movie['id'] for movie in movies]
+    pipe = async_cache.get_redis().pipeline(transaction=False)
+    _read(pipe, user_id, movie_ids)
+    replies = await pipe.execute()
+    if not all(members[0] for members in replies):
+        replies = await sync_to_async(_reseed)(user_id, movie_ids, replies)
+    _apply(movies, replies)
@@ -0,0 +1,369 @@
+"""
+Prometheus-style metrics aggregated in Redis.
+
+Web processes and Celery workers record observations in a per-process
+buffer that is flushed to Redis at most every METRICS_FLUSH_INTERVAL
+seconds, so the `/metrics` endpoint of any web process serves the totals
+of all of them. Redis keys:
+
+    metrics:<name>   HASH of a histogram: '<labels>|<le>' -> observations
+                     in that bucket, '<labels>|sum' and '<labels>|count';
+                     of a counter: '<labels>' -> value
+
+Gauges (see `GAUGES`) are read from their source on every scrape.
+
+Requests picked by the performance middleware (see middleware.py) are
+additionally sampled: their database queries, cache reads and
+serialization are timed in a `Sample` bound to the request's context.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from django_redis.client import DefaultClient
+
+METRIC_KEY = 'metrics:{}'
+
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Time spent handling a request.', TIME_BUCKETS
+    ),
+    'http_requests_sampled_total': (
+        'counter', 'Requests whose queries, cache reads and serialization '
+        'were measured.', None
+    ),
+    'http_request_db_queries': (
+        'histogram', 'Database queries per sampled request.', COUNT_BUCKETS
+    ),
+    'http_request_db_duration_seconds': (
+        'histogram', 'Database time per sampled request.', TIME_BUCKETS
+    ),
+    'http_request_cache_duration_seconds': (
+        'histogram', 'Cache read time per sampled request.', TIME_BUCKETS
+    ),
+    'http_request_serialize_duration_seconds': (
+        'histogram', 'Serialization time per sampled request.', TIME_BUCKETS
+    ),
+    'http_request_cache_hits_total': (
+        'counter', 'Cache hits of sampled requests.', None
+    ),
+    'http_request_cache_misses_total': (
+        'counter', 'Cache misses of sampled requests.', None
+    ),
+    'http_request_cache_read_bytes_total': (
+        'counter', 'Bytes read from the cache by sampled requests.', None
+    ),
+    'celery_task_queue_wait_seconds': (
+        'histogram', 'Time tasks waited in the queue before starting.',
+        TIME_BUCKETS + (30, 60, 300, 900)
+    ),
+    'celery_task_duration_seconds': (
+        'histogram', 'Time spent running tasks.',
+        TIME_BUCKETS + (30, 60, 300, 900)
+    ),
+    'celery_task_retries_total': (
+        'counter', 'Task retries requested.', None
+    ),
+    'tmdb_request_duration_seconds': (
+        'histogram', 'Latency of each TMDb request attempt.', TIME_BUCKETS
+    ),
+    'tmdb_throttle_wait_seconds': (
+        'histogram', 'Time TMDb requests waited for the local rate limiter.',
+        TIME_BUCKETS
+    ),
+    'tmdb_response_bytes_total': (
+        'counter', 'Bytes received from TMDb.', None
+    ),
+    'tmdb_retries_total': (
+        'counter', 'TMDb request attempts retried.', None
+    ),
+    'tmdb_rate_limited_total': (
+        'counter', 'TMDb responses rejected with 429 Too Many Requests.',
+        None
+    ),
+    'tmdb_ingested_rows_total': (
+        'counter', 'Rows written from TMDb results, or skipped as invalid '
+        'or duplicate.', None
+    ),
+}
+
+
+def _broker_backlog():
+    from movie_rec_project.celery import app
+    with app.connection_for_read() as connection:
+        # Fail fast: a scrape must not wait out the broker retry policy.
+        connection.ensure_connection(max_retries=0)
+        with connection.channel() as channel:
+            return channel.queue_declare(
+                queue=app.conf.task_default_queue, passive=True
+            ).message_count
+
+
+def _cooccurrence_backlog():
+    from .cooccurrence import QUEUE_KEY
+    return get_redis_connection('default').llen(QUEUE_KEY)
+
+
+def _like_buffer_backlog():
+    from .like_buffer import PENDING_USERS_KEY
+    return get_redis_connection('default').scard(PENDING_USERS_KEY)
+
+
+# name -> (help, function returning the current value)
+GAUGES = {
+    'celery_queue_messages': (
+        'Tasks waiting in the default Celery queue.',
+        _broker_backlog
+    ),
+    'cooccurrence_events_pending': (
+        'Like/favorite events not yet applied to the co-occurrence store.',
+        _cooccurrence_backlog
+    ),
+    'like_buffer_users_pending': (
+        'Users with buffered likes not yet flushed to the database.',
+        _like_buffer_backlog
+    ),
+}
+
+_buffer = defaultdict(float)
+_buffer_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def format_labels(labels):
+    """
+    Returns labels in the exposition format, without the braces.
+    """
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for name, value in labels.items()
+    )
+
+
+def observe(name, value, **labels):
+    """
+    Records an observation of the histogram `name`.
+    """
+    buckets = METRICS[name][2]
+    index = bisect_left(buckets, value)
+    le = repr(float(buckets[index])) if index < len(buckets) else '+Inf'
+    prefix = format_labels(labels)
+    with _buffer_lock:
+        _buffer[name, f'{prefix}|{le}'] += 1
+        _buffer[name, f'{prefix}|sum'] += value
+        _buffer[name, f'{prefix}|count'] += 1
+
+
+def increment(name, value=1, **labels):
+    """
+    Adds `value` to the counter `name`.
+    """
+    with _buffer_lock:
+        _buffer[name, format_labels(labels)] += value
+
+
+def flush(force=False):
+    """
+    Writes the buffered observations to Redis, at most once every
+    METRICS_FLUSH_INTERVAL seconds unless forced.
+    """
+    global _buffer, _flushed_at
+    now = time.monotonic()
+    if not force and now - _flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return
+    with _buffer_lock:
+        pending, _buffer = _buffer, defaultdict(float)
+        _flushed_at = now
+    if not pending:
+        return
+    try:
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        for (name, field), value in pending.items():
+            pipe.hincrbyfloat(METRIC_KEY.format(name), field, value)
+        pipe.execute()
+    except Exception:
+        # Metrics must never fail a request or a task: a batch that
+        # cannot be written is dropped.
+        pass
+
+
+def _number(value):
+    value = float(value)
+    return repr(int(value)) if value.is_integer() else repr(value)
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    flush(force=True)
+    pipe = get_redis_connection('default').pipeline(transaction=False)
+    for name in METRICS:
+        pipe.hgetall(METRIC_KEY.format(name))
+
+    lines = []
+    for (name, (kind, help_text, buckets)), values in zip(
+        METRICS.items(), pipe.execute()
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        values = {
+            field.decode(): float(value) for field, value in values.items()
+        }
+        if kind == 'counter':
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{{{labels}}} {_number(value)}')
+            continue
+
+        series = sorted({field.rpartition('|')[0] for field in values})
+        for labels in series:
+            separator = ',' if labels else ''
+            total = 0
+            for le in [repr(float(b)) for b in buckets] + ['+Inf']:
+                total += values.get(f'{labels}|{le}', 0)
+                lines.append(
+                    f'{name}_bucket{{{labels}{separator}le="{le}"}} '
+                    f'{_number(total)}'
+                )
+            lines.append(
+                f'{name}_sum{{{labels}}} {values[labels + "|sum"]!r}'
+            )
+            lines.append(
+                f'{name}_count{{{labels}}} '
+                f'{_number(values[labels + "|count"])}'
+            )
+
+    for name, (help_text, read) in GAUGES.items():
+        try:
+            value = read()
+        except Exception:
+            # An unreachable source leaves its gauge out of the scrape.
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class Sample:
+    """
+    Measurements of one sampled request.
+    """
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_bytes = 0
+        self.cache_time = 0.0
+        self.spans = defaultdict(float)
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing every query.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+
+_sample = ContextVar('metrics_sample', default=None)
+
+
+def current_sample():
+    """
+    Returns the `Sample` of the current request, or None when the request
+    is not sampled.
+    """
+    return _sample.get()
+
+
+@contextmanager
+def sampling():
+    """
+    Samples the block: yields the `Sample` that its queries, cache reads
+    and timed spans are recorded in.
+    """
+    sample = Sample()
+    token = _sample.set(sample)
+    try:
+        yield sample
+    finally:
+        _sample.reset(token)
+
+
+@contextmanager
+def timed(span):
+    """
+    Adds the time spent in the block to `span` of the current sample.
+    Costs nothing outside sampled requests.
+    """
+    sample = _sample.get()
+    if sample is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.spans[span] += time.perf_counter() - start
+
+
+_MISSING = object()
+
+
+class InstrumentedRedisClient(DefaultClient):
+    """
+    django-redis client counting the hits, misses, bytes and time of the
+    cache reads of sampled requests.
+    """
+
+    def get(self, key, default=None, version=None, client=None):
+        sample = _sample.get()
+        if sample is None:
+            return super().get(key, default, version, client)
+        start = time.perf_counter()
+        value = super().get(key, _MISSING, version, client)
+        sample.cache_time += time.perf_counter() - start
+        if value is _MISSING:
+            sample.cache_misses += 1
+            return default
+        sample.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        sample = _sample.get()
+        if sample is None:
+            return super().get_many(keys, version, client)
+        keys = list(keys)
+        start = time.perf_counter()
+        values = super().get_many(keys, version, client)
+        sample.cache_time += time.perf_counter() - start
+        sample.cache_hits += len(values)
+        sample.cache_misses += len(keys) - len(values)
+        return values
+
+    def decode(self, value):
+        sample = _sample.get()
+        if sample is not None and isinstance(value, bytes):
+            sample.cache_bytes += len(value)
+        return super().decode(value)
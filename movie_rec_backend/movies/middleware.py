@@ -0,0 +1,137 @@
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async
+)
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """
+    Records the duration of every request in the metrics served by
+    `/metrics`, labelled by view, method and status.
+
+    A PERF_SAMPLE_RATE share of the requests is also sampled: their
+    database queries, cache reads and serialization are measured, added
+    to the metrics and reported to the client in a `Server-Timing`
+    header. Unsampled requests only pay for two clock reads and a
+    buffered histogram update.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Keeps the chain async under ASGI, so async views stay on the
+        # event loop.
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.PERF_METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return self.record(request, self.get_response(request), start)
+        with metrics.sampling() as sample, self.time_queries(sample):
+            response = self.get_response(request)
+        return self.record(request, response, start, sample)
+
+    async def __acall__(self, request):
+        if not settings.PERF_METRICS_ENABLED:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            response = await self.get_response(request)
+            return self.record(request, response, start)
+        with metrics.sampling() as sample:
+            # Database connections are per thread: wrap those of the
+            # thread the async ORM runs the request's queries in.
+            queries = await sync_to_async(self.time_queries)(sample)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(queries.close)()
+        return self.record(request, response, start, sample)
+
+    def time_queries(self, sample):
+        """
+        Returns an ExitStack timing the queries of the current thread in
+        `sample` until it is closed.
+        """
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(sample.record_query)
+            )
+        return stack
+
+    def record(self, request, response, start, sample=None):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe(
+            'http_request_duration_seconds',
+            duration,
+            view=view,
+            method=request.method,
+            status=response.status_code
+        )
+        if sample is not None:
+            self.record_sample(response, view, duration, sample)
+        metrics.flush()
+        return response
+
+    def record_sample(self, response, view, duration, sample):
+        metrics.increment('http_requests_sampled_total', view=view)
+        metrics.observe(
+            'http_request_db_queries', sample.db_queries, view=view
+        )
+        metrics.observe(
+            'http_request_db_duration_seconds', sample.db_time, view=view
+        )
+        metrics.observe(
+            'http_request_cache_duration_seconds', sample.cache_time,
+            view=view
+        )
+        metrics.observe(
+            'http_request_serialize_duration_seconds',
+            sample.spans['serialize'],
+            view=view
+        )
+        metrics.increment(
+            'http_request_cache_hits_total', sample.cache_hits, view=view
+        )
+        metrics.increment(
+            'http_request_cache_misses_total', sample.cache_misses, view=view
+        )
+        metrics.increment(
+            'http_request_cache_read_bytes_total', sample.cache_bytes,
+            view=view
+        )
+
+        timings = [
+            f'app;dur={duration * 1000:.2f}',
+            f'db;dur={sample.db_time * 1000:.2f};'
+            f'desc="{sample.db_queries} queries"',
+            f'cache;dur={sample.cache_time * 1000:.2f};'
+            f'desc="{sample.cache_hits} hits, {sample.cache_misses} misses, '
+            f'{sample.cache_bytes} B"',
+        ]
+        timings.extend(
+            f'{span};dur={elapsed * 1000:.2f}'
+            for span, elapsed in sample.spans.items()
+        )
+        response['Server-Timing'] = ', '.join(timings)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_alter_favoritemovie_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('fetched_at', models.DateTimeField()),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_by', to='movies.movie')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='movies.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source', 'rank'], name='movies_movi_source__f1e886_idx')],
+                'unique_together': {('source', 'recommended')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    updates = {}
+    for model_name, field in (
+        ('Like', 'likes_count'),
+        ('Comment', 'comments_count'),
+        ('FavoriteMovie', 'favorites_count'),
+    ):
+        model = apps.get_model('movies', model_name)
+        counts = model.objects.filter(
+            movie=OuterRef('pk')
+        ).order_by().values('movie').annotate(
+            total=Count('pk')
+        ).values('total')
+        updates[field] = Coalesce(
+            Subquery(counts, output_field=IntegerField()),
+            0
+        )
+    Movie.objects.update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_movierecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
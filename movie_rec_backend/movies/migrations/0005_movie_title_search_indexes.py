@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:47
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('title', config='english'), name='movie_title_search_idx'),
+    django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='movie_title_trgm_idx'),
+]
+
+
+def add_search_indexes(apps, schema_editor):
+    # GIN indexes only exist on PostgreSQL; other backends (SQLite for
+    # local tests) search without them.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Movie, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Movie, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_movie_counters'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='movie', index=index)
+                for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_search_indexes,
+                    remove_search_indexes
+                ),
+            ],
+        ),
+    ]
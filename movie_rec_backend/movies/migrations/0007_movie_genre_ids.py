@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+def genre_ids_field():
+    field = models.JSONField(blank=True, default=list)
+    field.set_attributes_from_name('genre_ids')
+    return field
+
+
+def add_genre_ids(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    if schema_editor.connection.vendor == 'sqlite':
+        # SQLite adds NOT NULL columns by rebuilding the table, which
+        # would replay the PostgreSQL-only indexes of migration 0005.
+        schema_editor.execute(
+            "ALTER TABLE movies_movie "
+            "ADD COLUMN genre_ids text NOT NULL DEFAULT '[]' "
+            "CHECK (JSON_VALID(genre_ids))"
+        )
+        return
+    schema_editor.add_field(Movie, genre_ids_field())
+
+
+def remove_genre_ids(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    schema_editor.remove_field(Movie, genre_ids_field())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_moviesimilarity'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='movie',
+                    name='genre_ids',
+                    field=models.JSONField(blank=True, default=list),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_genre_ids, remove_genre_ids),
+            ],
+        ),
+    ]
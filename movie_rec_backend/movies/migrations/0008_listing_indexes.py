@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+# SQLite cannot index with NULLS LAST; it lists movies without it.
+RELEASE_DATE_INDEX = models.Index(models.OrderBy(models.F('release_date'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='movie_release_date_idx')
+
+
+def add_release_date_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    schema_editor.add_index(Movie, RELEASE_DATE_INDEX)
+
+
+def remove_release_date_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Movie = apps.get_model('movies', 'Movie')
+    schema_editor.remove_index(Movie, RELEASE_DATE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_movie_genre_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['movie', '-created_at', '-id'], name='comment_movie_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-created_at', '-id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favoritemovie',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='like_user_created_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='movie',
+                    index=RELEASE_DATE_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_release_date_index,
+                    remove_release_date_index
+                ),
+            ],
+        ),
+    ]
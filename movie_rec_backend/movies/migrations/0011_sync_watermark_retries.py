@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_sync_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncwatermark',
+            name='retries',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
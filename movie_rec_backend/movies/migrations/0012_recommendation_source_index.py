@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_sync_watermark_retries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movierecommendation',
+            name='source',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='movies.movie'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Drops the PostgreSQL-only Movie indexes of migrations 0005 and 0008
+    from the model state. The database keeps them: they were created on
+    PostgreSQL only, and the state made SQLite replay them whenever it
+    rebuilt the table.
+    """
+
+    dependencies = [
+        ('movies', '0012_recommendation_source_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='movie',
+                    name='movie_release_date_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='movie',
+                    name='movie_title_search_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='movie',
+                    name='movie_title_trgm_idx',
+                ),
+            ],
+            database_operations=[],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0013_movie_postgresql_only_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-release_date', '-id'], name='movie_release_date_id_idx'),
+        ),
+    ]
@@ -11,11 +11,38 @@ class Movie(models.Model):
         third_party_id (int): An ID of the third party api.
         poster_url (url): The url of an image of the movie.
         release_date (DateTime): Timestamp of the movie
+        genre_ids (list): TMDb genre ids of the movie
+        likes_count (int): Denormalized number of likes
+        comments_count (int): Denormalized number of comments
+        favorites_count (int): Denormalized number of favorites
     """
     title = models.CharField(max_length=255)
     third_party_id = models.IntegerField(unique=True)
     poster_url = models.URLField(max_length=500, null=True, blank=True)
     release_date = models.DateField(null=True, blank=True)
+    genre_ids = models.JSONField(default=list, blank=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    favorites_count = models.PositiveIntegerField(default=0)
+
+    # Not in Meta.indexes, these exist on PostgreSQL only (SQLite would
+    # replay them on every table rebuild):
+    # - movie_release_date_idx, (release_date DESC NULLS LAST, id DESC)
+    #   for the listing order, created by migration 0008; PostgreSQL
+    #   sorts nulls first in a plain descending index;
+    # - movie_title_search_idx and movie_title_trgm_idx, GIN indexes on
+    #   the title's search vector and trigrams, created by migration 0005.
+    # Migration 0013 removed them from the model state only.
+
+    class Meta:
+        indexes = [
+            # The listing order on other databases, which sort nulls
+            # last in a descending index.
+            models.Index(
+                fields=['-release_date', '-id'],
+                name='movie_release_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         """
@@ -43,6 +70,12 @@ class FavoriteMovie(models.Model):
     
     class Meta:
         unique_together = ('user', 'movie',)
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='favorite_user_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} favorited {self.movie.title}"
@@ -55,18 +88,62 @@ class Comment(models.Model):
     Attributes:
         user (Foreignkey): The Foreignkey to a user model
         movie (Foreignkey): The Foreignkey to a movie model
+        parent (Foreignkey): The comment this one replies to, if any
+        path (str): Materialized path, the zero-padded ids of the\
+            comment's ancestors and its own, each followed by '/'
         text (Text): The content of the text
         created_at (DateTimeField): Timestamp to record when the\
             comment was added
     """
+    PATH_SEGMENT = '{:010d}/'
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    parent = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        related_name='replies',
+        on_delete=models.CASCADE
+    )
+    path = models.CharField(max_length=255, blank=True, editable=False)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Top-level comments of a movie, newest first
+            models.Index(
+                fields=['movie', '-created_at', '-id'],
+                condition=models.Q(parent__isnull=True),
+                name='comment_movie_thread_idx'
+            ),
+            # Subtrees, by path prefix
+            models.Index(
+                fields=['path'],
+                opclasses=['varchar_pattern_ops'],
+                name='comment_path_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='comment_created_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the comment, then fills in its path, which needs the
+        primary key.
+        """
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = parent_path + self.PATH_SEGMENT.format(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.movie.title}"
 
@@ -93,6 +170,102 @@ class Like(models.Model):
         Ensures a user can only 'like' a movie once
         """
         unique_together = ('user', 'movie',)
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='like_user_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} liked {self.movie.title}"
+
+
+class MovieRecommendation(models.Model):
+    """
+    An edge of the movie-to-movie recommendation graph fetched from TMDb.
+
+    Attributes:
+        source (Foreignkey): The movie the recommendations were fetched for
+        recommended (Foreignkey): The recommended movie
+        rank (int): Position of the recommendation in TMDb's list,\
+            starting at 1
+        score (float): Relevance of the recommendation (reciprocal rank)
+        fetched_at (DateTimeField): Timestamp of the fetch that\
+            produced the edge
+    """
+    # Indexed with the rank below, which also orders the recommendations.
+    source = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        db_index=False
+    )
+    recommended = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='recommended_by'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('source', 'recommended',)
+        indexes = [
+            models.Index(fields=['source', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.source.title} -> {self.recommended.title}"
+
+
+class MovieSimilarity(models.Model):
+    """
+    A precomputed item-item neighbor: `similar` is one of the movies most
+    often liked or favorited by the same users as `movie`.
+
+    Attributes:
+        movie (Foreignkey): The movie the neighbor belongs to
+        similar (Foreignkey): The neighboring movie
+        score (float): Cosine similarity between the two movies'\
+            interaction vectors
+    """
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='similarities'
+    )
+    similar = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('movie', 'similar',)
+
+    def __str__(self):
+        return f"{self.movie.title} ~ {self.similar.title}"
+
+
+class SyncWatermark(models.Model):
+    """
+    How far an incremental sync has progressed, so that it resumes there
+    after a restart.
+
+    Attributes:
+        name (str): The sync the watermark belongs to
+        synced_until (Date): The last day synced, but for `retries`
+        retries (JSON): Attempts so far of each id (as a string) that
+            failed to sync, retried on the next runs
+        updated_at (DateTimeField): Timestamp of the last advance
+    """
+    name = models.CharField(max_length=50, unique=True)
+    synced_until = models.DateField()
+    retries = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} until {self.synced_until}"
@@ -0,0 +1,222 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset (seek) pagination.
+
+    Rows are ordered by `ordering_field` descending with `id` as a
+    tie-breaker, and each page is fetched with a `WHERE (field, id) < (...)`
+    predicate instead of an OFFSET, so the cost of a page depends only on
+    the page size and not on how deep into the table the client is.
+    Null values of a `nullable` ordering field sort last.
+    """
+    ordering_field = None
+    # Whether `ordering_field` may be null. Orderings of a field that
+    # cannot be are left plain, to match a plain descending index.
+    nullable = True
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        """
+        Returns the requested page size, clamped to `max_page_size`.
+        """
+        try:
+            page_size = int(
+                request.query_params[self.page_size_query_param]
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """
+        Returns the `(value, id)` position encoded in the request cursor,
+        or None when the first page is requested.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            value = tokens['v'][0] or None
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def encode_cursor(self, instance):
+        """
+        Returns the opaque cursor pointing just past `instance`, a model
+        instance or a `values()` row.
+        """
+        if isinstance(instance, dict):
+            value, pk = instance[self.ordering_field], instance['id']
+        else:
+            value, pk = getattr(instance, self.ordering_field), instance.pk
+        querystring = parse.urlencode({
+            'v': self.format_value(value) if value is not None else '',
+            'i': pk,
+        })
+        return b64encode(querystring.encode('ascii')).decode('ascii')
+
+    def format_value(self, value):
+        """
+        Returns the string form of an ordering value stored in a cursor.
+        """
+        return value.isoformat()
+
+    def parse_value(self, queryset, value):
+        """
+        Converts an ordering value read from a cursor back for querying.
+        """
+        return queryset.model._meta.get_field(
+            self.ordering_field
+        ).to_python(value)
+
+    def get_cache_key(self, request, prefix):
+        """
+        Returns a cache key identifying the page requested by `request`.
+        Invalid cursors are rejected here, before any cache lookup.
+        """
+        position = self.decode_cursor(request)
+        cursor = 'first' if position is None else '%s.%d' % position
+        return '%s:%s:%d:%s' % (
+            prefix,
+            request.get_host(),
+            self.get_page_size(request),
+            cursor,
+        )
+
+    def filter_after(self, queryset, position):
+        """
+        Restricts `queryset` to rows that sort after `position`.
+        """
+        value, pk = position
+        field = self.ordering_field
+        if value is None:
+            return queryset.filter(**{f'{field}__isnull': True, 'id__lt': pk})
+        try:
+            value = self.parse_value(queryset, value)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        after = (
+            Q(**{f'{field}__lt': value})
+            | Q(**{field: value, 'id__lt': pk})
+        )
+        if self.nullable:
+            after |= Q(**{f'{field}__isnull': True})
+        return queryset.filter(after)
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Returns the query of the page requested by `request`, with one
+        extra row to learn whether a next page exists.
+        """
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.filter_after(queryset, position)
+        queryset = queryset.order_by(
+            F(self.ordering_field).desc(nulls_last=self.nullable or None),
+            '-id',
+        )
+        return queryset[:self.page_size_value + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size_value
+        self.page = results[:self.page_size_value]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(
+            list(self.get_page_queryset(queryset, request))
+        )
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async counterpart of `paginate_queryset`, for async views.
+        """
+        return self.set_page(
+            [row async for row in self.get_page_queryset(queryset, request)]
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_data(self, data):
+        """
+        Returns the page envelope as plain data, ready to be rendered.
+        """
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+
+class MovieKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over movies, newest release first.
+    """
+    ordering_field = 'release_date'
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination over search results, best match first.
+    """
+    ordering_field = 'rank'
+
+    def format_value(self, value):
+        return repr(value)
+
+    def parse_value(self, queryset, value):
+        return float(value)
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over user-owned objects, newest first.
+    """
+    ordering_field = 'created_at'
+    nullable = False
@@ -0,0 +1,166 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from scipy import sparse
+
+from .models import FavoriteMovie, Like, Movie, MovieSimilarity
+
+# Weight of each kind of interaction in the user x movie matrix.
+LIKE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+
+
+def build_interaction_matrix(interactions):
+    """
+    Builds the sparse user x movie matrix from `(user_id, movie_id,
+    weight)` triples. Repeated pairs (liked and favorited) are summed.
+
+    Returns `(matrix, user_ids, movie_ids)` where row `i` of the CSR
+    matrix belongs to user `user_ids[i]` and column `j` to movie
+    `movie_ids[j]`.
+    """
+    rows, cols, weights = [], [], []
+    for user_id, movie_id, weight in interactions:
+        rows.append(user_id)
+        cols.append(movie_id)
+        weights.append(weight)
+
+    user_ids, user_index = np.unique(
+        np.asarray(rows, dtype=np.int64),
+        return_inverse=True
+    )
+    movie_ids, movie_index = np.unique(
+        np.asarray(cols, dtype=np.int64),
+        return_inverse=True
+    )
+    matrix = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (user_index, movie_index)),
+        shape=(len(user_ids), len(movie_ids))
+    )
+    matrix.sum_duplicates()
+    return matrix, user_ids, movie_ids
+
+
+def top_k_similar(matrix, k, block_size=2048):
+    """
+    Computes the `k` most similar movies of every movie by cosine
+    similarity of their columns in the user x movie `matrix`.
+
+    The movie x movie product is computed one block of rows at a time, so
+    memory stays bounded by the block instead of the full product.
+
+    Yields `(movie_index, neighbor_indexes, scores)` for every movie with
+    at least one neighbor, best neighbor first.
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsr()
+    by_movie = normalized.T.tocsr()
+
+    n_movies = matrix.shape[1]
+    for start in range(0, n_movies, block_size):
+        block = (by_movie[start:start + block_size] @ normalized).tocsr()
+        for row in range(block.shape[0]):
+            begin, end = block.indptr[row], block.indptr[row + 1]
+            neighbors = block.indices[begin:end]
+            scores = block.data[begin:end]
+
+            keep = neighbors != start + row
+            neighbors, scores = neighbors[keep], scores[keep]
+            if not len(neighbors):
+                continue
+            if len(neighbors) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                neighbors, scores = neighbors[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            yield start + row, neighbors[order], scores[order]
+
+
+def load_interactions():
+    """
+    Streams every like and favorite as `(user_id, movie_id, weight)`.
+    """
+    for user_id, movie_id in Like.objects.values_list(
+        'user_id', 'movie_id'
+    ).iterator(chunk_size=10000):
+        yield user_id, movie_id, LIKE_WEIGHT
+    for user_id, movie_id in FavoriteMovie.objects.values_list(
+        'user_id', 'movie_id'
+    ).iterator(chunk_size=10000):
+        yield user_id, movie_id, FAVORITE_WEIGHT
+
+
+def load_interaction_matrix():
+    """
+    Returns the `(matrix, user_ids, movie_ids)` triple built from every
+    like and favorite in the database.
+    """
+    return build_interaction_matrix(load_interactions())
+
+
+def rebuild_similarities(matrix, movie_ids, k=None, batch_size=10000):
+    """
+    Recomputes the item-item neighbor table from an interaction matrix
+    and replaces its contents in a single transaction.
+
+    Returns the number of MovieSimilarity rows written.
+    """
+    k = k or settings.RECOMMENDER_NEIGHBORS
+
+    written = 0
+    with transaction.atomic():
+        MovieSimilarity.objects.all().delete()
+        batch = []
+        for index, neighbors, scores in top_k_similar(matrix, k):
+            movie_id = int(movie_ids[index])
+            batch.extend(
+                MovieSimilarity(
+                    movie_id=movie_id,
+                    similar_id=int(movie_ids[neighbor]),
+                    score=float(score)
+                )
+                for neighbor, score in zip(neighbors, scores)
+            )
+            if len(batch) >= batch_size:
+                MovieSimilarity.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        MovieSimilarity.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def interacted_movie_ids(user):
+    """
+    Returns the ids of the movies a user has liked or favorited.
+    """
+    return set(
+        Like.objects.filter(user=user).values_list('movie_id', flat=True)
+        .union(
+            FavoriteMovie.objects.filter(
+                user=user
+            ).values_list('movie_id', flat=True)
+        )
+    )
+
+
+def recommended_movie_scores(user, limit=10):
+    """
+    Returns up to `limit` `(movie_id, score)` pairs for a user, ranked by
+    the summed similarity of each candidate to the movies the user liked
+    or favorited. Movies the user already interacted with are excluded.
+    """
+    seen = interacted_movie_ids(user)
+    if not seen:
+        return []
+    return list(
+        Movie.objects.filter(
+            similar_to__movie_id__in=seen
+        ).exclude(
+            pk__in=seen
+        ).annotate(
+            score=Sum('similar_to__score')
+        ).order_by('-score', 'pk').values_list('pk', 'score')[:limit]
+    )
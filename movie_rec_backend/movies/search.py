@@ -0,0 +1,58 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast
+
+# Text search configuration of the title search index on Movie.
+SEARCH_CONFIG = 'english'
+
+SEARCH_MODES = ('fulltext', 'prefix')
+
+
+def title_search_vector():
+    """
+    Returns the tsvector expression covered by the GIN index on Movie.
+    Queries must use this exact expression for the index to apply.
+    """
+    return SearchVector('title', config=SEARCH_CONFIG)
+
+
+def search_movies(queryset, q, mode='fulltext'):
+    """
+    Filters `queryset` to movies whose title matches `q` and annotates
+    each one with a `rank` (higher is better).
+
+    - fulltext: stemmed full-text match on the title (websearch syntax),
+      ranked with ts_rank, backed by the tsvector GIN index;
+    - prefix: case-insensitive title prefix match for autocomplete,
+      ranked by trigram similarity, backed by the trigram GIN index.
+
+    The rank is cast from real to double precision, so that the value a
+    pagination cursor holds compares equal to the rank it was read from.
+
+    On databases other than PostgreSQL both modes fall back to a plain
+    LIKE match with a constant rank, which is enough for local tests.
+    """
+    if connection.vendor != 'postgresql':
+        lookup = {
+            'prefix': 'title__istartswith',
+        }.get(mode, 'title__icontains')
+        return queryset.filter(**{lookup: q}).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+
+    if mode == 'prefix':
+        return queryset.filter(title__istartswith=q).annotate(
+            rank=Cast(TrigramSimilarity('title', q), FloatField())
+        )
+
+    vector = title_search_vector()
+    query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.alias(search=vector).filter(search=query).annotate(
+        rank=Cast(SearchRank(vector, query), FloatField())
+    )
@@ -1,6 +1,14 @@
+from datetime import datetime
+
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import TokenError
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
 
+from .authentication import blacklist_token, get_cached_user
 from .models import Movie, FavoriteMovie, Comment, Like
 
 
@@ -59,13 +67,13 @@ class MovieSerializer(serializers.ModelSerializer):
     class Meta:
         model = Movie
         fields = '__all__'
-        read_only_fields = ('third_party_id', )
-
-    def get_total_likes(self, obj):
-        return obj.like_set.count()
-    
-    def get_total_comments(self, obj):
-        return obj.comment_set.count()
+        read_only_fields = (
+            'third_party_id',
+            'genre_ids',
+            'likes_count',
+            'comments_count',
+            'favorites_count',
+        )
 
 
 class FavoriteMovieSerializer(serializers.ModelSerializer):
@@ -83,9 +91,9 @@ class FavoriteMovieSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at']
 
     def validate(self, attrs):
-        user = self.context['reqeust'].user
+        user = self.context['request'].user
         movie = attrs.get('movie')
-        if FavoriteMovie.objects.filter(user=user, movie=movie).exits():
+        if FavoriteMovie.objects.filter(user=user, movie=movie).exists():
             raise serializers.ValidationError({
                 "detail": "You have already favorited this movie."
             })
@@ -105,6 +113,7 @@ class CommentSerializer(serializers.ModelSerializer):
             'id',
             'user',
             'movie',
+            'parent',
             'text',
             'created_at'
         ]
@@ -114,6 +123,25 @@ class CommentSerializer(serializers.ModelSerializer):
             'created_at'
         )
 
+    def validate(self, attrs):
+        """
+        Checks that a reply stays on its parent's movie and within the
+        nesting depth its materialized path can hold.
+        """
+        parent = attrs.get('parent')
+        if parent is None:
+            return attrs
+        if parent.movie_id != attrs['movie'].pk:
+            raise serializers.ValidationError({
+                'parent': ["The parent comment is on another movie."]
+            })
+        max_length = Comment._meta.get_field('path').max_length
+        if len(parent.path) + len(Comment.PATH_SEGMENT.format(0)) > max_length:
+            raise serializers.ValidationError({
+                'parent': ["This thread is nested too deeply."]
+            })
+        return attrs
+
 
 class LikeSerializer(serializers.ModelSerializer):
     """
@@ -144,8 +172,136 @@ class LikeSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class BufferedLikeSerializer(serializers.Serializer):
+    """
+    Validates a like recorded through the Redis like buffer. Duplicates
+    are detected in Redis, so no lookup on the Like table is made here.
+    """
+    movie = serializers.PrimaryKeyRelatedField(queryset=Movie.objects.all())
+
+
+class BulkMovieItemSerializer(serializers.Serializer):
+    """
+    Shape of one item of a batch of likes or favorites. Movies are looked
+    up for the whole batch at once by the view.
+    """
+    movie = serializers.IntegerField()
+
+
+class BulkCommentItemSerializer(serializers.Serializer):
+    """
+    Shape of one item of a batch of comments. Movies and parents are
+    looked up for the whole batch at once by the view.
+    """
+    movie = serializers.IntegerField()
+    parent = serializers.IntegerField(required=False, allow_null=True)
+    text = serializers.CharField()
+
+
+class ValuesListSerializer:
+    """
+    Read-only serializer for list endpoints.
+
+    Rows are fetched with `values()` in a single (joined) query and turned
+    into dicts directly, skipping model instances and per-field serializer
+    calls. `fields` maps each output key to the lookup it is read from;
+    the output matches the model serializer of the same endpoint.
+    """
+    fields = {}
+    datetime_field = serializers.DateTimeField()
+
+    @classmethod
+    def get_queryset(cls, queryset):
+        """
+        Restricts `queryset` to the values the endpoint needs.
+        """
+        return queryset.values(*cls.fields.values())
+
+    @classmethod
+    def to_representation(cls, rows):
+        to_datetime = cls.datetime_field.to_representation
+        return [
+            {
+                key: (
+                    to_datetime(row[lookup])
+                    if isinstance(row[lookup], datetime)
+                    else row[lookup]
+                )
+                for key, lookup in cls.fields.items()
+            }
+            for row in rows
+        ]
+
+
+class FavoriteMovieListSerializer(ValuesListSerializer):
+    fields = {
+        'id': 'id',
+        'user': 'user_id',
+        'movie': 'movie_id',
+        'created_at': 'created_at',
+    }
+
+
+class CommentListSerializer(ValuesListSerializer):
+    fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'movie': 'movie_id',
+        'parent': 'parent_id',
+        'text': 'text',
+        'created_at': 'created_at',
+    }
+
+
+class LikeListSerializer(ValuesListSerializer):
+    fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'movie': 'movie_id',
+        'created_at': 'created_at',
+    }
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email')
         read_only_fields = ('id', 'username', 'email',)
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Refreshes tokens without database reads: the user is read through the
+    authentication cache and rotated refresh tokens are blacklisted in
+    Redis (see authentication.py).
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM, None)
+        if user_id and not api_settings.USER_AUTHENTICATION_RULE(
+            get_cached_user(user_id)
+        ):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if (
+                api_settings.BLACKLIST_AFTER_ROTATION
+                and not blacklist_token(refresh)
+            ):
+                raise TokenError(_('Token is blacklisted'))
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,36 +1,121 @@
 import requests
-from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Movie
+from . import metrics
+from .cache import invalidate_movies
+from .models import Movie, MovieRecommendation
+from .tmdb import tmdb_get
+
+IMG_URL = "https://image.tmdb.org/t/p/w500"
+
+
+def normalize_movie(movie_data):
+    """
+    Converts a single TMDb result into an unsaved Movie instance.
+
+    Returns None for results that cannot be stored (missing id or title).
+    """
+    third_party_id = movie_data.get('id')
+    title = movie_data.get('title')
+    if third_party_id is None or not title:
+        return None
+
+    poster_path = movie_data.get('poster_path')
+    return Movie(
+        title=title[:255],
+        third_party_id=third_party_id,
+        poster_url=f"{IMG_URL}{poster_path}" if poster_path else None,
+        # TMDb sends an empty string for unknown release dates
+        release_date=movie_data.get('release_date') or None,
+        genre_ids=movie_data.get('genre_ids') or []
+    )
+
+
+def save_movies(results):
+    """
+    Upserts a page of TMDb results in a single query keyed on
+    `third_party_id`. Existing rows get their title, poster, release
+    date and genres refreshed, so concurrent workers ingesting the same
+    movie are safe. Cached listings and the details of the saved movies
+    are invalidated.
+
+    Returns the list of saved Movie instances.
+    """
+    movies = {}
+    for movie_data in results:
+        movie = normalize_movie(movie_data)
+        if movie is not None:
+            # The same movie twice in one statement is rejected by
+            # ON CONFLICT DO UPDATE, keep the last occurrence.
+            movies[movie.third_party_id] = movie
+
+    metrics.increment(
+        'tmdb_ingested_rows_total',
+        len(results) - len(movies),
+        table='movie',
+        outcome='skipped'
+    )
+    if not movies:
+        return []
+
+    saved = Movie.objects.bulk_create(
+        list(movies.values()),
+        update_conflicts=True,
+        unique_fields=['third_party_id'],
+        update_fields=['title', 'poster_url', 'release_date', 'genre_ids']
+    )
+    invalidate_movies([movie.pk for movie in saved])
+    metrics.increment(
+        'tmdb_ingested_rows_total',
+        len(saved),
+        table='movie',
+        outcome='upserted'
+    )
+    return saved
+
+
+def save_recommendations(source, movies):
+    """
+    Replaces the stored recommendations of `source` with `movies`, ranked
+    in the order given.
+
+    Returns the list of created MovieRecommendation edges.
+    """
+    fetched_at = timezone.now()
+    edges = [
+        MovieRecommendation(
+            source=source,
+            recommended=movie,
+            rank=rank,
+            score=1 / rank,
+            fetched_at=fetched_at
+        )
+        for rank, movie in enumerate(
+            (movie for movie in movies if movie.pk != source.pk),
+            start=1
+        )
+    ]
+
+    with transaction.atomic():
+        MovieRecommendation.objects.filter(source=source).delete()
+        edges = MovieRecommendation.objects.bulk_create(edges)
+    metrics.increment(
+        'tmdb_ingested_rows_total',
+        len(edges),
+        table='recommendation',
+        outcome='inserted'
+    )
+    return edges
 
 
 def fetch_and_save_trending_movies():
     """
     Fetches trending movies from the TMDb API and saves them to the database
     """
-    api_key = settings.TMDB_API_KEY
-    base_url = "https://api.themoviedb.org/3/trending/movie/week?"
-
     try:
-        response = requests.get(base_url, params={'api_key': api_key})
-        response.raise_for_status()  # Raises an HTTPError for bad response
-        data = response.json()
-        img_url = "https://image.tmdb.org/t/p/w500"
-
-        movies = data.get('results', [])
-
-        for movie_data in movies:
-            third_party_id = movie_data.get('id')
-            # Checks if the movie already exists in the database
-            if not Movie.objects.filter(
-                third_party_id=third_party_id
-            ).exists():
-                Movie.objects.create(
-                    title=movie_data.get('title'),
-                    third_party_id=third_party_id,
-                    poster_url=f"{img_url}{movie_data.get('poster_path')}",
-                    release_date=movie_data.get('release_date')
-                )
-                print(f"Saved new movie: {movie_data.get('title')}")
+        data = tmdb_get('/trending/movie/week')
+        movies = save_movies(data.get('results', []))
+        print(f"Saved {len(movies)} trending movies")
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from TMDb API: {e}")
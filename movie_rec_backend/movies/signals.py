@@ -0,0 +1,337 @@
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_process_shutdown
+)
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+
+from . import membership, metrics
+from .authentication import invalidate_user
+from .cache import (
+    forget_movies,
+    invalidate_comments,
+    invalidate_movie_details
+)
+from .cooccurrence import EVENT_WEIGHTS, push_events
+from .feed import mark_feeds_stale
+from .models import Comment, FavoriteMovie, Like, Movie
+
+# Message header holding the time (epoch seconds) a task was published.
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+# Denormalized counter on Movie maintained for each user-object model.
+COUNTER_FIELDS = {
+    Like: 'likes_count',
+    Comment: 'comments_count',
+    FavoriteMovie: 'favorites_count',
+}
+
+# The rows deleted so far by model, while `delete_rows` runs.
+_deleted_rows = ContextVar('deleted_rows', default=None)
+
+
+def update_counter(model, movie_id, delta):
+    """
+    Atomically adds `delta` to the counter of `model` on a movie.
+    """
+    field = COUNTER_FIELDS[model]
+    Movie.objects.filter(pk=movie_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    invalidate_movie_details([movie_id])
+
+
+def update_counters(model, objects, sign):
+    """
+    Atomically adds `sign` times the number of `objects` of each movie to
+    the counter of `model` on that movie, in a single UPDATE.
+    """
+    deltas = Counter(obj.movie_id for obj in objects)
+    field = COUNTER_FIELDS[model]
+    delta = Case(
+        *(
+            When(pk=movie_id, then=Value(sign * count))
+            for movie_id, count in deltas.items()
+        ),
+        output_field=IntegerField()
+    )
+    Movie.objects.filter(pk__in=deltas).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    invalidate_movie_details(list(deltas))
+
+
+def recount_counters(movie_ids=None):
+    """
+    Recomputes the counters of the given movies (all movies when None)
+    from the underlying tables in a single UPDATE. Too slow for the
+    request path, see the `reconcile_counters` command.
+
+    Returns the number of movies updated.
+    """
+    updates = {}
+    for model, field in COUNTER_FIELDS.items():
+        counts = model.objects.filter(
+            movie=OuterRef('pk')
+        ).order_by().values('movie').annotate(
+            total=Count('pk')
+        ).values('total')
+        updates[field] = Coalesce(
+            Subquery(counts, output_field=IntegerField()),
+            0
+        )
+
+    movies = Movie.objects.all()
+    if movie_ids is not None:
+        movies = movies.filter(pk__in=movie_ids)
+    updated = movies.update(**updates)
+    invalidate_movie_details(movie_ids)
+    return updated
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        update_counter(sender, instance.movie_id, 1)
+
+
+def add_membership(sender, instance, created, **kwargs):
+    if created:
+        pair = (instance.user_id, instance.movie_id)
+        transaction.on_commit(lambda: membership.add(sender, [pair]))
+
+
+def queue_added_interaction(sender, instance, created, **kwargs):
+    if created:
+        event = (instance.user_id, instance.movie_id)
+        transaction.on_commit(lambda: push_events([event]))
+
+
+def mark_feed_stale(sender, instance, created, **kwargs):
+    if created:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: mark_feeds_stale([user_id]))
+
+
+def invalidate_comment_page(sender, instance, created, **kwargs):
+    # Replies do not appear on the first page of threads.
+    if created and instance.parent_id is None:
+        movie_id = instance.movie_id
+        transaction.on_commit(lambda: invalidate_comments(movie_id))
+
+
+def row_deleted(sender, instance, **kwargs):
+    deleted = _deleted_rows.get()
+    if deleted is not None:
+        deleted[sender].append(instance)
+        return
+    update_counter(sender, instance.movie_id, -1)
+    _deleted(sender, [instance])
+
+
+def forget_deleted_movie(sender, instance, **kwargs):
+    movie_id = instance.pk
+    transaction.on_commit(lambda: forget_movies([movie_id]))
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+def bulk_created(model, objects):
+    """
+    Does for `objects` inserted with bulk_create, which sends no signals,
+    what the receivers above do on post_save, in a constant number of
+    queries. Call it in the transaction of the insert.
+    """
+    if not objects:
+        return
+    update_counters(model, objects, 1)
+    _bulk_interactions(model, objects)
+    _bulk_membership(model, objects, membership.add)
+    if model is Comment:
+        _invalidate_comment_pages(objects)
+
+
+def bulk_create_pairs(model, objects, attempts=3):
+    """
+    Inserts the `objects` of a model unique on (user, movie) whose pair
+    does not exist yet, and applies `bulk_created` to exactly those, so
+    that inserting the same pairs again never counts them twice. Call it
+    in a transaction.
+
+    A pair committed concurrently fails the insert, which is then retried
+    without it, up to `attempts` times.
+
+    Returns the objects inserted.
+    """
+    for attempt in range(attempts):
+        existing = set(model.objects.filter(
+            user_id__in={obj.user_id for obj in objects},
+            movie_id__in={obj.movie_id for obj in objects}
+        ).values_list('user_id', 'movie_id'))
+        new = {}
+        for obj in objects:
+            pair = (obj.user_id, obj.movie_id)
+            if pair not in existing:
+                new.setdefault(pair, obj)
+        new = list(new.values())
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(new)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+            continue
+        bulk_created(model, new)
+        return new
+
+
+def bulk_deleted(model, objects):
+    """
+    Undoes for deleted `objects` what the post_save receivers above do,
+    in a constant number of queries. Call it in the transaction of the
+    delete.
+    """
+    if not objects:
+        return
+    update_counters(model, objects, -1)
+    _deleted(model, objects)
+
+
+def delete_rows(queryset):
+    """
+    Deletes the rows of `queryset` with `QuerySet.delete()`, cascades
+    included, and applies `bulk_deleted` once per model to every row
+    deleted instead of row by row. Call it in a transaction.
+
+    Returns the number of rows deleted.
+    """
+    deleted = defaultdict(list)
+    token = _deleted_rows.set(deleted)
+    try:
+        count, _ = queryset.delete()
+    finally:
+        _deleted_rows.reset(token)
+    for model, objects in deleted.items():
+        bulk_deleted(model, objects)
+    return count
+
+
+def _deleted(model, objects):
+    _bulk_interactions(model, objects)
+    _bulk_membership(model, objects, membership.remove)
+    if model is Comment:
+        _invalidate_comment_pages(objects)
+
+
+def _bulk_interactions(model, objects):
+    if model not in EVENT_WEIGHTS:
+        return
+    events = [(obj.user_id, obj.movie_id) for obj in objects]
+    transaction.on_commit(lambda: push_events(events))
+    users = list({obj.user_id for obj in objects})
+    transaction.on_commit(lambda: mark_feeds_stale(users))
+
+
+def _bulk_membership(model, objects, write):
+    if model in membership.KEYS:
+        pairs = [(obj.user_id, obj.movie_id) for obj in objects]
+        transaction.on_commit(lambda: write(model, pairs))
+
+
+def _invalidate_comment_pages(comments):
+    # Replies do not appear on the first page of threads.
+    movie_ids = {c.movie_id for c in comments if c.parent_id is None}
+    if movie_ids:
+        transaction.on_commit(lambda: invalidate_comments(*movie_ids))
+
+
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+# perf_counter() at the start of each task running in this process.
+_task_started = {}
+
+
+def start_task_timer(task_id, task, **kwargs):
+    # Workers set message headers on the request, eager runs keep them
+    # apart.
+    request = task.request
+    enqueued_at = request.get(ENQUEUED_AT_HEADER) or (
+        request.headers or {}
+    ).get(ENQUEUED_AT_HEADER)
+    if enqueued_at is not None:
+        # A delayed task only starts waiting once its ETA is reached.
+        eta = request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        if eta is not None:
+            enqueued_at = max(enqueued_at, eta.timestamp())
+        metrics.observe(
+            'celery_task_queue_wait_seconds',
+            max(time.time() - enqueued_at, 0),
+            task=task.name
+        )
+    _task_started[task_id] = time.perf_counter()
+
+
+def stop_task_timer(task_id, task, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.observe(
+            'celery_task_duration_seconds',
+            time.perf_counter() - started,
+            task=task.name,
+            state=state or 'UNKNOWN'
+        )
+    metrics.flush()
+
+
+def count_task_retry(sender, **kwargs):
+    metrics.increment('celery_task_retries_total', task=sender.name)
+
+
+def flush_task_metrics(**kwargs):
+    metrics.flush(force=True)
+
+
+for model in COUNTER_FIELDS:
+    post_save.connect(increment_counter, sender=model)
+    post_delete.connect(row_deleted, sender=model)
+for model in membership.KEYS:
+    post_save.connect(add_membership, sender=model)
+for model in EVENT_WEIGHTS:
+    post_save.connect(queue_added_interaction, sender=model)
+    post_save.connect(mark_feed_stale, sender=model)
+post_save.connect(invalidate_comment_page, sender=Comment)
+post_delete.connect(forget_deleted_movie, sender=Movie)
+post_save.connect(invalidate_cached_user, sender=get_user_model())
+post_delete.connect(invalidate_cached_user, sender=get_user_model())
+before_task_publish.connect(stamp_enqueued_at)
+task_prerun.connect(start_task_timer)
+task_postrun.connect(stop_task_timer)
+task_retry.connect(count_task_retry)
+worker_process_shutdown.connect(flush_task_metrics)
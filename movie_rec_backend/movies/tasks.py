@@ -1,42 +1,206 @@
 from celery import shared_task
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 
+from .cache import invalidate_recommendations
+from .crawler import fetch_movie_details, sync_changes
+from .cooccurrence import (
+    apply_events,
+    discard_events,
+    queued_events,
+    seed_cooccurrence
+)
+from .embeddings import build_index
+from .feed import build_trending_feed, build_user_feed
+from .like_buffer import flush_likes
 from .models import Movie
+from .recommender import load_interaction_matrix, rebuild_similarities
+from .service import save_movies, save_recommendations
+from .tmdb import tmdb_get
+
+RECOMMENDATIONS_LOCK_KEY = 'movies:recommendations:lock:{}'
+RECOMMENDATIONS_FETCHED_KEY = 'movies:recommendations:fetched:{}'
+# Held while the co-occurrence store is being written.
+COOCCURRENCE_LOCK_KEY = 'movies:cooccurrence:lock'
+COOCCURRENCE_LOCK_TIMEOUT = 30 * 60
+FEED_LOCK_KEY = 'movies:feed:lock:{}'
+# Held while TMDb changes are being synced.
+SYNC_LOCK_KEY = 'movies:sync:lock'
+SYNC_LOCK_TIMEOUT = 60 * 60
 
 
 @shared_task
-def fetch_and_save_recommendations(movie_id):
+def fetch_and_save_recommendations(tmdb_id):
     """
-    Fetches and saves recommended movies for a given movie ID.
+    Fetches and saves recommended movies for a given TMDb movie ID, along
+    with the movie-to-movie recommendation edges. A movie missing from
+    the catalog is fetched and saved first.
     This task is designed to be run asynchronously.
     """
-    api_key = settings.TMDB_API_KEY
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/recommendations"
-
     try:
-        response = requests.get(url, params={'api_key': api_key})
-        response.raise_for_status()
-        data = response.json()
-        img_url = "https://image.tmdb.org/t/p/w500/"
-        std_out_msg = "Saved recommended movie:"
-
-        recommended_movies = data.get('results', [])
-
-        for movide_data in recommended_movies:
-            # Creat or recommend movie is created in database
-            third_party_id = movide_data.get('id')
-            if not Movie.objects.filter(
-                third_party_id=third_party_id
-            ).exists():
-                Movie.objects.create(
-                    title=movide_data.get('title'),
-                    third_party_id=third_party_id,
-                    poster_url=f"{img_url}{movide_data.get('poster_path')}",
-                    release_date=movide_data.get('release_date')
-                )
-                print(
-                    f"{std_out_msg} {movide_data.get('title')}"
-                )
+        source = Movie.objects.filter(third_party_id=tmdb_id).first()
+        if source is None:
+            data = fetch_movie_details(tmdb_id)
+            saved = save_movies([data]) if data is not None else []
+            if not saved:
+                print(f"Movie {tmdb_id} does not exist")
+                return
+            source = saved[0]
+
+        data = tmdb_get(f'/movie/{tmdb_id}/recommendations')
+        recommended_movies = save_movies(data.get('results', []))
+        save_recommendations(source, recommended_movies)
+
+        invalidate_recommendations(source.pk)
+        cache.set(
+            RECOMMENDATIONS_FETCHED_KEY.format(tmdb_id),
+            timezone.now().isoformat(),
+            settings.RECOMMENDATIONS_FRESHNESS
+        )
+        print(f"Saved {len(recommended_movies)} recommended movies")
     except requests.exceptions.RequestException as e:
         print(f"Error fetching recommendations: {e}")
+    finally:
+        cache.delete(RECOMMENDATIONS_LOCK_KEY.format(tmdb_id))
+
+
+@shared_task
+def sync_tmdb_changes():
+    """
+    Periodically re-fetches the movies TMDb changed since the last sync.
+    """
+    if not cache.add(SYNC_LOCK_KEY, 1, SYNC_LOCK_TIMEOUT):
+        return
+    try:
+        stats = sync_changes()
+    finally:
+        cache.delete(SYNC_LOCK_KEY)
+    print(
+        f"Synced {stats['days']} days of TMDb changes: "
+        f"{stats['movies']} of {stats['changed']} changed movies saved, "
+        f"{stats['failed']} requests failed"
+    )
+
+
+@shared_task
+def flush_like_buffer():
+    """
+    Periodically writes likes buffered in Redis to the database.
+    """
+    if not settings.LIKE_BUFFER_ENABLED:
+        return
+    flushed = flush_likes()
+    if flushed:
+        print(f"Flushed {flushed} buffered likes")
+
+
+@shared_task(bind=True)
+def build_movie_similarities(self):
+    """
+    Rebuilds the item-item neighbor table used for personalized
+    recommendations, and reseeds the incremental co-occurrence store
+    from the same data.
+    """
+    if not cache.add(COOCCURRENCE_LOCK_KEY, 1, COOCCURRENCE_LOCK_TIMEOUT):
+        # A batch of events is being applied; try again shortly.
+        raise self.retry(countdown=60)
+    try:
+        # Events already queued are included in the data read below;
+        # applying one that is not discarded in time changes nothing.
+        queued = queued_events()
+        matrix, user_ids, movie_ids = load_interaction_matrix()
+        written = rebuild_similarities(matrix, movie_ids)
+        seed_cooccurrence(matrix, user_ids, movie_ids)
+        discard_events(queued)
+    finally:
+        cache.delete(COOCCURRENCE_LOCK_KEY)
+    print(f"Saved {written} movie similarities")
+
+
+@shared_task
+def apply_cooccurrence_events():
+    """
+    Applies queued like/favorite events to the co-occurrence store and
+    refreshes the neighbors of the movies they touched.
+    """
+    if not cache.add(COOCCURRENCE_LOCK_KEY, 1, COOCCURRENCE_LOCK_TIMEOUT):
+        return
+    try:
+        applied = apply_events()
+    finally:
+        cache.delete(COOCCURRENCE_LOCK_KEY)
+    if applied:
+        print(f"Applied {applied} co-occurrence events")
+
+
+@shared_task
+def build_embedding_index():
+    """
+    Rebuilds the content-based embedding index of every movie.
+    """
+    indexed = build_index()
+    print(f"Indexed {indexed} movie embeddings")
+
+
+@shared_task
+def refresh_user_feed(user_id):
+    """
+    Recomputes the recommendation feed of a user.
+    """
+    try:
+        build_user_feed(user_id)
+    finally:
+        cache.delete(FEED_LOCK_KEY.format(user_id))
+
+
+@shared_task
+def refresh_trending_feed():
+    """
+    Recomputes the trending feed served to users without recommendations.
+    """
+    build_trending_feed()
+
+
+def request_recommendations(tmdb_id):
+    """
+    Enqueues `fetch_and_save_recommendations` for a TMDb movie unless its
+    recommendations were fetched recently or a fetch is already in
+    flight, so a burst of requests for one movie costs one TMDb call.
+
+    Returns 'fresh', 'pending' or 'queued'.
+    """
+    if cache.get(RECOMMENDATIONS_FETCHED_KEY.format(tmdb_id)) is not None:
+        return 'fresh'
+
+    lock_key = RECOMMENDATIONS_LOCK_KEY.format(tmdb_id)
+    # cache.add is atomic: only the first caller gets the lock.
+    if not cache.add(lock_key, 1, settings.RECOMMENDATIONS_LOCK_TIMEOUT):
+        return 'pending'
+
+    try:
+        fetch_and_save_recommendations.delay(tmdb_id)
+    except Exception:
+        cache.delete(lock_key)
+        raise
+    return 'queued'
+
+
+def request_feed_refresh(user_id):
+    """
+    Enqueues `refresh_user_feed` for a user unless a refresh is already
+    in flight.
+
+    Returns True if a task was enqueued.
+    """
+    lock_key = FEED_LOCK_KEY.format(user_id)
+    if not cache.add(lock_key, 1, settings.FEED_LOCK_TIMEOUT):
+        return False
+
+    try:
+        refresh_user_feed.delay(user_id)
+    except Exception:
+        cache.delete(lock_key)
+        raise
+    return True
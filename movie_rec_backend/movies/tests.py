@@ -1,3 +1,2240 @@
-from django.test import TestCase
+import datetime
+import importlib
+import json
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.asyncio.connection import SSLConnection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from movie_rec_project import urls as project_urls
+
+from . import (
+    async_cache,
+    authentication,
+    like_buffer,
+    membership,
+    metrics,
+    tasks,
+    urls as movie_urls
+)
+from .cache import (
+    LOCK_KEY,
+    VERSION_KEY,
+    bump,
+    get_or_compute,
+    get_version,
+    invalidate_movies,
+    invalidate_recommendations,
+    make_key
+)
+from .cooccurrence import (
+    apply_events,
+    cooccurrence_deltas,
+    counted_weights,
+    seed_cooccurrence
+)
+from .crawler import (
+    CHANGES_MAX_ATTEMPTS,
+    CHANGES_WATERMARK,
+    crawl,
+    sync_changes
+)
+from .embeddings import EmbeddingIndex, embed, write_index
+from .management.commands.seed_benchmark_data import (
+    clear_benchmark_data,
+    seed_benchmark_data
+)
+from .models import (
+    Comment,
+    FavoriteMovie,
+    Like,
+    Movie,
+    MovieRecommendation,
+    MovieSimilarity,
+    SyncWatermark
+)
+from .serializers import (
+    CommentSerializer,
+    FavoriteMovieSerializer,
+    LikeSerializer
+)
+from .recommender import (
+    FAVORITE_WEIGHT,
+    LIKE_WEIGHT,
+    build_interaction_matrix,
+    load_interaction_matrix,
+    rebuild_similarities
+)
+from .service import IMG_URL, save_movies
+from .signals import ENQUEUED_AT_HEADER, bulk_create_pairs
+from .views import LikeViewSet
+
+
+class StubTMDbHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the TMDb API. Each page of a listing returns two
+    movies; the first request for page 2 is rate limited. The change feed
+    has two pages of ids, whatever the dates; movie 404 does not exist
+    and the movies in `broken` fail.
+    """
+    rate_limited = set()
+    changes = [[1002, 5000], [1003, 404]]
+    broken = set()
+    # Whether the genre list fails
+    genres_broken = False
+    # Paths of the movie details requested
+    details = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+
+        if url.path == '/genre/movie/list':
+            if self.genres_broken:
+                return self.send_json({'status_code': 11}, 500)
+            return self.send_json({'genres': [{'id': 28}, {'id': 35}]})
+        if url.path.startswith('/movie/') and url.path[7:].isdigit():
+            self.details.append(url.path)
+            tmdb_id = int(url.path[7:])
+            if tmdb_id == 404:
+                return self.send_json({'status_code': 34}, 404)
+            if tmdb_id in self.broken:
+                return self.send_json({'status_code': 11}, 500)
+            return self.send_json({
+                'id': tmdb_id,
+                'title': f'Updated {tmdb_id}',
+                'release_date': '2025-01-01',
+                'genres': [{'id': 28, 'name': 'Action'}],
+            })
+        if page == 2 and url.path not in self.rate_limited:
+            self.rate_limited.add(url.path)
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        if url.path == '/movie/changes':
+            return self.send_json({
+                'results': [{'id': i} for i in self.changes[page - 1]],
+                'page': page,
+                'total_pages': len(self.changes),
+            })
+        if page > 2:
+            return self.send_json({'status_message': 'Invalid page'}, 422)
+
+        offset = {'/trending/movie/week': 0, '/movie/popular': 1000}.get(
+            url.path, 2000 + int(query.get('with_genres', ['0'])[0]) * 10
+        )
+        return self.send_json({'results': [
+            {
+                'id': offset + page * 2 + i,
+                'title': f'Movie {offset + page * 2 + i}',
+                'poster_path': '/poster.jpg',
+                'release_date': '2024-01-01',
+            }
+            for i in range(2)
+        ]})
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CrawlerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubTMDbHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubTMDbHandler.rate_limited = set()
+        StubTMDbHandler.details = []
+        StubTMDbHandler.broken = set()
+        StubTMDbHandler.genres_broken = False
+
+    def test_crawl_saves_every_page_and_retries_rate_limits(self):
+        with override_settings(TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0):
+            stats = crawl(
+                sources=['trending', 'popular', 'discover'],
+                pages=3,
+                workers=4
+            )
+
+        # 4 listings (trending, popular, 2 genres) x 2 valid pages
+        self.assertEqual(stats['pages'], 8)
+        self.assertEqual(stats['failed'], 4)
+        self.assertEqual(Movie.objects.count(), 16)
+
+    def test_crawl_without_the_genre_list_skips_discover(self):
+        StubTMDbHandler.genres_broken = True
+        log = StringIO()
+        with override_settings(
+            TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0, TMDB_MAX_RETRIES=0
+        ):
+            stats = crawl(
+                sources=['trending', 'discover'], pages=1, stdout=log
+            )
+
+        self.assertEqual(stats, {'pages': 1, 'failed': 0, 'movies': 2})
+        self.assertIn('Failed to fetch the genre list', log.getvalue())
+
+    def test_fetch_movies_rejects_non_positive_workers(self):
+        with self.assertRaisesMessage(CommandError, '--workers'):
+            call_command(
+                'fetch_movies', '--crawl', '--workers', '0',
+                stdout=StringIO()
+            )
+
+    def test_crawl_is_idempotent(self):
+        with override_settings(TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0):
+            crawl(sources=['trending'], pages=2)
+            crawl(sources=['trending'], pages=2)
+
+        self.assertEqual(Movie.objects.count(), 4)
+
+    def test_crawl_records_tmdb_metrics(self):
+        series = [
+            'tmdb_rate_limited_total{endpoint="/trending/movie/week"}',
+            'tmdb_retries_total{endpoint="/trending/movie/week",'
+            'reason="429"}',
+            'tmdb_ingested_rows_total{table="movie",outcome="upserted"}',
+            'tmdb_request_duration_seconds_count{'
+            'endpoint="/trending/movie/week",status="200"}',
+        ]
+
+        def read():
+            values = dict(
+                line.rsplit(' ', 1) for line in metrics.render().splitlines()
+                if not line.startswith('#')
+            )
+            return [float(values.get(name, 0)) for name in series]
+
+        before = read()
+        with override_settings(TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0):
+            crawl(sources=['trending'], pages=2)
+        self.assertEqual(
+            [after - was for after, was in zip(read(), before)],
+            [1, 1, 4, 2]
+        )
+
+    def test_sync_changes_refetches_changed_catalog_movies(self):
+        Movie.objects.bulk_create(
+            Movie(title='Old', third_party_id=i) for i in (1002, 1003, 404)
+        )
+        yesterday = timezone.now().date() - datetime.timedelta(days=1)
+        SyncWatermark.objects.create(
+            name=CHANGES_WATERMARK,
+            synced_until=yesterday - datetime.timedelta(days=20)
+        )
+        with override_settings(TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0):
+            stats = sync_changes()
+            again = sync_changes()
+
+        # Two windows: 14 days, then 6.
+        self.assertEqual(
+            stats, {'days': 20, 'changed': 8, 'movies': 4, 'failed': 0}
+        )
+        self.assertEqual(again['days'], 0)
+        self.assertEqual(
+            SyncWatermark.objects.get().synced_until, yesterday
+        )
+        self.assertNotIn('/movie/5000', StubTMDbHandler.details)
+        self.assertEqual(
+            dict(Movie.objects.values_list('third_party_id', 'title')),
+            {1002: 'Updated 1002', 1003: 'Updated 1003', 404: 'Old'}
+        )
+        self.assertEqual(
+            Movie.objects.get(third_party_id=1002).genre_ids, [28]
+        )
+
+    def test_failed_sync_keeps_the_watermark(self):
+        Movie.objects.create(title='Old', third_party_id=1002)
+        with override_settings(
+            TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0, TMDB_MAX_RETRIES=0
+        ):
+            stats = sync_changes()
+
+        # The second page of changes is rate limited, and not retried.
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['days'], 0)
+        self.assertEqual(
+            SyncWatermark.objects.get().synced_until,
+            timezone.now().date() - datetime.timedelta(days=2)
+        )
+
+    def test_failing_movie_is_retried_without_holding_the_watermark(self):
+        Movie.objects.bulk_create(
+            Movie(title='Old', third_party_id=i) for i in (1002, 1003)
+        )
+        StubTMDbHandler.broken = {1003}
+        # Changes are read in full: only the movie fails.
+        StubTMDbHandler.rate_limited = {'/movie/changes'}
+        yesterday = timezone.now().date() - datetime.timedelta(days=1)
+        with override_settings(
+            TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0, TMDB_MAX_RETRIES=0
+        ):
+            stats = sync_changes()
+            watermark = SyncWatermark.objects.get()
+            self.assertEqual(stats['failed'], 1)
+            self.assertEqual(watermark.synced_until, yesterday)
+            self.assertEqual(watermark.retries, {'1003': 1})
+
+            # Only the failed movie is fetched again, until it syncs.
+            StubTMDbHandler.details = []
+            sync_changes()
+            self.assertEqual(StubTMDbHandler.details, ['/movie/1003'])
+            self.assertEqual(SyncWatermark.objects.get().retries, {'1003': 2})
+            StubTMDbHandler.broken = set()
+            stats = sync_changes()
+
+        self.assertEqual(stats['movies'], 1)
+        self.assertEqual(SyncWatermark.objects.get().retries, {})
+        self.assertEqual(
+            Movie.objects.get(third_party_id=1003).title, 'Updated 1003'
+        )
+
+    def test_movie_failing_every_attempt_is_skipped(self):
+        Movie.objects.create(title='Old', third_party_id=1003)
+        StubTMDbHandler.broken = {1003}
+        StubTMDbHandler.rate_limited = {'/movie/changes'}
+        with override_settings(
+            TMDB_BASE_URL=self.base_url, TMDB_BACKOFF=0, TMDB_MAX_RETRIES=0
+        ):
+            for _ in range(CHANGES_MAX_ATTEMPTS):
+                sync_changes()
+
+        self.assertEqual(SyncWatermark.objects.get().retries, {})
+        self.assertEqual(
+            StubTMDbHandler.details, ['/movie/1003'] * CHANGES_MAX_ATTEMPTS
+        )
+
+
+class SaveMoviesTests(TestCase):
+    """
+    Pages of TMDb results are upserted in one query keyed on the TMDb id.
+    """
+
+    def test_upsert_keeps_the_last_duplicate(self):
+        movie = Movie.objects.create(
+            title='Old', third_party_id=1, likes_count=3
+        )
+        version = get_version(f'detail:{movie.pk}')
+        with self.assertNumQueries(1):
+            saved = save_movies([
+                {'id': 1, 'title': 'First'},
+                {'id': 2, 'title': 'Two', 'release_date': ''},
+                {'id': 1, 'title': 'Last', 'poster_path': '/last.jpg'},
+                {'title': 'No id'},
+                {'id': 3},
+            ])
+
+        self.assertEqual(len(saved), 2)
+        movie.refresh_from_db()
+        self.assertEqual(
+            (movie.title, movie.poster_url, movie.likes_count),
+            ('Last', f'{IMG_URL}/last.jpg', 3)
+        )
+        self.assertIsNone(Movie.objects.get(third_party_id=2).release_date)
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertNotEqual(get_version(f'detail:{movie.pk}'), version)
+
+
+class SeedBenchmarkDataTests(TestCase):
+    """
+    The benchmark dataset is reproducible and consistent with what the
+    API would have written.
+    """
+
+    def test_seeded_threads_and_timestamps(self):
+        seed_benchmark_data(
+            users=5, movies=20, likes=40, favorites=10, comments=30
+        )
+        self.assertFalse(Comment.objects.filter(path='').exists())
+        for reply in Comment.objects.filter(
+            parent__isnull=False
+        ).select_related('parent'):
+            self.assertEqual(
+                reply.path,
+                reply.parent.path + Comment.PATH_SEGMENT.format(reply.pk)
+            )
+            self.assertGreaterEqual(reply.created_at, reply.parent.created_at)
+        # auto_now_add would have stamped every like with the same time.
+        self.assertGreater(
+            Like.objects.values('created_at').distinct().count(), 1
+        )
+
+        titles = list(Movie.objects.order_by('pk').values_list(
+            'title', flat=True
+        ))
+        clear_benchmark_data()
+        self.assertFalse(Movie.objects.exists())
+        seed_benchmark_data(
+            users=5, movies=20, likes=40, favorites=10, comments=30
+        )
+        self.assertEqual(
+            list(Movie.objects.order_by('pk').values_list(
+                'title', flat=True
+            )),
+            titles
+        )
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """
+    Sampled requests report their timings in a Server-Timing header, and
+    every request ends up in the histograms served by /metrics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='Heat', third_party_id=1)
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_sampled_request_reports_server_timing(self):
+        response = self.client.get(f'/api/movies/{self.movie.pk}/')
+        timing = response['Server-Timing']
+        self.assertIn('app;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+        self.assertIn('serialize;dur=', timing)
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn(
+            'http_request_db_queries_count{view="movie-detail"}', metrics
+        )
+        self.assertRegex(
+            metrics,
+            r'http_request_duration_seconds_bucket\{view="movie-detail",'
+            r'method="GET",status="200",le="\+Inf"\} [1-9]'
+        )
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_server_timing(self):
+        response = self.client.get(f'/api/movies/{self.movie.pk}/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics_are_local_only(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_token_is_required_once_set(self):
+        for authorization, status in [
+            (None, 404),
+            ('Bearer wrong', 404),
+            ('Bearer s3cret', 200),
+        ]:
+            headers = {'Authorization': authorization} if authorization else {}
+            response = self.client.get('/metrics', headers=headers)
+            self.assertEqual(response.status_code, status, authorization)
+
+
+class CeleryMetricsTests(TestCase):
+    """
+    Tasks report the time they waited in the queue, their duration and
+    their retries to /metrics.
+    """
+
+    def scrape(self, *series):
+        values = dict(
+            line.rsplit(' ', 1)
+            for line in self.client.get('/metrics').content.decode()
+            .splitlines()
+            if not line.startswith('#')
+        )
+        return [float(values.get(name, 0)) for name in series]
+
+    def test_tasks_record_queue_wait_duration_and_retries(self):
+        trending = 'task="movies.tasks.refresh_trending_feed"'
+        similarities = 'task="movies.tasks.build_movie_similarities"'
+        series = [
+            f'celery_task_queue_wait_seconds_bucket{{{trending},le="30.0"}}',
+            f'celery_task_queue_wait_seconds_bucket{{{trending},le="60.0"}}',
+            f'celery_task_duration_seconds_count{{{trending},'
+            f'state="SUCCESS"}}',
+            f'celery_task_retries_total{{{similarities}}}',
+            f'celery_task_duration_seconds_count{{{similarities},'
+            f'state="RETRY"}}',
+        ]
+        before = self.scrape(*series)
+
+        tasks.refresh_trending_feed.apply(
+            headers={ENQUEUED_AT_HEADER: time.time() - 45}
+        )
+        # Held by a running batch of co-occurrence events.
+        cache.add(tasks.COOCCURRENCE_LOCK_KEY, 1, 60)
+        self.addCleanup(cache.delete, tasks.COOCCURRENCE_LOCK_KEY)
+        tasks.build_movie_similarities.apply(
+            headers={ENQUEUED_AT_HEADER: time.time()}
+        )
+
+        retries = tasks.build_movie_similarities.max_retries
+        self.assertEqual(
+            [after - was for after, was in zip(self.scrape(*series), before)],
+            [0, 1, 1, retries, retries]
+        )
+
+
+def reload_urls():
+    """
+    Rebuilds the URL configuration, which depends on ASYNC_READ_VIEWS.
+    """
+    importlib.reload(movie_urls)
+    importlib.reload(project_urls)
+    clear_url_caches()
+
+
+class AsyncReadViewTests(TestCase):
+    """
+    With ASYNC_READ_VIEWS the hot reads are served by async views, with
+    the responses of the DRF views they stand in for; anything else still
+    reaches the DRF views.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        cls.movie = Movie.objects.create(
+            title='Heat', third_party_id=1,
+            release_date=datetime.date(1995, 12, 15)
+        )
+        other = Movie.objects.create(title='Ronin', third_party_id=2)
+        MovieRecommendation.objects.create(
+            source=cls.movie, recommended=other, rank=1, score=1.0,
+            fetched_at=timezone.now()
+        )
+        Comment.objects.create(user=user, movie=cls.movie, text='Great')
+        cls.headers = {
+            'Authorization': f'Bearer {AccessToken.for_user(user)}'
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def use_async_views(self):
+        self.addCleanup(reload_urls)
+        self.enterContext(override_settings(ASYNC_READ_VIEWS=True))
+        reload_urls()
+
+    def get(self, path, **headers):
+        return async_to_sync(self.async_client.get)(path, headers=headers)
+
+    def test_async_views_serve_the_drf_responses(self):
+        paths = [
+            '/api/movies/',
+            '/api/movies/?page_size=1',
+            '/api/movies/?flags=true',
+            f'/api/movies/{self.movie.pk}/',
+            '/api/movies/999999/',
+            f'/api/movies/{self.movie.pk}/recommended/',
+            '/api/movies/999999/recommended/',
+            '/api/recommendations/',
+            f'/api/comments/?movie={self.movie.pk}',
+            '/api/comments/?movie=999999',
+        ]
+        expected = {
+            path: self.client.get(path, headers=self.headers)
+            for path in paths
+        }
+        cache.clear()
+        self.use_async_views()
+
+        for path in paths:
+            response = self.get(path, **self.headers)
+            self.assertEqual(
+                (response.status_code, response.content),
+                (expected[path].status_code, expected[path].content),
+                path
+            )
+
+    def test_unknown_ids_leave_no_version_keys(self):
+        paths = [
+            '/api/movies/999999/',
+            '/api/movies/999999/recommended/',
+            '/api/comments/?movie=999999',
+        ]
+        for use_async in (False, True):
+            if use_async:
+                self.use_async_views()
+            for path in paths:
+                self.get(path, **self.headers)
+            with self.subTest(use_async=use_async):
+                self.assertEqual(cache.keys('movies:version:*:999999'), [])
+
+        # Tokens of existing movies do not expire, all at once or at all.
+        self.get(f'/api/movies/{self.movie.pk}/')
+        key = VERSION_KEY.format(f'detail:{self.movie.pk}')
+        self.assertIsNone(cache.ttl(key))
+
+    def test_other_requests_reach_the_drf_views(self):
+        self.use_async_views()
+
+        response = self.get('/api/movies/?q=heat')
+        self.assertEqual(response.json()['results'][0]['title'], 'Heat')
+        response = self.get('/api/comments/?movie=x', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = async_to_sync(self.async_client.post)(
+            '/api/comments/',
+            {'movie': self.movie.pk, 'text': 'Agreed'},
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_authentication_is_enforced(self):
+        self.use_async_views()
+
+        response = self.get(f'/api/comments/?movie={self.movie.pk}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = self.get('/api/movies/', Authorization='Bearer invalid')
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    def test_async_client_reads_the_cache_options(self):
+        caches = {'default': {
+            **settings.CACHES['default'],
+            'LOCATION': 'rediss://cache.internal:6380/2',
+            'OPTIONS': {
+                'PASSWORD': 'secret',
+                'SOCKET_TIMEOUT': 5,
+                'CONNECTION_POOL_KWARGS': {'ssl_cert_reqs': 'none'},
+            },
+        }}
+
+        async def client():
+            return async_cache.get_redis()
+
+        with override_settings(CACHES=caches, ASYNC_REDIS_POOL_KWARGS={}):
+            pool = async_to_sync(client)().connection_pool
+        self.assertIs(pool.connection_class, SSLConnection)
+        self.assertEqual(
+            {
+                name: pool.connection_kwargs[name]
+                for name in ('host', 'port', 'db', 'password',
+                             'socket_timeout', 'ssl_cert_reqs')
+            },
+            {
+                'host': 'cache.internal', 'port': 6380, 'db': 2,
+                'password': 'secret', 'socket_timeout': 5,
+                'ssl_cert_reqs': 'none',
+            }
+        )
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_sampled_request_times_async_queries(self):
+        self.use_async_views()
+
+        # The movie is checked before its cache version is created.
+        response = self.get(f'/api/movies/{self.movie.pk}/')
+        self.assertRegex(
+            response['Server-Timing'], r'db;dur=[0-9.]+;desc="2 queries"'
+        )
+
+
+class MovieRecommendationsTests(TestCase):
+    """
+    A movie's recommendations are fetched from TMDb at most once per
+    freshness period, and served by its id, and by its TMDb id on the URL
+    that has always taken one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='fan', email='fan@example.com', password='x'
+        )
+        cls.movie, cls.other = Movie.objects.bulk_create([
+            Movie(title='Heat', third_party_id=949),
+            Movie(title='Ronin', third_party_id=8195),
+        ])
+        MovieRecommendation.objects.create(
+            source=cls.movie, recommended=cls.other, rank=1, score=1.0,
+            fetched_at=timezone.now()
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_fetches_are_deduplicated_until_stale(self):
+        delay = mock.patch.object(
+            tasks.fetch_and_save_recommendations, 'delay'
+        )
+        with delay as enqueue:
+            states = [
+                tasks.request_recommendations(949)
+                for _ in range(3)
+            ]
+        self.assertEqual(states, ['queued', 'pending', 'pending'])
+        enqueue.assert_called_once_with(949)
+
+        results = {'results': [
+            {'id': 8195, 'title': 'Ronin'},
+            {'id': 500, 'title': 'Collateral'},
+        ]}
+        with mock.patch('movies.tasks.tmdb_get', return_value=results):
+            tasks.fetch_and_save_recommendations(949)
+        self.assertEqual(
+            list(self.movie.recommendations.order_by('rank').values_list(
+                'recommended__title', flat=True
+            )),
+            ['Ronin', 'Collateral']
+        )
+        # The lock is released, and the fresh result keeps fetches away.
+        self.assertIsNone(
+            cache.get(tasks.RECOMMENDATIONS_LOCK_KEY.format(949))
+        )
+        with delay as enqueue:
+            state = tasks.request_recommendations(949)
+        self.assertEqual(state, 'fresh')
+        enqueue.assert_not_called()
+
+    def test_failed_enqueue_releases_the_lock(self):
+        with mock.patch.object(
+            tasks.fetch_and_save_recommendations, 'delay',
+            side_effect=ConnectionError
+        ):
+            with self.assertRaises(ConnectionError):
+                tasks.request_recommendations(949)
+        with mock.patch.object(tasks.fetch_and_save_recommendations, 'delay'):
+            state = tasks.request_recommendations(949)
+        self.assertEqual(state, 'queued')
+
+    def test_get_serves_ranked_recommendations_from_the_cache(self):
+        third = Movie.objects.create(title='Thief', third_party_id=11)
+        MovieRecommendation.objects.create(
+            source=self.movie, recommended=third, rank=2, score=0.5,
+            fetched_at=timezone.now()
+        )
+        url = f'/api/movies/{self.movie.pk}/recommended/'
+        response = self.client.get(url)
+        self.assertEqual(
+            [m['title'] for m in response.json()], ['Ronin', 'Thief']
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        MovieRecommendation.objects.filter(recommended=third).delete()
+        invalidate_recommendations(self.movie.pk)
+        response = self.client.get(url)
+        self.assertEqual([m['title'] for m in response.json()], ['Ronin'])
+
+    def test_post_requests_a_fetch(self):
+        url = f'/api/movies/{self.movie.pk}/recommended/'
+        self.assertEqual(self.client.post(url).status_code, 401)
+
+        self.client.force_authenticate(self.user)
+        with mock.patch(
+            'movies.views.request_recommendations', return_value='queued'
+        ) as request_recommendations:
+            response = self.client.post(url)
+            missing = self.client.post('/api/movies/999999/recommended/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(missing.status_code, 404)
+        request_recommendations.assert_called_once_with(949)
+
+    def test_tmdb_id_route(self):
+        response = self.client.get('/api/movies/949/recommendations/')
+        self.assertEqual(
+            response.content,
+            self.client.get(
+                f'/api/movies/{self.movie.pk}/recommended/'
+            ).content
+        )
+        self.assertEqual([m['title'] for m in response.json()], ['Ronin'])
+        response = self.client.get(
+            f'/api/movies/{self.movie.pk}/recommendations/'
+        )
+        self.assertEqual(response.status_code, 404)
+
+        self.client.force_authenticate(self.user)
+        with mock.patch(
+            'movies.views.request_recommendations', return_value='fresh'
+        ) as request_recommendations:
+            response = self.client.post('/api/movies/949/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        request_recommendations.assert_called_once_with(949)
+
+    def test_unknown_tmdb_id_is_fetched(self):
+        self.assertEqual(
+            self.client.get('/api/movies/500/recommendations/').status_code,
+            404
+        )
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(
+            tasks.fetch_and_save_recommendations, 'delay'
+        ) as enqueue:
+            response = self.client.post('/api/movies/500/recommendations/')
+        self.assertEqual(response.status_code, 202)
+        enqueue.assert_called_once_with(500)
+
+        def tmdb_get(path, params=None):
+            if path == '/movie/500':
+                return {
+                    'id': 500, 'title': 'Collateral',
+                    'genres': [{'id': 80, 'name': 'Crime'}]
+                }
+            self.assertEqual(path, '/movie/500/recommendations')
+            return {'results': [{'id': 949, 'title': 'Heat'}]}
+
+        with mock.patch('movies.crawler.tmdb_get', tmdb_get), \
+                mock.patch('movies.tasks.tmdb_get', tmdb_get):
+            tasks.fetch_and_save_recommendations(500)
+        movie = Movie.objects.get(third_party_id=500)
+        self.assertEqual(movie.genre_ids, [80])
+        response = self.client.get('/api/movies/500/recommendations/')
+        self.assertEqual([m['title'] for m in response.json()], ['Heat'])
+
+
+class CachedAuthenticationTests(TestCase):
+    """
+    Access tokens resolve their user from the cache and refresh tokens
+    are blacklisted in Redis, so authentication reads no database rows
+    once the user is cached.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='member', email='member@example.com', password='x'
+        )
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.headers = {
+            'Authorization': f'Bearer {self.refresh.access_token}'
+        }
+
+    def test_cached_user_is_resolved_without_queries(self):
+        self.client.get('/api/profile/', headers=self.headers)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/profile/', headers=self.headers)
+        self.assertEqual(response.json()['username'], 'member')
+
+        # Only the local copy is gone: Redis still has the user.
+        authentication._local.clear()
+        with self.assertNumQueries(0):
+            self.client.get('/api/profile/', headers=self.headers)
+
+    def test_changed_user_is_read_again(self):
+        self.client.get('/api/profile/', headers=self.headers)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.get('/api/profile/', headers=self.headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'user_inactive')
+
+    def test_rotated_refresh_token_is_single_use(self):
+        self.client.get('/api/profile/', headers=self.headers)
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/token/refresh/', {'refresh': str(self.refresh)}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('refresh', response.json())
+
+        response = self.client.post(
+            '/api/token/refresh/', {'refresh': str(self.refresh)}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Token is blacklisted')
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    def test_search_matches_exact_scan_when_probing_every_cluster(self):
+        genres = [[878, 12], [10749, 35], [27, 53], [16, 10751]]
+        rows = [
+            (
+                movie_id,
+                f'movie {movie_id % 17} part {movie_id % 5}',
+                genres[movie_id % 4],
+                datetime.date(1950 + movie_id % 70, 1, 1),
+            )
+            for movie_id in range(1, 501)
+        ]
+        query = embed('movie 3 part 2', [878, 12], datetime.date(1990, 1, 1))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = f'{tmp}/embeddings'
+            self.assertEqual(write_index(directory, rows, len(rows)), 500)
+            index = EmbeddingIndex(directory)
+            results = index.search(query, 10, nprobe=len(index.centroids))
+            exact = np.sort(index.vectors @ query)[::-1][:10]
+
+        self.assertEqual(len(results), 10)
+        np.testing.assert_allclose(
+            [score for _, score in results], exact, rtol=1e-5
+        )
+
+
+@override_settings(LIKE_BUFFER_ENABLED=True)
+class LikeBufferTests(TestCase):
+    """
+    With LIKE_BUFFER_ENABLED likes are recorded in Redis and flushed to
+    the database in batches, each exactly once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='buffered', email='buffered@example.com', password='x'
+        )
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.redis = get_redis_connection('default')
+
+    def test_buffered_like_is_flushed_once(self):
+        movie = self.movies[0]
+        response = self.client.post('/api/likes/', {'movie': movie.pk})
+        self.assertEqual(response.status_code, 202)
+        response = self.client.post('/api/likes/', {'movie': movie.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(
+            like_buffer.liked_movie_ids(self.user.pk), {movie.pk}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(like_buffer.flush_likes(), 1)
+            self.assertEqual(like_buffer.flush_likes(), 0)
+        self.assertEqual(
+            list(Like.objects.values_list('user_id', 'movie_id')),
+            [(self.user.pk, movie.pk)]
+        )
+        movie.refresh_from_db()
+        self.assertEqual(movie.likes_count, 1)
+        self.assertFalse(self.redis.exists(
+            like_buffer.PENDING_KEY.format(self.user.pk),
+            like_buffer.PENDING_USERS_KEY
+        ))
+
+    def test_like_buffered_during_a_flush_requeues_its_user(self):
+        first, second, deleted = self.movies
+        like_buffer.buffer_likes(self.user.pk, [first.pk, deleted.pk])
+        deleted.delete()
+
+        def insert_then_like(model, objects):
+            like_buffer.buffer_like(self.user.pk, second.pk)
+            return bulk_create_pairs(model, objects)
+
+        with mock.patch.object(
+            like_buffer, 'bulk_create_pairs', insert_then_like
+        ):
+            like_buffer.flush_likes()
+        self.assertEqual(
+            self.redis.smembers(like_buffer.PENDING_USERS_KEY),
+            {str(self.user.pk).encode()}
+        )
+        self.assertEqual(
+            self.redis.smembers(like_buffer.PENDING_KEY.format(self.user.pk)),
+            {str(second.pk).encode()}
+        )
+
+        like_buffer.flush_likes()
+        self.assertEqual(
+            set(Like.objects.values_list('movie_id', flat=True)),
+            {first.pk, second.pk}
+        )
+        self.assertFalse(self.redis.exists(like_buffer.PENDING_USERS_KEY))
+
+
+class SimilarityTests(TestCase):
+    """
+    The item-item neighbor table holds the top-k cosine similarities of
+    the interaction matrix, keyed by movie id.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(3)
+        )
+
+    def similarities(self):
+        return {
+            (s.movie_id, s.similar_id): s.score
+            for s in MovieSimilarity.objects.all()
+        }
+
+    def test_rebuild_writes_top_k_neighbors(self):
+        m0, m1, m2 = (movie.pk for movie in self.movies)
+        # Users 1 and 2 like m0 and m1; user 3 likes m1 and favorites m2.
+        matrix, _, movie_ids = build_interaction_matrix([
+            (1, m0, LIKE_WEIGHT), (1, m1, LIKE_WEIGHT),
+            (2, m0, LIKE_WEIGHT), (2, m1, LIKE_WEIGHT),
+            (3, m1, LIKE_WEIGHT), (3, m2, FAVORITE_WEIGHT),
+        ])
+        MovieSimilarity.objects.create(movie_id=m2, similar_id=m0, score=1)
+
+        self.assertEqual(rebuild_similarities(matrix, movie_ids, k=1), 3)
+        similarities = self.similarities()
+        self.assertEqual(
+            set(similarities), {(m0, m1), (m1, m0), (m2, m1)}
+        )
+        self.assertAlmostEqual(similarities[m0, m1], 2 / 6 ** 0.5, places=5)
+        self.assertAlmostEqual(similarities[m2, m1], 1 / 3 ** 0.5, places=5)
+
+    def test_rebuild_from_database(self):
+        m0, m1, m2 = self.movies
+        User = get_user_model()
+        first = User.objects.create_user(
+            username='first', email='first@example.com', password='x'
+        )
+        second = User.objects.create_user(
+            username='second', email='second@example.com', password='x'
+        )
+        Like.objects.create(user=first, movie=m0)
+        FavoriteMovie.objects.create(user=first, movie=m1)
+        Like.objects.create(user=second, movie=m2)
+
+        matrix, user_ids, movie_ids = load_interaction_matrix()
+        self.assertEqual(list(user_ids), [first.pk, second.pk])
+        self.assertEqual(list(movie_ids), [m0.pk, m1.pk, m2.pk])
+        self.assertEqual(rebuild_similarities(matrix, movie_ids), 2)
+        similarities = self.similarities()
+        self.assertEqual(set(similarities), {(m0.pk, m1.pk), (m1.pk, m0.pk)})
+        self.assertAlmostEqual(similarities[m0.pk, m1.pk], 1, places=5)
+
+
+class CooccurrenceTests(TestCase):
+    """
+    Likes and favorites reach the co-occurrence store as events, each
+    interaction counted exactly once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='liker', email='liker@example.com', password='x'
+        )
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(LIKE_BUFFER_ENABLED=True)
+    def test_repeated_flush_counts_each_like_once(self):
+        r = get_redis_connection('default')
+        movie_ids = [movie.pk for movie in self.movies[:2]]
+        like_buffer.buffer_likes(self.user.pk, movie_ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            like_buffer.flush_user_likes(self.user.pk)
+        # A flush that crashed after committing left its likes pending.
+        r.sadd(like_buffer.PENDING_KEY.format(self.user.pk), *movie_ids)
+        r.sadd(like_buffer.PENDING_USERS_KEY, self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            like_buffer.flush_likes()
+
+        self.assertEqual(apply_events(), 2)
+        self.assertEqual(
+            counted_weights(r, [self.user.pk]),
+            {self.user.pk: {m: LIKE_WEIGHT for m in movie_ids}}
+        )
+        self.assertFalse(r.exists(like_buffer.PENDING_USERS_KEY))
+
+    @staticmethod
+    def deltas(events, weights):
+        pairs, norms, updated = cooccurrence_deltas(events, weights)
+        pairs = {
+            (i, j): delta
+            for i, row in pairs.items() for j, delta in row.items()
+        }
+        return pairs, dict(norms), updated
+
+    @staticmethod
+    def nonzero(deltas):
+        return {key: delta for key, delta in deltas.items() if delta}
+
+    def test_deltas_of_created_and_deleted_interactions(self):
+        # User 1 likes movie 1 and favorites movie 2.
+        created = {1: {1: LIKE_WEIGHT, 2: FAVORITE_WEIGHT}}
+        self.assertEqual(self.deltas(created, {}), (
+            {(1, 2): 2.0, (2, 1): 2.0},
+            {1: 1.0, 2: 4.0},
+            {1: {1: 1.0, 2: 2.0}}
+        ))
+
+        # The favorite is deleted; deleting a like never counted is a no-op.
+        deleted = {1: {2: 0.0, 3: 0.0}}
+        weights = {1: {1: 1.0, 2: 2.0}}
+        self.assertEqual(self.deltas(deleted, weights), (
+            {(1, 2): -2.0, (2, 1): -2.0},
+            {2: -4.0},
+            {1: {2: 0.0}}
+        ))
+
+    def test_counted_weights_change_nothing(self):
+        weights = {1: {1: 1.0, 2: 2.0}, 2: {1: 1.0}}
+        self.assertEqual(self.deltas(weights, weights), ({}, {}, {}))
+
+    def test_interactions_read_by_the_batch_build_count_once(self):
+        m0, m1, _ = self.movies
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, movie=m0)
+            FavoriteMovie.objects.create(user=self.user, movie=m1)
+        # The build read both before their events were discarded.
+        seed_cooccurrence(*load_interaction_matrix())
+
+        self.assertEqual(apply_events(), 2)
+        r = get_redis_connection('default')
+        self.assertEqual(counted_weights(r, [self.user.pk]), {
+            self.user.pk: {m0.pk: LIKE_WEIGHT, m1.pk: FAVORITE_WEIGHT}
+        })
+        self.assertEqual(
+            r.zscore(f'cooc:{m0.pk}', m1.pk), LIKE_WEIGHT * FAVORITE_WEIGHT
+        )
+        self.assertEqual(
+            float(r.hget('cooc:norms', m1.pk)), FAVORITE_WEIGHT ** 2
+        )
+
+    @staticmethod
+    def similarities():
+        return {
+            (row.movie_id, row.similar_id): row.score
+            for row in MovieSimilarity.objects.all()
+        }
+
+    @override_settings(COOCCURRENCE_CANDIDATES=1)
+    def test_incremental_scores_match_the_batch_build(self):
+        m0, m1, m2 = [movie.pk for movie in self.movies]
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(5)
+        )
+
+        def like(user, *movie_ids):
+            with self.captureOnCommitCallbacks(execute=True):
+                for movie_id in movie_ids:
+                    Like.objects.create(user=user, movie_id=movie_id)
+            apply_events()
+
+        # Movie 2 is the only candidate of movie 0 for a while...
+        like(users[0], m0, m1)
+        like(users[1], m0, m2)
+        like(users[2], m0, m2)
+        # ...until movie 1 co-occurs with it more often.
+        like(users[3], m0, m1)
+        like(users[4], m0, m1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.filter(user=users[1], movie_id=m2).delete()
+        apply_events()
+
+        incremental = self.similarities()
+        rebuild_similarities(*load_interaction_matrix()[::2])
+        batch = self.similarities()
+        self.assertIn((m0, m1), incremental)
+        for pair, score in incremental.items():
+            self.assertAlmostEqual(score, batch[pair], places=5)
+
+
+class FeedTests(TestCase):
+    """
+    Users get their precomputed feed, refreshed in the background once
+    stale; users without one, and anonymous users, get the trending feed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='x'
+        )
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com', password='x'
+        )
+        cls.heat, cls.ronin, cls.collateral = Movie.objects.bulk_create([
+            Movie(title='Heat', third_party_id=949,
+                  release_date=datetime.date(1995, 12, 15)),
+            Movie(title='Ronin', third_party_id=8195,
+                  release_date=datetime.date(1998, 9, 25)),
+            Movie(title='Collateral', third_party_id=1538,
+                  release_date=datetime.date(2004, 8, 6)),
+        ])
+        Like.objects.create(user=cls.user, movie=cls.heat)
+        MovieSimilarity.objects.create(
+            movie=cls.heat, similar=cls.ronin, score=0.5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def titles(self):
+        response = self.client.get('/api/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        return [movie['title'] for movie in response.json()]
+
+    def test_trending_feed_is_served_until_rebuilt(self):
+        # Recent interactions first, padded with the newest releases.
+        self.assertEqual(self.titles(), ['Heat', 'Collateral', 'Ronin'])
+
+        FavoriteMovie.objects.create(user=self.other, movie=self.ronin)
+        self.assertEqual(self.titles(), ['Heat', 'Collateral', 'Ronin'])
+        tasks.refresh_trending_feed()
+        self.assertEqual(self.titles(), ['Ronin', 'Heat', 'Collateral'])
+
+    def test_user_feed_is_refreshed_once_stale(self):
+        self.client.force_authenticate(self.user)
+        delay = mock.patch.object(tasks.refresh_user_feed, 'delay')
+
+        # No feed yet: trending, and a single refresh in flight.
+        with delay as enqueue:
+            self.assertEqual(self.titles(), ['Heat', 'Collateral', 'Ronin'])
+            self.titles()
+        enqueue.assert_called_once_with(self.user.pk)
+
+        tasks.refresh_user_feed(self.user.pk)
+        with delay as enqueue:
+            self.assertEqual(self.titles(), ['Ronin'])
+        enqueue.assert_not_called()
+
+        # A new like marks the feed stale; it is still served meanwhile.
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, movie=self.collateral)
+        with delay as enqueue:
+            self.assertEqual(self.titles(), ['Ronin'])
+        enqueue.assert_called_once_with(self.user.pk)
+
+
+class CounterTests(TestCase):
+    """
+    The like, favorite and comment counters of a movie follow every
+    write, one at a time or in batches, and never go below zero.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='counter', email='counter@example.com', password='x'
+        )
+        cls.movie = Movie.objects.create(title='Heat', third_party_id=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counts(self):
+        return self.client.get(f'/api/movies/{self.movie.pk}/').json()
+
+    def assertCounts(self, likes, favorites, comments):
+        data = self.counts()
+        self.assertEqual(
+            (
+                data['likes_count'],
+                data['favorites_count'],
+                data['comments_count']
+            ),
+            (likes, favorites, comments)
+        )
+
+    def test_counters_follow_creates_and_deletes(self):
+        self.assertCounts(0, 0, 0)
+        ids = {
+            url: self.client.post(
+                f'/api/{url}/', {'movie': self.movie.pk, 'text': 'Hi'}
+            ).json()['id']
+            for url in ('likes', 'favorites', 'comments')
+        }
+        self.assertCounts(1, 1, 1)
+
+        for url, pk in ids.items():
+            self.client.delete(f'/api/{url}/{pk}/')
+        self.assertCounts(0, 0, 0)
+
+    def test_counters_follow_batches(self):
+        items = [{'movie': self.movie.pk, 'text': 'Hi'}] * 3
+        self.client.post('/api/comments/bulk/', items, format='json')
+        self.client.post('/api/likes/bulk/', items[:1], format='json')
+        self.assertCounts(1, 0, 3)
+
+        ids = list(Comment.objects.values_list('pk', flat=True)[:2])
+        self.client.delete('/api/comments/bulk/', ids, format='json')
+        self.assertCounts(1, 0, 1)
+
+    def test_counters_never_go_below_zero_and_can_be_recounted(self):
+        like = Like.objects.create(user=self.user, movie=self.movie)
+        Movie.objects.update(likes_count=0, comments_count=7)
+        like.delete()
+        self.assertCounts(0, 0, 7)
+
+        Like.objects.create(user=self.user, movie=self.movie)
+        Movie.objects.update(likes_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertCounts(1, 0, 0)
+
+    def test_batches_add_deltas_per_movie(self):
+        other = Movie.objects.create(title='Ronin', third_party_id=2)
+        # Drift left alone by batches, unlike a recount.
+        Movie.objects.filter(pk=other.pk).update(comments_count=10)
+        items = [{'movie': self.movie.pk, 'text': 'Hi'}] * 2 + [
+            {'movie': other.pk, 'text': 'Hi'}
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/comments/bulk/', items, format='json')
+        updates = [
+            q['sql'] for q in queries
+            if q['sql'].startswith('UPDATE "movies_movie"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('COUNT(', updates[0])
+        self.assertCounts(0, 0, 2)
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 11)
+
+        self.client.delete(
+            '/api/comments/bulk/',
+            list(Comment.objects.values_list('pk', flat=True)),
+            format='json'
+        )
+        self.assertCounts(0, 0, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 10)
+
+    def test_listing_counts_lag_by_the_page_lifetime(self):
+        self.client.get('/api/movies/')
+        like = self.client.post('/api/likes/', {'movie': self.movie.pk})
+        self.assertEqual(like.status_code, 201)
+        self.assertCounts(1, 0, 0)
+
+        # The cached page keeps the old count until it expires.
+        listed = self.client.get('/api/movies/').json()['results'][0]
+        self.assertEqual(listed['likes_count'], 0)
+        [key] = cache.keys('movies:list:*')
+        self.assertTrue(0 < cache.ttl(key) <= settings.MOVIE_LIST_CACHE_TTL)
+        cache.delete(key)
+        listed = self.client.get('/api/movies/').json()['results'][0]
+        self.assertEqual(listed['likes_count'], 1)
+
+
+class CacheTests(SimpleTestCase):
+    """
+    Cached values live in versioned namespaces and are recomputed by one
+    caller at a time, shortly before they expire.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_invalidates_a_namespace(self):
+        key = make_key('list', 'page')
+        other = make_key('detail', 'page')
+        self.assertEqual(make_key('list', 'page'), key)
+
+        bump('list')
+        self.assertNotEqual(make_key('list', 'page'), key)
+        self.assertEqual(make_key('detail', 'page'), other)
+        for namespace in ('list', 'detail'):
+            self.assertIsNone(cache.ttl(VERSION_KEY.format(namespace)))
+
+    def test_miss_waits_for_the_caller_holding_the_lock(self):
+        cache.add(LOCK_KEY.format('key'), 1, 10)
+        timer = threading.Timer(
+            0.1, cache.set, ['key', ('theirs', 0.1, time.time() + 60)]
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+        compute = mock.Mock(return_value='mine')
+
+        self.assertEqual(get_or_compute('key', compute, 60), 'theirs')
+        compute.assert_not_called()
+
+        # Without a result in time, the waiter computes it itself.
+        cache.delete('key')
+        with mock.patch('movies.cache.WAIT_TIMEOUT', 0.1):
+            self.assertEqual(get_or_compute('key', compute, 60), 'mine')
+
+    def test_hit_near_expiry_is_refreshed_by_one_caller(self):
+        # Took 10s to compute, expires in 1s: refreshed early.
+        cache.set('key', ('old', 10, time.time() + 1), 60)
+        compute = mock.Mock(return_value='new')
+        with mock.patch('movies.cache.random.random', return_value=0.5):
+            cache.add(LOCK_KEY.format('key'), 1, 10)
+            self.assertEqual(get_or_compute('key', compute, 60), 'old')
+            compute.assert_not_called()
+
+            cache.delete(LOCK_KEY.format('key'))
+            self.assertEqual(get_or_compute('key', compute, 60), 'new')
+        self.assertEqual(get_or_compute('key', compute, 60), 'new')
+        compute.assert_called_once_with()
+
+
+class MovieDetailTests(TestCase):
+    """
+    Movie details carry validators derived from the movie's cache version,
+    and matching conditional requests get a 304 without any query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title='Heat', third_party_id=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_conditional_requests_are_answered_without_queries(self):
+        url = f'/api/movies/{self.movie.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(
+            url, headers={'If-Modified-Since': last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        invalidate_movies([self.movie.pk])
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleting_a_movie_invalidates_it(self):
+        other = Movie.objects.create(title='Ronin', third_party_id=2)
+        self.client.get(f'/api/movies/{other.pk}/')
+        self.client.get(f'/api/movies/{other.pk}/recommended/')
+        self.client.get('/api/movies/')
+        listing = get_version('list')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertNotEqual(get_version('list'), listing)
+        self.assertEqual(cache.keys(f'movies:version:*:{other.pk}'), [])
+        self.assertEqual(
+            [m['title'] for m in self.client.get('/api/movies/').json()[
+                'results'
+            ]],
+            ['Heat']
+        )
+        response = self.client.get(f'/api/movies/{other.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_movies_are_not_found(self):
+        for url in ('/api/movies/999999/', '/api/movies/heat/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn('ETag', response)
+
+
+class SearchTests(TestCase):
+    """
+    `?q=` searches movie titles, in full text or by prefix, on PostgreSQL
+    and in the LIKE fallback of other databases alike.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create(
+            Movie(title=title, third_party_id=i)
+            for i, title in enumerate(['Heat', 'The Heat Is On', 'Ronin'])
+        )
+
+    def search(self, **params):
+        results, next_url = [], '/api/movies/'
+        params['page_size'] = 1
+        while next_url:
+            response = self.client.get(next_url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            results.extend(m['title'] for m in response.json()['results'])
+            next_url, params = response.json()['next'], None
+        return results
+
+    def test_search_modes(self):
+        self.assertCountEqual(
+            self.search(q='heat'), ['Heat', 'The Heat Is On']
+        )
+        self.assertEqual(self.search(q='HEA', mode='prefix'), ['Heat'])
+        self.assertEqual(self.search(q='casino'), [])
+
+    def test_unknown_mode_is_rejected(self):
+        response = self.client.get(
+            '/api/movies/', {'q': 'heat', 'mode': 'fuzzy'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {'mode': ['Must be one of: fulltext, prefix.']}
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Movie pages are walked with opaque cursors, newest release first,
+    movies without a release date last.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        dates = [
+            datetime.date(2001, 1, 1), None, datetime.date(1999, 5, 5),
+            datetime.date(2001, 1, 1), None, datetime.date(2010, 2, 2),
+            datetime.date(1999, 5, 5),
+        ]
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i, release_date=date)
+            for i, date in enumerate(dates)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursors_walk_every_movie_once_in_order(self):
+        ids, next_url = [], '/api/movies/?page_size=2'
+        while next_url:
+            data = self.client.get(next_url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(movie['id'] for movie in data['results'])
+            next_url = data['next']
+
+        expected = sorted(
+            self.movies,
+            key=lambda m: (
+                m.release_date is not None,
+                m.release_date or datetime.date.min,
+                m.pk
+            ),
+            reverse=True
+        )
+        self.assertEqual(ids, [movie.pk for movie in expected])
+
+    def test_invalid_cursors_are_not_found(self):
+        cursors = ['not base64!'] + [
+            b64encode(querystring.encode()).decode()
+            for querystring in ('v=2001-01-01', 'v=&i=x', 'v=never&i=1')
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/movies/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(
+                    response.json(), {'detail': 'Invalid cursor'}
+                )
+
+
+class ListQueryCountTests(TestCase):
+    """
+    Each list endpoint reads a page in one query, however many rows and
+    users the page holds.
+    """
+    endpoints = [
+        ('/api/comments/', Comment, CommentSerializer),
+        ('/api/likes/', Like, LikeSerializer),
+        ('/api/favorites/', FavoriteMovie, FavoriteMovieSerializer),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='x'
+        )
+        movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(30)
+        )
+        # bulk_create skips the counter, feed and co-occurrence signals.
+        Like.objects.bulk_create(
+            Like(user=cls.user, movie=movie) for movie in movies
+        )
+        FavoriteMovie.objects.bulk_create(
+            FavoriteMovie(user=cls.user, movie=movie) for movie in movies
+        )
+        Comment.objects.bulk_create(
+            Comment(user=cls.user, movie=movie, text=f'Comment {i}')
+            for i, movie in enumerate(movies)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_endpoints_use_one_query_per_page(self):
+        for url, _, _ in self.endpoints:
+            for page_size in (1, 25):
+                with self.subTest(url=url, page_size=page_size):
+                    with self.assertNumQueries(1):
+                        response = self.client.get(
+                            url, {'page_size': page_size}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        len(response.json()['results']), page_size
+                    )
+
+    def test_list_matches_model_serializer_and_walks_every_page(self):
+        for url, model, serializer_class in self.endpoints:
+            with self.subTest(url=url):
+                results, next_url = [], url + '?page_size=7'
+                while next_url:
+                    data = self.client.get(next_url).json()
+                    results.extend(data['results'])
+                    next_url = data['next']
+
+                expected = serializer_class(
+                    model.objects.order_by('-created_at', '-id'),
+                    many=True
+                ).data
+                self.assertEqual(results, list(expected))
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class CommentThreadTests(TestCase):
+    """
+    Replies hang off a parent comment; a movie's comment listing shows
+    only top-level comments and a whole thread loads from its root.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='talker', email='talker@example.com', password='x'
+        )
+        cls.movie = Movie.objects.create(title='Heat', third_party_id=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, text, parent=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/comments/', {
+                'movie': self.movie.pk,
+                'text': text,
+                'parent': parent or '',
+            })
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def top_level(self):
+        response = self.client.get('/api/comments/', {'movie': self.movie.pk})
+        return [row['text'] for row in response.json()['results']]
+
+    def test_thread_loads_depth_first(self):
+        root = self.comment('root')
+        first = self.comment('first', parent=root)
+        self.comment('second', parent=root)
+        self.comment('nested', parent=first)
+        self.comment('other')
+
+        response = self.client.get(f'/api/comments/{root}/thread/')
+        self.assertEqual(
+            [row['text'] for row in response.json()],
+            ['root', 'first', 'nested', 'second']
+        )
+
+    def test_first_page_refreshes_only_for_top_level_comments(self):
+        root = self.comment('root')
+        self.assertEqual(self.top_level(), ['root'])
+
+        self.comment('reply', parent=root)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.top_level(), ['root'])
+
+        self.comment('newer')
+        self.assertEqual(self.top_level(), ['newer', 'root'])
+
+    def test_reply_must_stay_on_the_parent_movie(self):
+        root = self.comment('root')
+        other = Movie.objects.create(title='Ronin', third_party_id=2)
+        response = self.client.post('/api/comments/', {
+            'movie': other.pk, 'text': 'lost', 'parent': root,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+
+
+class BulkWriteTests(TestCase):
+    """
+    Batches of likes, favorites and comments are written in a constant
+    number of queries, with one result per item.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(
+            username='batcher', email='batcher@example.com', password='x'
+        )
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com', password='x'
+        )
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(12)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, url, items, method='post'):
+        response = getattr(self.client, method)(
+            f'/api/{url}/bulk/', items, format='json'
+        )
+        self.assertEqual(response.status_code, 207, response.content)
+        return response.json()['results']
+
+    def test_batches_use_a_constant_number_of_queries(self):
+        for url in ('likes', 'favorites', 'comments'):
+            counts = []
+            for movies in (self.movies[:2], self.movies[2:]):
+                items = [{'movie': m.pk, 'text': 'Hi'} for m in movies]
+                with CaptureQueriesContext(connection) as queries:
+                    results = self.bulk(url, items)
+                counts.append(len(queries))
+                self.assertEqual(
+                    [r['status'] for r in results], [201] * len(movies)
+                )
+                self.assertEqual(
+                    [r['data']['movie'] for r in results],
+                    [m.pk for m in movies]
+                )
+            with self.subTest(url=url):
+                self.assertEqual(counts[0], counts[1])
+
+        counts = Movie.objects.values_list(
+            'likes_count', 'favorites_count', 'comments_count'
+        )
+        self.assertEqual(set(counts), {(1, 1, 1)})
+
+    def test_each_item_gets_its_own_result(self):
+        Like.objects.create(user=self.user, movie=self.movies[0])
+        results = self.bulk('likes', [
+            {'movie': self.movies[1].pk},
+            {'movie': self.movies[0].pk},
+            {'movie': self.movies[1].pk},
+            {'movie': 0},
+            {'movie': 'one'},
+        ])
+        self.assertEqual(
+            [r['status'] for r in results], [201, 400, 400, 400, 400]
+        )
+        self.assertEqual(results[0]['data']['user'], 'batcher')
+        self.assertEqual(
+            results[1]['errors'],
+            {'non_field_errors': ["You have already liked this movie."]}
+        )
+        self.assertIn('movie', results[3]['errors'])
+        self.assertIn('movie', results[4]['errors'])
+        self.assertEqual(Like.objects.count(), 2)
+
+        response = self.client.post(
+            '/api/likes/bulk/',
+            [{'movie': self.movies[0].pk}] * 101,
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_pairs_inserted_concurrently_are_duplicates(self):
+        def validate_then_race(view, items):
+            # Another request likes the movie right after validation.
+            Like.objects.create(user=self.user, movie=self.movies[0])
+            return view.validate_movies(items)
+
+        items = [{'movie': m.pk} for m in self.movies[:2]]
+        with mock.patch.object(
+            LikeViewSet, 'validate_bulk', validate_then_race
+        ), self.captureOnCommitCallbacks(execute=True):
+            results = self.bulk('likes', items)
+        self.assertEqual([r['status'] for r in results], [400, 201])
+        self.assertEqual(
+            results[0]['errors'],
+            {'non_field_errors': ["You have already liked this movie."]}
+        )
+
+        apply_events()
+        r = get_redis_connection('default')
+        self.assertEqual(counted_weights(r, [self.user.pk]), {
+            self.user.pk: {m.pk: LIKE_WEIGHT for m in self.movies[:2]}
+        })
+        self.assertEqual(
+            list(Movie.objects.filter(
+                pk__in=[m.pk for m in self.movies[:3]]
+            ).order_by('pk').values_list('likes_count', flat=True)),
+            [1, 1, 0]
+        )
+
+    @override_settings(LIKE_BUFFER_ENABLED=True)
+    def test_buffered_like_batches(self):
+        items = [{'movie': m.pk} for m in self.movies[:2]]
+        results = self.bulk('likes', items + items[:1])
+        self.assertEqual([r['status'] for r in results], [202, 202, 400])
+        self.assertFalse(Like.objects.exists())
+
+        self.client.get('/api/likes/')
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_comment_batches_build_threads(self):
+        root = self.bulk('comments', [
+            {'movie': self.movies[0].pk, 'text': 'root'},
+        ])[0]['data']['id']
+        results = self.bulk('comments', [
+            {'movie': self.movies[0].pk, 'text': 'reply', 'parent': root},
+            {'movie': self.movies[1].pk, 'text': 'lost', 'parent': root},
+            {'movie': self.movies[0].pk, 'text': ''},
+        ])
+        self.assertEqual([r['status'] for r in results], [201, 400, 400])
+        self.assertEqual(results[0]['data']['parent'], root)
+        self.assertIn('parent', results[1]['errors'])
+        self.assertIn('text', results[2]['errors'])
+
+        reply = Comment.objects.get(pk=results[0]['data']['id'])
+        self.assertEqual(
+            reply.path,
+            Comment.PATH_SEGMENT.format(root)
+            + Comment.PATH_SEGMENT.format(reply.pk)
+        )
+        response = self.client.get(f'/api/comments/{root}/thread/')
+        self.assertEqual(
+            [row['text'] for row in response.json()], ['root', 'reply']
+        )
+
+    def test_batch_delete(self):
+        mine = [
+            Like.objects.create(user=self.user, movie=movie).pk
+            for movie in self.movies[:3]
+        ]
+        theirs = Like.objects.create(user=self.other, movie=self.movies[0])
+        with self.assertNumQueries(6):
+            results = self.bulk(
+                'likes', mine + [theirs.pk, 'x'], method='delete'
+            )
+        self.assertEqual(
+            [r['status'] for r in results], [204, 204, 204, 404, 400]
+        )
+        self.assertEqual(list(Like.objects.values_list('pk', flat=True)), [
+            theirs.pk
+        ])
+        self.movies[0].refresh_from_db()
+        self.assertEqual(self.movies[0].likes_count, 1)
+
+    def test_batch_delete_of_a_thread_takes_other_users_replies(self):
+        root, kept = (
+            Comment.objects.create(
+                user=self.user, movie=self.movies[0], text=text
+            )
+            for text in ('root', 'kept')
+        )
+        reply = Comment.objects.create(
+            user=self.other, movie=self.movies[0], parent=root, text='reply'
+        )
+        Comment.objects.create(
+            user=self.user, movie=self.movies[0], parent=reply, text='nested'
+        )
+        Comment.objects.create(
+            user=self.other, movie=self.movies[0], parent=kept, text='other'
+        )
+        self.assertEqual(
+            Movie.objects.get(pk=self.movies[0].pk).comments_count, 5
+        )
+        page = get_version(f'comments:{self.movies[0].pk}')
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                CaptureQueriesContext(connection) as queries:
+            results = self.bulk('comments', [root.pk], method='delete')
+        self.assertEqual(results, [{'id': root.pk, 'status': 204}])
+        self.assertEqual(
+            set(Comment.objects.values_list('text', flat=True)),
+            {'kept', 'other'}
+        )
+        self.movies[0].refresh_from_db()
+        self.assertEqual(self.movies[0].comments_count, 2)
+        # The whole thread is counted at once.
+        self.assertEqual(
+            sum(q['sql'].startswith('UPDATE "movies_movie"') for q in queries),
+            1
+        )
+        self.assertNotEqual(
+            get_version(f'comments:{self.movies[0].pk}'), page
+        )
+
+
+class MembershipFlagTests(TestCase):
+    """
+    `?flags=true` flags the movies of a page the user has liked or
+    favorited from the user's sets in Redis, which follow every write.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='fan', email='fan@example.com', password='x'
+        )
+        cls.movies = Movie.objects.bulk_create(
+            Movie(title=f'Movie {i}', third_party_id=i) for i in range(4)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flags(self):
+        response = self.client.get('/api/movies/', {'flags': 'true'})
+        return {
+            movie['id']: (movie['liked'], movie['favorited'])
+            for movie in response.json()['results']
+        }
+
+    def test_flags_follow_likes_and_favorites(self):
+        first, second = self.movies[:2]
+        Like.objects.create(user=self.user, movie=first)
+        self.assertEqual(self.flags()[first.pk], (True, False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/favorites/', {'movie': first.pk})
+            self.client.post('/api/likes/', {'movie': second.pk})
+            Like.objects.filter(movie=first).delete()
+        with self.assertNumQueries(0):
+            flags = self.flags()
+        self.assertEqual(flags[first.pk], (False, True))
+        self.assertEqual(flags[second.pk], (True, False))
+        self.assertEqual(flags[self.movies[2].pk], (False, False))
+
+        response = self.client.get('/api/movies/')
+        self.assertNotIn('liked', response.json()['results'][0])
+
+    def test_flagged_pages_are_private(self):
+        def headers(path, **extra):
+            response = self.client.get(path, **extra)
+            return response.get('Vary'), response.get('Cache-Control')
+
+        for use_async in (False, True):
+            if use_async:
+                self.addCleanup(reload_urls)
+                self.enterContext(override_settings(ASYNC_READ_VIEWS=True))
+                reload_urls()
+                token = AccessToken.for_user(self.user)
+                self.client = APIClient(
+                    headers={'Authorization': f'Bearer {token}'}
+                )
+            with self.subTest(use_async=use_async):
+                vary, cache_control = headers('/api/movies/?flags=true')
+                self.assertIn('Authorization', vary)
+                self.assertIn('private', cache_control)
+                self.assertIsNone(headers('/api/movies/')[1])
+
+        anonymous = APIClient().get('/api/movies/?flags=true')
+        self.assertIn('Authorization', anonymous['Vary'])
+        self.assertNotIn('Cache-Control', anonymous)
+
+    def test_set_recreated_by_a_write_is_seeded_again(self):
+        Like.objects.create(user=self.user, movie=self.movies[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, movie=self.movies[1])
+        flags = self.flags()
+        self.assertEqual(flags[self.movies[0].pk], (True, False))
+        self.assertEqual(flags[self.movies[1].pk], (True, False))
+
+    def test_removal_during_a_reseed_is_kept(self):
+        first, second = self.movies[:2]
+        like = Like.objects.create(user=self.user, movie=first)
+        Like.objects.create(user=self.user, movie=second)
+        install = membership._install
+        attempts = []
+
+        def remove_first_then_install(r, seed_key, key, *args):
+            if key.startswith('likes:'):
+                if not attempts:
+                    # Removed after the seed read the like, before the
+                    # seed replaces the set.
+                    with self.captureOnCommitCallbacks(execute=True):
+                        like.delete()
+                attempts.append(seed_key)
+            return install(r, seed_key, key, *args)
+
+        with mock.patch.object(
+            membership, '_install', side_effect=remove_first_then_install
+        ):
+            flags = self.flags()
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(flags[first.pk], (False, False))
+        self.assertEqual(flags[second.pk], (True, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.flags(), flags)
+        redis = get_redis_connection('default')
+        self.assertEqual(redis.keys('likes:user:*:seed:*'), [])
+
+
+SEED_SQL = [
+    """
+    INSERT INTO auth_user (
+        password, is_superuser, username, first_name, last_name, email,
+        is_staff, is_active, date_joined
+    )
+    SELECT '', false, 'user' || g, '', '', '', false, true, now()
+    FROM generate_series(1, %(users)s) AS g
+    """,
+    """
+    INSERT INTO movies_movie (
+        title, third_party_id, release_date, genre_ids,
+        likes_count, comments_count, favorites_count
+    )
+    SELECT
+        substr(md5(g::text), 1, 8) || ' ' || substr(md5((-g)::text), 1, 8),
+        -g,
+        CASE WHEN g %% 20 = 0 THEN NULL
+            ELSE date '1950-01-01' + floor(random() * 27000)::int END,
+        '[]'::jsonb, 0, 0, 0
+    FROM generate_series(1, %(movies)s) AS g
+    """,
+    """
+    INSERT INTO movies_like (user_id, movie_id, created_at)
+    SELECT
+        (SELECT min(id) FROM auth_user) + floor(random() * %(users)s)::int,
+        (SELECT min(id) FROM movies_movie) + floor(random() * %(movies)s)::int,
+        now() - random() * interval '365 days'
+    FROM generate_series(1, %(likes)s)
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO movies_favoritemovie (user_id, movie_id, created_at)
+    SELECT
+        (SELECT min(id) FROM auth_user) + floor(random() * %(users)s)::int,
+        (SELECT min(id) FROM movies_movie) + floor(random() * %(movies)s)::int,
+        now() - random() * interval '365 days'
+    FROM generate_series(1, %(favorites)s)
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO movies_comment (user_id, movie_id, text, path, created_at)
+    SELECT
+        (SELECT min(id) FROM auth_user) + floor(random() * %(users)s)::int,
+        (SELECT min(id) FROM movies_movie) + floor(random() * %(movies)s)::int,
+        md5(g::text),
+        '',
+        now() - random() * interval '365 days'
+    FROM generate_series(1, %(comments)s) AS g
+    """,
+    """
+    UPDATE movies_comment SET path = lpad(id::text, 10, '0') || '/'
+    """,
+    """
+    INSERT INTO movies_movierecommendation (
+        source_id, recommended_id, rank, score, fetched_at
+    )
+    SELECT m.id, m.id + r, r, 1.0 / r, now()
+    FROM movies_movie AS m, generate_series(1, 10) AS r
+    WHERE m.id %% 5 = 0
+        AND m.id + r <= (SELECT max(id) FROM movies_movie)
+    """,
+    'ANALYZE',
+]
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Query plans are checked on PostgreSQL only.'
+)
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class QueryPlanTests(TestCase):
+    """
+    Seeds a realistically sized dataset and checks with EXPLAIN that each
+    hot query of the views reads through its index instead of scanning
+    the table.
+    """
+    sizes = {
+        'users': 2000,
+        'movies': 50000,
+        'likes': 200000,
+        'favorites': 50000,
+        'comments': 200000,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            for sql in SEED_SQL:
+                cursor.execute(sql, cls.sizes)
+        cls.user = get_user_model().objects.order_by('pk').first()
+        cls.movie = Movie.objects.filter(
+            recommendations__isnull=False
+        ).order_by('pk').first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertUsesIndex(self, url, table, index, params=None):
+        """
+        Requests `url` and checks the plans of the queries it ran against
+        `table`: none scans the table, and one reads through `index`.
+        Returns the response data.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+        statements = [
+            query['sql'] for query in queries
+            if f'FROM "{table}"' in query['sql']
+        ]
+        self.assertTrue(statements, f'{url} did not query {table}')
+        plans = []
+        for sql in statements:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+            plans.append(plan)
+        self.assertIn(index, '\n'.join(plans), '\n\n'.join(plans))
+        return response.json()
+
+    def test_movie_listing_pages(self):
+        data = self.assertUsesIndex(
+            '/api/movies/', 'movies_movie', 'movie_release_date_idx'
+        )
+        self.assertUsesIndex(
+            data['next'], 'movies_movie', 'movie_release_date_idx'
+        )
+
+    def test_title_search(self):
+        word = self.movie.title.split()[0]
+        self.assertUsesIndex(
+            '/api/movies/', 'movies_movie', 'movie_title_search_idx',
+            {'q': word}
+        )
+        self.assertUsesIndex(
+            '/api/movies/', 'movies_movie', 'movie_title_trgm_idx',
+            {'q': word[:5], 'mode': 'prefix'}
+        )
+
+    def test_movie_recommendations(self):
+        self.assertUsesIndex(
+            f'/api/movies/{self.movie.pk}/recommended/',
+            'movies_movie',
+            'movies_movi_source__f1e886_idx'
+        )
+
+    def test_comment_listings(self):
+        self.assertUsesIndex(
+            '/api/comments/', 'movies_comment', 'comment_created_idx'
+        )
+        movie_id = Comment.objects.values_list('movie_id', flat=True)[0]
+        self.assertUsesIndex(
+            '/api/comments/', 'movies_comment', 'comment_movie_thread_idx',
+            {'movie': movie_id}
+        )
+        comment_id = Comment.objects.values_list('pk', flat=True)[0]
+        self.assertUsesIndex(
+            f'/api/comments/{comment_id}/thread/', 'movies_comment',
+            'comment_path_idx'
+        )
+
+    def test_like_and_favorite_listings(self):
+        self.assertUsesIndex(
+            '/api/likes/', 'movies_like', 'like_user_created_idx'
+        )
+        self.assertUsesIndex(
+            '/api/favorites/', 'movies_favoritemovie',
+            'favorite_user_created_idx'
+        )
+
+
+@skipUnless(
+    connection.vendor == 'sqlite',
+    'Checks the query plans of SQLite.'
+)
+class SQLiteQueryPlanTests(TestCase):
+    """
+    On SQLite, where the NULLS LAST index does not exist, the movie
+    listing reads through the portable listing index without sorting.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Movie.objects.bulk_create(
+            Movie(
+                title=f'Movie {i}', third_party_id=i,
+                release_date=None if i % 4 == 0 else
+                datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 50)
+            )
+            for i in range(100)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        for query in queries:
+            if 'FROM "movies_movie"' not in query['sql']:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                plans.append('\n'.join(row[-1] for row in cursor.fetchall()))
+        self.assertTrue(plans, f'{url} did not query movies_movie')
+        return response.json(), '\n\n'.join(plans)
+
+    def test_movie_listing_pages(self):
+        # The last page starts past a movie without a release date.
+        url = '/api/movies/'
+        for _ in range(5):
+            data, plan = self.plans(url)
+            self.assertIn('USING INDEX movie_release_date_id_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+            url = data['next']
@@ -0,0 +1,176 @@
+import random
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+# Statuses worth retrying: rate limited, or a transient server failure.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Ids in request paths, replaced to keep metric labels few.
+ID_RE = re.compile(r'/\d+(?=/|$)')
+
+_session = None
+_rate_limiter = None
+_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to stay under TMDb's request rate.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum burst size.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and consumes it.
+
+        Returns the number of seconds spent waiting.
+        """
+        start = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_session():
+    """
+    Returns the process-wide keep-alive session used for TMDb calls.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.TMDB_MAX_CONNECTIONS
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide token bucket shared by all TMDb calls.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = TokenBucket(settings.TMDB_RATE_LIMIT)
+    return _rate_limiter
+
+
+def tmdb_get(path, params=None):
+    """
+    Performs a rate-limited GET against the TMDb API and returns the
+    decoded JSON body.
+
+    429 and 5xx responses, timeouts and connection errors are retried
+    with exponential backoff (honouring `Retry-After` when present).
+    Raises a `requests.exceptions.RequestException` once retries are
+    exhausted or on any other error status.
+    """
+    url = f"{settings.TMDB_BASE_URL}{path}"
+    params = {**(params or {}), 'api_key': settings.TMDB_API_KEY}
+    session = get_session()
+    rate_limiter = get_rate_limiter()
+    max_retries = settings.TMDB_MAX_RETRIES
+    endpoint = ID_RE.sub('/{id}', path)
+
+    for attempt in range(max_retries + 1):
+        metrics.observe(
+            'tmdb_throttle_wait_seconds',
+            rate_limiter.acquire(),
+            endpoint=endpoint
+        )
+        start = time.perf_counter()
+        try:
+            response = session.get(
+                url,
+                params=params,
+                timeout=settings.TMDB_TIMEOUT
+            )
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout
+        ) as e:
+            reason = type(e).__name__
+            metrics.observe(
+                'tmdb_request_duration_seconds',
+                time.perf_counter() - start,
+                endpoint=endpoint,
+                status=reason
+            )
+            if attempt == max_retries:
+                raise
+            metrics.increment(
+                'tmdb_retries_total', endpoint=endpoint, reason=reason
+            )
+            time.sleep(_backoff(attempt))
+            continue
+
+        status = response.status_code
+        metrics.observe(
+            'tmdb_request_duration_seconds',
+            time.perf_counter() - start,
+            endpoint=endpoint,
+            status=status
+        )
+        metrics.increment(
+            'tmdb_response_bytes_total',
+            len(response.content),
+            endpoint=endpoint
+        )
+        if status == 429:
+            metrics.increment('tmdb_rate_limited_total', endpoint=endpoint)
+
+        if status in RETRY_STATUSES and attempt < max_retries:
+            metrics.increment(
+                'tmdb_retries_total', endpoint=endpoint, reason=status
+            )
+            time.sleep(_backoff(attempt, response.headers.get('Retry-After')))
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+
+def _backoff(attempt, retry_after=None):
+    """
+    Returns the number of seconds to wait before retry number `attempt`.
+    """
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+    delay = settings.TMDB_BACKOFF * (2 ** attempt)
+    return delay + random.uniform(0, delay)
@@ -1,13 +1,21 @@
 from rest_framework.routers import DefaultRouter
+from django.conf import settings
 from django.urls import path
 
+from .async_views import (
+    async_view,
+    movie_comments,
+    movie_detail,
+    movie_list,
+    movie_recommendations,
+    user_recommendations
+)
 from .views import (
     MovieViewSet,
     FavoriteMovieViewSet,
     CommentViewSet,
     LikeViewSet,
     user_registration_view,
-    recommend_movies,
     MovieRecommendationsView,
     UserProfileView
 )
@@ -25,14 +33,52 @@ urlpatterns = [
         name='register'
     ),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
+    # By TMDb id, the id this URL has always taken.
     path(
-        'movies/<int:movie_id>/recommendations/',
-        recommend_movies,
+        'movies/<int:tmdb_id>/recommendations/',
+        MovieRecommendationsView.as_view(),
         name='recommend-movies'
     ),
+    path(
+        'movies/<int:movie_id>/recommended/',
+        MovieRecommendationsView.as_view(),
+        name='movie-recommended'
+    ),
     path(
         'recommendations/',
         MovieRecommendationsView.as_view(),
         name='movie-recommendations'
     ),
 ] + router.urls
+
+if settings.ASYNC_READ_VIEWS:
+    # GET requests of the hot reads go to async views, anything else to
+    # the views above.
+    views = {pattern.name: pattern.callback for pattern in urlpatterns}
+    urlpatterns = [
+        path(
+            'movies/',
+            async_view(movie_list, views['movie-list']),
+            name='movie-list'
+        ),
+        path(
+            'movies/<int:pk>/',
+            async_view(movie_detail, views['movie-detail']),
+            name='movie-detail'
+        ),
+        path(
+            'movies/<int:movie_id>/recommended/',
+            async_view(movie_recommendations, views['movie-recommended']),
+            name='movie-recommended'
+        ),
+        path(
+            'recommendations/',
+            async_view(user_recommendations, views['movie-recommendations']),
+            name='movie-recommendations'
+        ),
+        path(
+            'comments/',
+            async_view(movie_comments, views['comment-list']),
+            name='comment-list'
+        ),
+    ] + urlpatterns
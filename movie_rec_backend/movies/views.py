@@ -1,12 +1,30 @@
+import json
+from secrets import compare_digest
+
 from rest_framework import viewsets, status
 from rest_framework.permissions import (
     IsAuthenticatedOrReadOnly,
     AllowAny,
     IsAuthenticated
 )
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes
+)
 from rest_framework.response import Response
-from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.mixins import (
     CreateModelMixin,
@@ -15,17 +33,45 @@ from rest_framework.mixins import (
 )
 from rest_framework.viewsets import GenericViewSet
 
+from . import membership
+from .cache import (
+    get_or_compute,
+    get_versions,
+    make_key,
+    version_timestamp
+)
+from .embeddings import similar_movie_ids
+from .feed import feed_movies, read_feed, read_trending_feed
+from .like_buffer import buffer_like, buffer_likes, flush_user_likes
+from .metrics import render as render_metrics, timed
 from .models import Movie, FavoriteMovie, Comment, Like
+from .pagination import (
+    CreatedAtKeysetPagination,
+    MovieKeysetPagination,
+    SearchPagination
+)
 from .permissions import IsOwnerOrReadOnly
+from .search import SEARCH_MODES, search_movies
 from .serializers import (
+    BulkCommentItemSerializer,
+    BulkMovieItemSerializer,
     UserRegistrationSerializer,
     MovieSerializer,
     FavoriteMovieSerializer,
+    FavoriteMovieListSerializer,
     CommentSerializer,
+    CommentListSerializer,
     LikeSerializer,
+    LikeListSerializer,
+    BufferedLikeSerializer,
     UserSerializer
 )
-from .tasks import fetch_and_save_recommendations
+from .signals import (
+    bulk_create_pairs,
+    bulk_created,
+    delete_rows
+)
+from .tasks import request_feed_refresh, request_recommendations
 
 
 class BaseUserObjectViewSet(
@@ -39,6 +85,17 @@ class BaseUserObjectViewSet(
     Handles creation, listing, and deletion for the authenticated user.
     """
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = CreatedAtKeysetPagination
+    # Read-optimized serializer used by `list`, see ValuesListSerializer.
+    list_serializer_class = None
+    # Validates the shape of one item created by `bulk`, without queries.
+    bulk_item_serializer_class = BulkMovieItemSerializer
+    # Largest batch `bulk` accepts.
+    bulk_max_items = 100
+    # Fields `bulk` reads of the objects it deletes.
+    bulk_destroy_fields = ('id', 'user_id', 'movie_id')
+    # Error of an item whose (user, movie) pair already exists.
+    duplicate_message = None
 
     def perform_create(self, serializer):
         """
@@ -50,7 +107,200 @@ class BaseUserObjectViewSet(
         """
         Returns a list of objects for the currently authenticated user.
         """
-        return self.queryset.filter(user=self.request.user)
+        return self.queryset.filter(
+            user=self.request.user
+        ).select_related('user')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns one keyset-paginated page of objects, newest first, read
+        in a single query.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.list_serializer_class is None:
+            page = self.paginate_queryset(queryset)
+            with timed('serialize'):
+                data = self.get_serializer(page, many=True).data
+        else:
+            page = self.paginate_queryset(
+                self.list_serializer_class.get_queryset(queryset)
+            )
+            with timed('serialize'):
+                data = self.list_serializer_class.to_representation(page)
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['post', 'delete'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Creates (POST, a list of objects) or deletes (DELETE, a list of
+        ids) up to `bulk_max_items` objects of the authenticated user in
+        a constant number of queries.
+
+        Responds 207 with one result per item, in order: its status, and
+        the object created or the errors.
+        """
+        items = request.data
+        if not isinstance(items, list) or len(items) > self.bulk_max_items:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f"Expected a list of at most {self.bulk_max_items} "
+                    "items."
+                ]
+            })
+        if request.method == 'DELETE':
+            results = self.bulk_destroy(items)
+        else:
+            results = self.bulk_create(items)
+        return Response(
+            {'results': results},
+            status=status.HTTP_207_MULTI_STATUS
+        )
+
+    def bulk_create(self, items):
+        """
+        Returns the result of creating each item: items are validated
+        against the database batch-wise by `validate_bulk`, and the valid
+        ones saved together by `perform_bulk_create`.
+        """
+        results = [None] * len(items)
+        valid = {}
+        for index, item in enumerate(items):
+            serializer = self.bulk_item_serializer_class(data=item)
+            if serializer.is_valid():
+                valid[index] = dict(serializer.validated_data)
+            else:
+                results[index] = {'status': 400, 'errors': serializer.errors}
+
+        if valid:
+            for index, errors in self.validate_bulk(valid).items():
+                del valid[index]
+                results[index] = {'status': 400, 'errors': errors}
+        if valid:
+            for index, result in self.perform_bulk_create(valid).items():
+                results[index] = result
+        return results
+
+    def validate_movies(self, items):
+        """
+        Returns the errors of the items, by index, whose movie does not
+        exist, in one query.
+        """
+        movie_ids = {data['movie'] for data in items.values()}
+        existing = set(Movie.objects.filter(
+            pk__in=movie_ids
+        ).values_list('pk', flat=True))
+        message = PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        return {
+            index: {'movie': [message.format(pk_value=data['movie'])]}
+            for index, data in items.items()
+            if data['movie'] not in existing
+        }
+
+    def validate_bulk(self, items):
+        """
+        Returns the errors of the items, by index, that the database
+        would reject: unknown movies, and movies the user already has an
+        object for, in the database or earlier in the batch.
+        """
+        errors = self.validate_movies(items)
+        taken = set(self.queryset.filter(
+            user=self.request.user,
+            movie_id__in={data['movie'] for data in items.values()}
+        ).values_list('movie_id', flat=True))
+        for index, data in items.items():
+            if index in errors:
+                continue
+            if data['movie'] in taken:
+                errors[index] = {
+                    api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]
+                }
+            taken.add(data['movie'])
+        return errors
+
+    def perform_bulk_create(self, items):
+        """
+        Inserts the validated items and returns their results by index,
+        read back in one more query. An item whose pair was inserted
+        concurrently since `validate_bulk` is a duplicate.
+        """
+        model = self.queryset.model
+        user = self.request.user
+        objects = [
+            model(user=user, movie_id=data['movie'])
+            for data in items.values()
+        ]
+        with transaction.atomic():
+            inserted = bulk_create_pairs(model, objects)
+
+        rows = self.list_serializer_class.get_queryset(self.queryset.filter(
+            pk__in=[obj.pk for obj in inserted]
+        ))
+        created = {
+            row['movie']: row
+            for row in self.list_serializer_class.to_representation(rows)
+        }
+        duplicate = {
+            'status': 400,
+            'errors': {
+                api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]
+            }
+        }
+        return {
+            index: (
+                {'status': 201, 'data': created[data['movie']]}
+                if data['movie'] in created else duplicate
+            )
+            for index, data in items.items()
+        }
+
+    def bulk_destroy(self, ids):
+        """
+        Returns the result of deleting each id. Objects of other users
+        are not found, as with `destroy`.
+        """
+        model = self.queryset.model
+        id_field = IntegerField()
+        pks = []
+        for item in ids:
+            try:
+                pks.append(id_field.to_internal_value(item))
+            except ValidationError as exc:
+                pks.append(exc.detail)
+
+        objects = {
+            obj.pk: obj
+            for obj in model.objects.filter(
+                user=self.request.user,
+                pk__in=[pk for pk in pks if isinstance(pk, int)]
+            ).only(*self.bulk_destroy_fields)
+        }
+        with transaction.atomic():
+            self.perform_bulk_destroy(list(objects.values()))
+
+        not_found = f'No {model._meta.object_name} matches the given query.'
+        results = []
+        for item, pk in zip(ids, pks):
+            if not isinstance(pk, int):
+                result = {'status': 400, 'errors': {'id': pk}}
+            elif pk in objects:
+                result = {'status': 204}
+            else:
+                result = {'status': 404, 'errors': {'detail': not_found}}
+            results.append({'id': item, **result})
+        return results
+
+    def perform_bulk_destroy(self, objects):
+        """
+        Deletes `objects`, applying the signal side effects once for the
+        whole batch.
+        """
+        model = self.queryset.model
+        if objects:
+            delete_rows(model.objects.filter(
+                pk__in=[obj.pk for obj in objects]
+            ))
 
 
 class MovieViewSet (viewsets.ReadOnlyModelViewSet):
@@ -60,19 +310,154 @@ class MovieViewSet (viewsets.ReadOnlyModelViewSet):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = MovieKeysetPagination
 
     def list(self, request, *args, **kwargs):
-        # Cache key for movie queryset
-        cache_key = 'movie_queryset'
-        
-        queryset = cache.get(cache_key)
-        
-        if queryset is None:
-            queryset = self.filter_queryset(self.get_queryset()) 
-            cache.set(cache_key, list(queryset), 3600)
+        """
+        Returns one keyset-paginated page of movies.
+
+        Each page is cached separately as rendered JSON bytes, so a cache
+        hit costs one small GET and no serialization. Counter changes do
+        not invalidate pages: their counts lag by up to
+        MOVIE_LIST_CACHE_TTL. With `?q=` the page
+        holds ranked title search results instead (see `search`).
+
+        With `?flags=true`, each movie of the page also says whether the
+        authenticated user has `liked` and `favorited` it, read from the
+        user's sets in Redis rather than the database.
+        """
+        if request.query_params.get('q', '').strip():
+            return self.search(request)
+
+        paginator = self.paginator
+        cache_key = paginator.get_cache_key(request, make_key('list'))
+
+        def render_page():
+            page = paginator.paginate_queryset(
+                self.filter_queryset(self.get_queryset()),
+                request,
+                view=self
+            )
+            with timed('serialize'):
+                serializer = self.get_serializer(page, many=True)
+                return JSONRenderer().render(
+                    paginator.get_paginated_data(serializer.data)
+                )
+
+        content = get_or_compute(
+            cache_key,
+            render_page,
+            settings.MOVIE_LIST_CACHE_TTL
+        )
+        if self.wants_flags(request):
+            data = json.loads(content)
+            membership.annotate(request.user.pk, data['results'])
+            response = Response(data)
+        else:
+            response = HttpResponse(
+                content,
+                content_type='application/json'
+            )
+        return self.patch_flag_headers(request, response)
+
+    def wants_flags(self, request):
+        return request.user.is_authenticated and membership.requested(
+            request.query_params
+        )
+
+    def patch_flag_headers(self, request, response):
+        if membership.requested(request.query_params):
+            membership.patch_headers(
+                response,
+                request.user.is_authenticated
+            )
+        return response
+
+    def search(self, request):
+        """
+        Returns one page of movies whose title matches `?q=`, best match
+        first. `?mode=prefix` switches to prefix matching for
+        autocomplete; the default is full-text search.
+        """
+        q = request.query_params['q'].strip()
+        mode = request.query_params.get('mode', 'fulltext')
+        if mode not in SEARCH_MODES:
+            raise ValidationError({
+                'mode': [f"Must be one of: {', '.join(SEARCH_MODES)}."]
+            })
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(
+            search_movies(self.get_queryset(), q, mode),
+            request,
+            view=self
+        )
+        with timed('serialize'):
+            data = self.get_serializer(page, many=True).data
+        if self.wants_flags(request):
+            membership.annotate(request.user.pk, data)
+        return self.patch_flag_headers(
+            request,
+            paginator.get_paginated_response(data)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Returns a movie, cached per movie as rendered JSON bytes.
+
+        The response carries an ETag and Last-Modified derived from the
+        movie's cache version, and conditional requests that still match
+        get a 304 without touching the database or the serializer.
+        """
+        try:
+            movie_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        versions = get_versions(
+            'detail',
+            f'detail:{movie_id}',
+            exists=Movie.objects.filter(pk=movie_id).exists
+        )
+        if versions is None:
+            raise Http404('No Movie matches the given query.')
+        global_version, movie_version = versions
+        etag = f'"{movie_id}-{global_version}-{movie_version}"'
+        last_modified = max(
+            version_timestamp(global_version),
+            version_timestamp(movie_version)
+        )
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            def render_movie():
+                movie = self.get_object()
+                with timed('serialize'):
+                    serializer = self.get_serializer(movie)
+                    return JSONRenderer().render(serializer.data)
+
+            content = get_or_compute(
+                make_key(
+                    f'detail:{movie_id}',
+                    global_version,
+                    version=movie_version
+                ),
+                render_movie,
+                3600
+            )
+            response = HttpResponse(
+                content,
+                content_type='application/json'
+            )
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Clients may keep the response but must revalidate it.
+        patch_cache_control(response, no_cache=True)
+        return response
 
 
 class FavoriteMovieViewSet(BaseUserObjectViewSet):
@@ -82,6 +467,8 @@ class FavoriteMovieViewSet(BaseUserObjectViewSet):
     """
     queryset = FavoriteMovie.objects.all()
     serializer_class = FavoriteMovieSerializer
+    list_serializer_class = FavoriteMovieListSerializer
+    duplicate_message = "You have already favorited this movie."
 
 
 class CommentViewSet(BaseUserObjectViewSet):
@@ -91,21 +478,246 @@ class CommentViewSet(BaseUserObjectViewSet):
     """
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    list_serializer_class = CommentListSerializer
+    bulk_item_serializer_class = BulkCommentItemSerializer
+    bulk_destroy_fields = ('id', 'user_id', 'movie_id', 'parent_id', 'path')
 
-    def get_queryset(self):
-        queryset = Comment.objects.all()
+    def get_movie_id(self):
+        """
+        Returns the `?movie=` the comments are filtered on, if any.
+        """
         movie_id = self.request.query_params.get('movie')
-        if movie_id:
-            queryset = queryset.filter(movie_id=movie_id)
+        if not movie_id:
+            return None
+        try:
+            return int(movie_id)
+        except ValueError:
+            raise ValidationError({'movie': ["A valid integer is required."]})
+
+    def get_queryset(self):
+        """
+        Returns comments, or only the top-level comments of a movie's
+        threads with `?movie=`.
+        """
+        queryset = Comment.objects.select_related('user')
+        if self.action == 'list':
+            movie_id = self.get_movie_id()
+            if movie_id is not None:
+                queryset = queryset.filter(
+                    movie_id=movie_id,
+                    parent__isnull=True
+                )
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        Returns one page of comments, newest first.
+
+        The first page of a movie's threads is cached as rendered JSON
+        bytes until a top-level comment is added to or removed from the
+        movie; replies leave it untouched.
+        """
+        movie_id = self.get_movie_id()
+        if movie_id is None or request.query_params.get(
+            self.paginator.cursor_query_param
+        ):
+            return super().list(request, *args, **kwargs)
+
+        namespace_key = make_key(
+            f'comments:{movie_id}',
+            exists=Movie.objects.filter(pk=movie_id).exists
+        )
+        if namespace_key is None:
+            return super().list(request, *args, **kwargs)
+        cache_key = self.paginator.get_cache_key(request, namespace_key)
+
+        def render_page():
+            return JSONRenderer().render(
+                super(CommentViewSet, self).list(
+                    request, *args, **kwargs
+                ).data
+            )
+
+        content = get_or_compute(cache_key, render_page, 3600)
+        return HttpResponse(content, content_type='application/json')
+
+    @action(detail=True)
+    def thread(self, request, *args, **kwargs):
+        """
+        Returns a comment and all of its replies, depth first with
+        siblings oldest first, read in one query on the path index.
+        """
+        root = self.get_object()
+        rows = list(CommentListSerializer.get_queryset(
+            Comment.objects.filter(
+                path__startswith=root.path
+            ).order_by('path')
+        ))
+        with timed('serialize'):
+            data = CommentListSerializer.to_representation(rows)
+        return Response(data)
+
+    def validate_bulk(self, items):
+        """
+        Returns the errors of the items, by index, whose movie or parent
+        does not exist, or whose parent `CommentSerializer` would refuse,
+        in two queries. Sets the `path` prefix of the valid items.
+        """
+        errors = self.validate_movies(items)
+        parents = {
+            pk: (movie_id, path)
+            for pk, movie_id, path in Comment.objects.filter(
+                pk__in={data.get('parent') for data in items.values()}
+                - {None}
+            ).values_list('pk', 'movie_id', 'path')
+        }
+        max_length = Comment._meta.get_field('path').max_length
+        segment_length = len(Comment.PATH_SEGMENT.format(0))
+        for index, data in items.items():
+            parent = data.get('parent')
+            data['path'] = ''
+            if index in errors or parent is None:
+                continue
+            if parent not in parents:
+                error = PrimaryKeyRelatedField.default_error_messages[
+                    'does_not_exist'
+                ].format(pk_value=parent)
+            elif parents[parent][0] != data['movie']:
+                error = "The parent comment is on another movie."
+            elif len(parents[parent][1]) + segment_length > max_length:
+                error = "This thread is nested too deeply."
+            else:
+                data['path'] = parents[parent][1]
+                continue
+            errors[index] = {'parent': [error]}
+        return errors
+
+    def perform_bulk_create(self, items):
+        """
+        Inserts the validated comments and fills in their paths, which
+        need the primary keys, in two queries.
+        """
+        user = self.request.user
+        comments = [
+            Comment(
+                user=user,
+                movie_id=data['movie'],
+                parent_id=data.get('parent'),
+                text=data['text']
+            )
+            for data in items.values()
+        ]
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments)
+            for comment, data in zip(comments, items.values()):
+                comment.path = (
+                    data['path'] + Comment.PATH_SEGMENT.format(comment.pk)
+                )
+            Comment.objects.bulk_update(comments, ['path'])
+            bulk_created(Comment, comments)
+
+        rows = CommentListSerializer.get_queryset(Comment.objects.filter(
+            pk__in=[comment.pk for comment in comments]
+        ))
+        created = {
+            row['id']: row
+            for row in CommentListSerializer.to_representation(rows)
+        }
+        return {
+            index: {'status': 201, 'data': created[comment.pk]}
+            for index, comment in zip(items, comments)
+        }
+
+    def perform_bulk_destroy(self, comments):
+        """
+        Deletes `comments` and their replies, whoever wrote them. The
+        replies the foreign key cascades to are selected up front on the
+        path index, so the delete finds no further level to collect.
+        """
+        if not comments:
+            return
+        subtrees = Q(pk__in=[comment.pk for comment in comments])
+        for comment in comments:
+            if comment.path:
+                subtrees |= Q(path__startswith=comment.path)
+        delete_rows(Comment.objects.filter(subtrees))
+
 
 class LikeViewSet(BaseUserObjectViewSet):
     """
-    A viewset for user likes on movies
+    A viewset for user likes on movies.
+
+    With LIKE_BUFFER_ENABLED, likes are recorded in Redis and written to
+    the database in batches by the `flush_like_buffer` task.
     """
     queryset = Like.objects.all()
     serializer_class = LikeSerializer
+    list_serializer_class = LikeListSerializer
+    duplicate_message = "You have already liked this movie."
+
+    def create(self, request, *args, **kwargs):
+        if not settings.LIKE_BUFFER_ENABLED:
+            return super().create(request, *args, **kwargs)
+
+        serializer = BufferedLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        movie = serializer.validated_data['movie']
+
+        if not buffer_like(request.user.pk, movie.pk):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]
+            })
+        return Response(
+            {
+                "user": request.user.username,
+                "movie": movie.pk
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    def list(self, request, *args, **kwargs):
+        if settings.LIKE_BUFFER_ENABLED:
+            # Read-your-writes: the user's own pending likes are written
+            # before they are listed.
+            flush_user_likes(request.user.pk)
+        return super().list(request, *args, **kwargs)
+
+    def validate_bulk(self, items):
+        if not settings.LIKE_BUFFER_ENABLED:
+            return super().validate_bulk(items)
+        # Duplicates are detected in Redis, see `perform_bulk_create`.
+        return self.validate_movies(items)
+
+    def perform_bulk_create(self, items):
+        """
+        Inserts the likes, or records them in the like buffer with
+        LIKE_BUFFER_ENABLED.
+        """
+        if not settings.LIKE_BUFFER_ENABLED:
+            return super().perform_bulk_create(items)
+
+        user = self.request.user
+        added = buffer_likes(
+            user.pk,
+            [data['movie'] for data in items.values()]
+        )
+        results = {}
+        for (index, data), is_new in zip(items.items(), added):
+            if is_new:
+                results[index] = {
+                    'status': 202,
+                    'data': {'user': user.username, 'movie': data['movie']}
+                }
+            else:
+                results[index] = {
+                    'status': 400,
+                    'errors': {
+                        api_settings.NON_FIELD_ERRORS_KEY: [
+                            self.duplicate_message
+                        ]
+                    }
+                }
+        return results
 
 
 # DRF decorator that turns a standard Django func. into an API view
@@ -126,32 +738,134 @@ def user_registration_view(request):
     )
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def recommend_movies(request, movie_id):
+def metrics_view(request):
     """
-    Trigger a background task to fetch movie recommendations.
+    Serves the request and task metrics in the Prometheus text format,
+    to requests bearing METRICS_TOKEN, or without a token to the
+    addresses in METRICS_ALLOWED_IPS only.
     """
-    # Triggers Celery task
-    fetch_and_save_recommendations(movie_id)
-
-    return Response(
-        {
-            "message": "Fetching recommendations in the background..."
-        },
-        status=status.HTTP_202_ACCEPTED
+    if settings.METRICS_TOKEN:
+        allowed = compare_digest(
+            request.headers.get('Authorization', ''),
+            f'Bearer {settings.METRICS_TOKEN}'
+        )
+    else:
+        allowed = (
+            request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        )
+    if not allowed:
+        raise Http404
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
     )
 
 
 class MovieRecommendationsView(ListAPIView):
     """
-    A view to list recommended movies for a specific movie
+    A view to list recommended movies for a specific movie.
+
+    GET serves the stored recommendation graph of the movie; POST triggers
+    a background task to (re)fetch it from TMDb.
+
+    The movie is given by its id (`movie_id`), or by its TMDb id
+    (`tmdb_id`) on the URL clients used before movies had local
+    recommendations. A POST for a TMDb id missing from the catalog
+    fetches the movie along with its recommendations.
     """
     serializer_class = MovieSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
-        return Movie.objects.order_by('-release_date')[:10]
+        return Movie.objects.filter(
+            recommended_by__source_id=self.kwargs.get('movie_id')
+        ).order_by('recommended_by__rank')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns the recommendations of a movie, cached per movie as
+        rendered JSON bytes until the next fetch replaces them. Movies
+        without TMDb recommendations get content-based neighbors from the
+        embedding index instead.
+
+        Without a movie, authenticated users get their precomputed feed
+        of movies similar to the ones they liked or favorited, refreshed
+        in the background once stale; users without one get the trending
+        feed.
+        """
+        if 'tmdb_id' in self.kwargs:
+            self.kwargs['movie_id'] = get_object_or_404(
+                Movie.objects.values_list('pk', flat=True),
+                third_party_id=self.kwargs['tmdb_id']
+            )
+        movie_id = self.kwargs.get('movie_id')
+        if movie_id is None:
+            movie_ids = None
+            if request.user.is_authenticated:
+                movie_ids, fresh = read_feed(request.user.pk)
+                if not fresh:
+                    request_feed_refresh(request.user.pk)
+            if not movie_ids:
+                movie_ids = read_trending_feed()
+            movies = feed_movies(movie_ids)
+            with timed('serialize'):
+                data = self.get_serializer(movies, many=True).data
+            return Response(data)
+
+        def render_recommendations():
+            movies = list(self.get_queryset())
+            if not movies:
+                # Nothing from TMDb yet: use movies with similar metadata.
+                movie = Movie.objects.filter(pk=movie_id).first()
+                if movie is not None:
+                    movies = feed_movies(similar_movie_ids(movie))
+            with timed('serialize'):
+                serializer = self.get_serializer(movies, many=True)
+                return JSONRenderer().render(serializer.data)
+
+        cache_key = make_key(
+            f'recommendations:{movie_id}',
+            exists=Movie.objects.filter(pk=movie_id).exists
+        )
+        if cache_key is None:
+            content = render_recommendations()
+        else:
+            content = get_or_compute(
+                cache_key,
+                render_recommendations,
+                3600
+            )
+        return HttpResponse(content, content_type='application/json')
+
+    def post(self, request, *args, **kwargs):
+        """
+        Trigger a background task to fetch movie recommendations.
+
+        Repeated requests for the same movie are coalesced: nothing is
+        enqueued while a fetch is in flight or its result is still fresh.
+        """
+        tmdb_id = self.kwargs.get('tmdb_id')
+        if tmdb_id is None:
+            # Fetches are requested, and coalesced, by TMDb id.
+            tmdb_id = get_object_or_404(
+                Movie.objects.values_list('third_party_id', flat=True),
+                pk=self.kwargs['movie_id']
+            )
+        state = request_recommendations(tmdb_id)
+
+        if state == 'fresh':
+            return Response(
+                {
+                    "message": "Recommendations are up to date."
+                },
+                status=status.HTTP_200_OK
+            )
+        return Response(
+            {
+                "message": "Fetching recommendations in the background..."
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
 
 
 class UserProfileView(RetrieveAPIView):